@@ -13,7 +13,9 @@
 #include "ui/PndLmdRuntimeConfiguration.h"
 
 #include <iostream>
+#include <memory>
 #include <string>
+#include <vector>
 
 using std::cerr;
 using std::cout;
@@ -23,9 +25,9 @@ using std::string;
 void createLmdFitData(const std::string &input_dir_path,
                       const std::string &filelist_path,
                       const std::string &output_dir_path,
-                      const std::string &config_file_url, const double mom,
-                      std::string &data_types, int num_events,
-                      const double total_elastic_cross_section) {
+                      const std::vector<std::string> &config_file_urls,
+                      const double mom, std::string &data_types,
+                      int num_events, const double total_elastic_cross_section) {
   std::cout << "Running LmdFit data reader....\n";
 
   PndLmdRuntimeConfiguration &lmd_runtime_config =
@@ -39,18 +41,32 @@ void createLmdFitData(const std::string &input_dir_path,
   lmd_runtime_config.setRawDataDirectory(input_dir_path);
   if (filelist_path != "")
     lmd_runtime_config.setRawDataFilelistPath(filelist_path);
-  lmd_runtime_config.setDataOutputDirectory(output_dir_path);
 
-  // set general config path
-  lmd_runtime_config.setGeneralConfigDirectory(config_file_url);
-
-  // read data parameter config
-  boost::filesystem::path data_config_path(config_file_url);
-  lmd_runtime_config.readDataConfig(data_config_path.filename().string());
-
-  PndLmdDataFacade data_facade;
+  // with several data configs (i.e. different binnings), the data objects of
+  // all of them are filled in one pass over the tracks. The outputs of each
+  // config go into the directory of that config.
+  std::vector<std::unique_ptr<PndLmdDataFacade>> data_facades;
+  std::vector<std::string> output_dir_paths;
 
   PndLmdCombinedDataReader data_reader;
+  for (auto const &config_file_url : config_file_urls) {
+    // set general config path
+    lmd_runtime_config.setGeneralConfigDirectory(config_file_url);
+
+    // read data parameter config
+    boost::filesystem::path data_config_path(config_file_url);
+    lmd_runtime_config.readDataConfig(data_config_path.filename().string());
+
+    if (config_file_urls.size() > 1)
+      output_dir_paths.push_back(data_config_path.parent_path().string());
+    else
+      output_dir_paths.push_back(output_dir_path);
+
+    data_facades.push_back(std::make_unique<PndLmdDataFacade>());
+    data_facades.back()->createDataBundles(data_types);
+    data_facades.back()->registerCreatedData(data_reader);
+  }
+
   if (!boost::filesystem::exists(lmd_runtime_config.getRawDataFilelistPath()))
     data_reader.addFilePath(lmd_runtime_config.getRawDataDirectory().string() +
                             "/Lumi_TrksQA*.root");
@@ -59,7 +75,13 @@ void createLmdFitData(const std::string &input_dir_path,
         lmd_runtime_config.getRawDataFilelistPath().string());
   }
 
-  data_facade.createAndFillDataBundles(data_types, data_reader);
+  data_reader.read();
+
+  for (unsigned int i = 0; i < data_facades.size(); i++) {
+    lmd_runtime_config.setDataOutputDirectory(output_dir_paths[i]);
+    data_facades[i]->saveDataToFiles();
+    data_facades[i]->cleanup();
+  }
 
   std::cout << std::endl << std::endl;
   std::cout << "Application finished successfully." << std::endl;
@@ -76,7 +98,10 @@ void displayInfo() {
                "resolution, v = vertex)"
             << std::endl;
   std::cout << "-d [input directory path]" << std::endl;
-  std::cout << "-c [data config file path]" << std::endl;
+  std::cout << "-c [data config file path] (can be given several times, the "
+               "outputs of each\n   config are then written to its directory "
+               "and -o is ignored)"
+            << std::endl;
   std::cout << "Optional arguments are: " << std::endl;
   std::cout << "-f [filelist path]" << std::endl;
   std::cout << "-o [output directory path]" << std::endl;
@@ -125,7 +150,7 @@ int main(int argc, char *argv[]) {
   unsigned int num_events = 0;
   double cross_section = 1.0;
   std::string data_path;
-  std::string config_file_path;
+  std::vector<std::string> config_file_paths;
   std::string output_dir_path;
   std::string filelist_path("");
   int c;
@@ -159,7 +184,7 @@ int main(int argc, char *argv[]) {
       is_data_path_set = true;
       break;
     case 'c':
-      config_file_path = optarg;
+      config_file_paths.push_back(optarg);
       is_config_file_path_set = true;
       break;
     case '?':
@@ -187,7 +212,8 @@ int main(int argc, char *argv[]) {
               << std::endl;
     skip_program = true;
   }
-  if (!(checkDataType(data_type) && is_mom_set && is_data_path_set))
+  if (!(checkDataType(data_type) && is_mom_set && is_data_path_set &&
+        is_config_file_path_set))
     skip_program = true;
 
   if (skip_program)
@@ -196,7 +222,7 @@ int main(int argc, char *argv[]) {
     if (!is_output_data_path_set)
       output_dir_path = data_path;
     createLmdFitData(data_path, filelist_path, output_dir_path,
-                     config_file_path, momentum, data_type, num_events,
+                     config_file_paths, momentum, data_type, num_events,
                      cross_section);
 
     return 0;
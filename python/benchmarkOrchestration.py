@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+
+"""
+Benchmarks the job orchestration (ClusterJobManager, SlurmJobHandler, agent) against
+the fake slurm in lumifit.fakeslurm, so no cluster is needed.
+
+Reports:
+    - sbatch submissions per second through handler and agent
+    - agent round trip latency (META order, and a REGULAR order that spawns a shell)
+    - squeue polling overhead (time per poll and number of polls while waiting for jobs)
+    - wall clock time for N synthetic experiments vs. the time the fake jobs take
+
+Run it before and after every scheduler change and compare the json output:
+
+    ./benchmarkOrchestration.py --experiments 20 --output before.json
+"""
+
+import argparse
+import concurrent.futures
+import json
+import os
+import statistics
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+from lumifit.agent import Client, Server, SlurmOrder, orderType
+from lumifit.cluster import ClusterJobManager, Job, JobResourceRequest
+from lumifit.fakeslurm import installFakeSlurm, readCallLog
+from lumifit.slurm import SlurmJobHandler
+
+
+def timeIt(function: Callable[[], Any], repetitions: int) -> List[float]:
+    durations = []
+    for _ in range(repetitions):
+        start = time.perf_counter()
+        function()
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def summarize(durations: List[float]) -> Dict[str, float]:
+    durations = sorted(durations)
+    return {
+        "mean_ms": 1000 * statistics.mean(durations),
+        "median_ms": 1000 * statistics.median(durations),
+        "p95_ms": 1000 * durations[int(0.95 * (len(durations) - 1))],
+    }
+
+
+def makeJob(name: str, array_size: int, run_time_in_seconds: float) -> Job:
+    job = Job(
+        JobResourceRequest(walltime_in_minutes=60),
+        application_url="/bin/true",
+        name=name,
+        logfile_url=os.devnull,
+        array_indices=list(range(1, array_size + 1)),
+    )
+    job.exported_user_variables["FAKE_SLURM_RUN_TIME"] = run_time_in_seconds
+    return job
+
+
+def benchmarkSubmissions(handler: SlurmJobHandler, number_of_submissions: int, array_size: int) -> Dict[str, float]:
+    # run time 0, so these don't get in the way of the other benchmarks
+    durations = timeIt(lambda: handler.submit(makeJob("bench-submit", array_size, 0)), number_of_submissions)
+    return {"submissions_per_second": len(durations) / sum(durations), **summarize(durations)}
+
+
+def benchmarkAgent(client: Client, repetitions: int) -> Dict[str, Dict[str, float]]:
+    meta = timeIt(lambda: client.execute(SlurmOrder(thisType=orderType.META, cmd="test")), repetitions)
+    regular = timeIt(lambda: client.execute(SlurmOrder(cmd="true", runShell=True)), repetitions)
+    return {"meta": summarize(meta), "regular": summarize(regular)}
+
+
+def benchmarkPolling(client: Client, repetitions: int) -> Dict[str, float]:
+    # REGULAR instead of QUERY, we want the cost of a real poll, not of the cache
+    poll = SlurmOrder(cmd='squeue -u $USER -h -r -o "%F %K %T"', runShell=True, env=os.environ.copy())
+    return summarize(timeIt(lambda: client.execute(poll), repetitions))
+
+
+def runSyntheticExperiment(job_manager: ClusterJobManager, args: argparse.Namespace) -> None:
+    """
+    The job sequence of a determineLuminosity run, boiled down to its slurm jobs:
+    vertex, then angular and res/acc at the same time, each sim/reco -> lmd data, then the fit.
+    """
+
+    def stage(name: str) -> None:
+        simJobID = job_manager.enqueue(makeJob(f"{name}-simreco", args.array_size, args.run_time))
+        job_manager.wait_for_job(simJobID)
+        dataJobID = job_manager.enqueue(makeJob(f"{name}-lmddata", max(1, args.array_size // 10), args.run_time))
+        job_manager.wait_for_job(dataJobID)
+
+    stage("vertex")
+    with concurrent.futures.ThreadPoolExecutor() as executor:
+        for future in [executor.submit(stage, name) for name in ("angular", "resacc")]:
+            future.result()
+    fitJobID = job_manager.enqueue(makeJob("fit", 1, args.run_time))
+    job_manager.wait_for_job(fitJobID)
+
+
+def benchmarkExperiments(handler: SlurmJobHandler, stateDir: Path, args: argparse.Namespace) -> Dict[str, float]:
+    job_manager = ClusterJobManager(handler, total_job_threshold=10**9, time_to_sleep_after_submission=0)
+    callsBefore = readCallLog(stateDir)
+
+    start = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=args.experiments) as executor:
+        for future in [executor.submit(runSyntheticExperiment, job_manager, args) for _ in range(args.experiments)]:
+            future.result()
+    wallClock = time.perf_counter() - start
+
+    squeueCalls = [duration for command, duration in readCallLog(stateDir)[len(callsBefore) :] if command == "squeue"]
+    # five jobs one after another, each waits in the queue and then runs
+    ideal = 5 * (args.queue_delay + args.run_time)
+    return {
+        "experiments": args.experiments,
+        "wall_clock_s": wallClock,
+        "ideal_s": ideal,
+        "overhead_s": wallClock - ideal,
+        "squeue_calls": len(squeueCalls),
+        "squeue_time_s": sum(squeueCalls),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Benchmarks the job orchestration against a fake slurm.",
+        formatter_class=argparse.RawTextHelpFormatter,
+    )
+    parser.add_argument("--experiments", type=int, default=10, help="number of synthetic experiments to run at the same time")
+    parser.add_argument("--array_size", type=int, default=100, help="array size of the sim/reco jobs")
+    parser.add_argument("--queue_delay", type=float, default=1.0, help="seconds every fake job waits in the queue")
+    parser.add_argument("--run_time", type=float, default=2.0, help="seconds every fake job runs")
+    parser.add_argument("--poll_interval", type=int, default=1, help="squeue poll interval of the job watcher")
+    parser.add_argument("--submissions", type=int, default=50, help="number of submissions for the submission benchmark")
+    parser.add_argument("--repetitions", type=int, default=200, help="repetitions for the latency benchmarks")
+    parser.add_argument("--cache_ttl", type=float, default=10.0, help="query cache lifetime of the agent in seconds")
+    parser.add_argument("--output", type=Path, default=None, help="write the results to this json file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmpDir = Path(tmp)
+        stateDir = tmpDir / "state"
+        installFakeSlurm(tmpDir / "bin", stateDir, queue_delay_in_seconds=args.queue_delay, run_time_in_seconds=args.run_time)
+        os.environ["PATH"] = f"{tmpDir / 'bin'}:{os.environ['PATH']}"
+        os.environ.setdefault("USER", "benchmark")
+
+        socketPath = tmpDir / "lmdfit.sock"
+        server = Server(socketPath, cacheTTL=args.cache_ttl)
+        serverThread = threading.Thread(target=server.serve, daemon=True)
+        serverThread.start()
+        while not socketPath.exists():
+            time.sleep(0.05)
+
+        results: Dict[str, Any] = {"parameters": {name: str(value) if isinstance(value, Path) else value for name, value in vars(args).items()}}
+
+        with Client(socketPath) as client:
+            handler = SlurmJobHandler("fake", client=client, poll_interval_in_seconds=args.poll_interval, settle_time_in_seconds=2 * args.poll_interval)
+
+            print("benchmarking agent round trips...")
+            results["agent"] = benchmarkAgent(client, args.repetitions)
+            print("benchmarking submissions...")
+            results["submission"] = benchmarkSubmissions(handler, args.submissions, args.array_size)
+            print("benchmarking squeue polls...")
+            results["polling"] = benchmarkPolling(client, max(1, args.repetitions // 10))
+            print(f"running {args.experiments} synthetic experiments...")
+            results["experiments"] = benchmarkExperiments(handler, stateDir, args)
+            results["agent_cache"] = client.getCacheStats()
+
+            client.stopAgent()
+        serverThread.join(timeout=5)
+
+    print(json.dumps(results, indent=4))
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
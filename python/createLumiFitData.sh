@@ -12,6 +12,12 @@ fi
 # directory of the data generated with dpm
 if [[ ${SLURM_ARRAY_TASK_ID} ]]; then
   filelist_url=${filelist_path}/filelist_${SLURM_ARRAY_TASK_ID}.txt
+  # with chained jobs, the array size is only a guess made before the bunches existed.
+  # without a file list the binary would process the whole directory, so just stop here
+  if [ ! -f ${filelist_url} ]; then
+    echo "file list ${filelist_url} does not exist, nothing to do for this array task."
+    exit 0
+  fi
 else
   filelist_url=${filelist_path}
 fi
@@ -23,20 +29,37 @@ if [ ! $numEv ]; then
   numEv=0
 fi
 
+# config_path can hold several data configs separated by ':' (one per binning, see
+# dataProcessors/LmdDataCreator.py). they are all filled in one pass over the tracks,
+# the outputs of each go into the directory of its config
+config_args=""
+output_files=""
+IFS=':' read -ra config_paths <<< "${config_path}"
+for config in "${config_paths[@]}"; do
+  config_args="${config_args} -c ${config}"
+  output_files="${output_files} $(dirname ${config})/lmd_*data_${SLURM_ARRAY_TASK_ID}.root"
+done
+
 # if {filelist_url} is empty, the createLmdFitData binary must be run
 if [ -z ${filelist_url} ]; then
-  echo ${LMDFIT_BUILD_PATH}/bin/createLmdFitData -m $pbeam -t $type -c ${config_path} -d ${input_path} -n ${numEv} -e ${elastic_cross_section}
+  echo ${LMDFIT_BUILD_PATH}/bin/createLmdFitData -m $pbeam -t $type ${config_args} -d ${input_path} -n ${numEv} -e ${elastic_cross_section}
   if [ $batchjob -eq "0" ]; then
-    ${LMDFIT_BUILD_PATH}/bin/createLmdFitData -m $pbeam -t $type -c ${config_path} -d ${input_path} -n ${numEv} -e ${elastic_cross_section} 2>&1 >> ${data_path}/createLumiFitData.log
+    ${LMDFIT_BUILD_PATH}/bin/createLmdFitData -m $pbeam -t $type ${config_args} -d ${input_path} -n ${numEv} -e ${elastic_cross_section} 2>&1 >> ${data_path}/createLumiFitData.log
   else
-    ${LMDFIT_BUILD_PATH}/bin/createLmdFitData -m $pbeam -t $type -c ${config_path} -d ${input_path} -n ${numEv} -e ${elastic_cross_section}
+    ${LMDFIT_BUILD_PATH}/bin/createLmdFitData -m $pbeam -t $type ${config_args} -d ${input_path} -n ${numEv} -e ${elastic_cross_section}
   fi
 else
-  echo $/build/bin/createLmdFitData -m $pbeam -t $type -c ${config_path} -d ${input_path} -f ${filelist_url} -o ${output_path} -n ${numEv} -e ${elastic_cross_section}
+  start_time=$(date +%s)
+  echo $/build/bin/createLmdFitData -m $pbeam -t $type ${config_args} -d ${input_path} -f ${filelist_url} -o ${output_path} -n ${numEv} -e ${elastic_cross_section}
   if [ $batchjob -eq "0" ]; then
-    ${LMDFIT_BUILD_PATH}/bin/createLmdFitData -m $pbeam -t $type -c ${config_path} -d ${input_path} -f ${filelist_url} -o ${output_path} -n ${numEv} -e ${elastic_cross_section} 2>&1 >> ${data_path}/createLumiFitData.log
+    ${LMDFIT_BUILD_PATH}/bin/createLmdFitData -m $pbeam -t $type ${config_args} -d ${input_path} -f ${filelist_url} -o ${output_path} -n ${numEv} -e ${elastic_cross_section} 2>&1 >> ${data_path}/createLumiFitData.log
   else
-    ${LMDFIT_BUILD_PATH}/bin/createLmdFitData -m $pbeam -t $type -c ${config_path} -d ${input_path} -f ${filelist_url} -o ${output_path} -n ${numEv} -e ${elastic_cross_section}
+    ${LMDFIT_BUILD_PATH}/bin/createLmdFitData -m $pbeam -t $type ${config_args} -d ${input_path} -f ${filelist_url} -o ${output_path} -n ${numEv} -e ${elastic_cross_section}
+  fi
+
+  # tell the orchestrator that this bunch is done (see lumifit/manifest.py). never fails the job
+  if [ $batchjob -eq "1" ]; then
+    (cd "$(dirname "$0")" && python3 -m lumifit.manifest --stage lmdData --task ${SLURM_ARRAY_TASK_ID} --seconds $(($(date +%s) - start_time)) ${output_files}) || echo "could not write the manifest in ${output_path}"
   fi
 fi
   
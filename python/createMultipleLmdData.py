@@ -11,7 +11,7 @@ import os
 import socket
 from pathlib import Path
 
-import lumifit.general as general
+from dataProcessors.LmdDataCreator import writeBinningConfigs
 from lumifit.cluster import ClusterJobManager, Job, JobResourceRequest
 from lumifit.general import getGoodFiles
 from lumifit.gsi_virgo import create_virgo_job_handler
@@ -117,43 +117,15 @@ fileListPath = pathToRootFiles / generateRelativeBunchesDir()
 binningPath = pathToRootFiles / generateRelativeBunchesDir() / generateRelativeBinningDir()
 inputConfigPath = args.config_url
 
-binningPath.mkdir(parents=True, exist_ok=True)
-
-configIO = general.ConfigReaderAndWriter()
-config = configIO.loadConfig(inputConfigPath)
-
 jobCommand = args.jobCommand
 
-for bins in range(
-    args.general_dimension_bins_low,
-    args.general_dimension_bins_high + 1,
-    args.general_dimension_bins_step,
-):
-    if "general_data" in config:
-        subconfig = config["general_data"]
-        if "primary_dimension" in subconfig:
-            subsubconfig = subconfig["primary_dimension"]
-            if "bins" in subsubconfig:
-                subsubconfig["bins"] = bins
-        if "secondary_dimension" in subconfig:
-            subsubconfig = subconfig["secondary_dimension"]
-            if "bins" in subsubconfig:
-                subsubconfig["bins"] = bins
-
-    if "efficiency" in config:
-        subconfig = config["efficiency"]
-        if "primary_dimension" in subconfig:
-            subsubconfig = subconfig["primary_dimension"]
-            if "bins" in subsubconfig:
-                subsubconfig["bins"] = bins
-        if "secondary_dimension" in subconfig:
-            subsubconfig = subconfig["secondary_dimension"]
-            if "bins" in subsubconfig:
-                subsubconfig["bins"] = bins
-
-    # TODO: why tho? what even are the changes above for?
-    print(f"saving config to {binningPath}")
-    configIO.writeConfigToPath(config, binningPath / "dataconfig.json")
+# every binning in the range gets its own config, and createLmdFitData fills all of them in one
+# pass over the track files. the first one goes into binning, the others into binning_{bins}
+binnings = list(range(args.general_dimension_bins_low, args.general_dimension_bins_high + 1, args.general_dimension_bins_step))
+# createKoaFitData.sh passes config_path as one -c, its binary can't take several
+if len(binnings) > 1 and "createKoaFitData" in jobCommand:
+    raise ValueError("createKoaFitData only takes one data config, use a bin range with a single binning for KOALA!")
+configPaths = writeBinningConfigs(inputConfigPath, fileListPath, binnings)
 
 
 fileList, _ = getGoodFiles(fileListPath, "filelist_*.txt", min_filesize_in_bytes=100)
@@ -179,7 +151,7 @@ job.exported_user_variables["pbeam"] = args.lab_momentum
 job.exported_user_variables["input_path"] = pathToRootFiles  # bunches
 job.exported_user_variables["filelist_path"] = fileListPath  # bunches
 job.exported_user_variables["output_path"] = str(binningPath)  # bunches/binning
-job.exported_user_variables["config_path"] = str(binningPath) + "/dataconfig.json"
+job.exported_user_variables["config_path"] = ":".join(str(configPath) for configPath in configPaths)
 job.exported_user_variables["type"] = args.type
 job.exported_user_variables["elastic_cross_section"] = args.elastic_cross_section
 
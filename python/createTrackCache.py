@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+
+"""
+Converts the track files of every file list bunch (bunches/filelist_N.txt) into the columnar
+track cache bunches/trackCache/tracks_N.npy, see lumifit/trackCache.py.
+
+Bunches that are already cached are skipped. As a cluster job, every array task converts
+its own bunch (--bunch ${SLURM_ARRAY_TASK_ID}), see wrappers/trackCache.py.
+"""
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from lumifit.trackCache import TREE_NAME, bunchNumbers, convertBunch, missingBunches
+
+parser = argparse.ArgumentParser(
+    description="Extracts the track parameters of the TrksQA files of each file list bunch into a memory-mappable float32 cache.",
+    formatter_class=argparse.RawTextHelpFormatter,
+)
+
+parser.add_argument(
+    "bunches_path",
+    type=Path,
+    help="the bunches directory with the filelist_N.txt",
+)
+parser.add_argument(
+    "--bunch",
+    type=int,
+    default=None,
+    help="only convert this bunch (the N of filelist_N.txt)",
+)
+parser.add_argument("--tree", type=str, default=TREE_NAME, help="tree with the LMDTrackQ branch")
+parser.add_argument("--processes", type=int, default=4, help="bunches that are converted at the same time")
+parser.add_argument("--force", action="store_true", help="also convert bunches that are already cached")
+
+args = parser.parse_args()
+
+if args.bunch is not None:
+    bunches = [args.bunch]
+elif args.force:
+    bunches = bunchNumbers(args.bunches_path)
+else:
+    bunches = missingBunches(args.bunches_path)
+
+print(f"converting {len(bunches)} bunches in {args.bunches_path}")
+if len(bunches) == 1:
+    convertBunch(args.bunches_path, bunches[0], args.tree)
+elif bunches:
+    with ProcessPoolExecutor(max_workers=args.processes) as executor:
+        # list() so that exceptions of the workers are raised here
+        list(executor.map(convertBunch, [args.bunches_path] * len(bunches), bunches, [args.tree] * len(bunches)))
@@ -0,0 +1,139 @@
+"""
+Splits the track files of a directory into file list bunches for createLmdFitData.
+
+Every bunch is a text file (bunches/filelist_N.txt) with one absolute path per line. This used to live
+in makeMultipleFileListBunches.py, which parses its arguments at import time, so it could only be run
+as a subprocess. The orchestrator now uses this class directly (in a thread, so no os.chdir here),
+makeMultipleFileListBunches.py is just the command line for it.
+"""
+
+import re
+from pathlib import Path
+from typing import List, Optional, Union
+
+from lumifit.bunching import balancedBunches, entryCounts, measuredEventsPerSecond, numberOfBunchesForRuntime
+from lumifit.general import getGoodFiles
+from lumifit.paths import generateRelativeBunchesDir
+from lumifit.validation import validateRootFiles
+
+
+class FileListBuncher:
+    """
+    run() bunches the track files in directory and, with recursive, in all directories below it
+    whose name matches directory_pattern.
+
+    See makeMultipleFileListBunches.py for what the options do.
+    """
+
+    def __init__(
+        self,
+        directory: Optional[Path] = None,
+        filename_prefix: str = "Lumi_TrksQA_",
+        files_per_bunch: int = 4,
+        maximum_number_of_files: int = -1,
+        directory_pattern: str = ".*",
+        recursive: bool = True,
+        force: bool = False,
+        validate_tree: Optional[str] = None,
+        balance_tree: Optional[str] = None,
+        target_minutes_per_bunch: Optional[float] = None,
+        events_per_second: Optional[float] = None,
+        use_manifest: bool = False,
+    ) -> None:
+        self.directory = directory
+        self.filename_prefix = filename_prefix
+        self.files_per_bunch = files_per_bunch
+        self.maximum_number_of_files = maximum_number_of_files
+        self.directory_pattern = directory_pattern
+        self.recursive = recursive
+        self.force = force
+        self.validate_tree = validate_tree
+        self.balance_tree = balance_tree
+        self.target_minutes_per_bunch = target_minutes_per_bunch
+        self.events_per_second = events_per_second
+        self.use_manifest = use_manifest
+        self._dirs: List[Path] = []
+
+    def collect_list_of_directories(self, path: Path) -> None:
+        """
+        Adds all directories below path that match directory_pattern (but not the bunches themselves).
+        """
+        for child in sorted(path.iterdir()):
+            if not child.is_dir() or child in self._dirs or child.name == generateRelativeBunchesDir().name:
+                continue
+            if re.match(self.directory_pattern, child.name):
+                self._dirs.append(child)
+            self.collect_list_of_directories(child)
+
+    def create_file_list_file(self, output_url: Path, list_of_files: List[Union[str, Path]]) -> None:
+        if output_url.exists() and not self.force:
+            print("file already exists, skipping: " + str(output_url))
+            return
+
+        output_url.parent.mkdir(parents=True, exist_ok=True)
+        with open(output_url, "w") as f:
+            for file_url in list_of_files:
+                f.write(f"{file_url}\n")
+
+    def __good_files(self, directory: Path) -> List[Path]:
+        good_files, _ = getGoodFiles(directory, self.filename_prefix + "*", 2000, use_manifest=self.use_manifest)
+
+        if self.validate_tree is not None:
+            verdicts = validateRootFiles(good_files, self.validate_tree)
+            good_files = [good_file for good_file in good_files if verdicts[good_file]]
+            print(f"{len(good_files)} files have entries in tree {self.validate_tree}")
+
+        if self.maximum_number_of_files > 0 and self.maximum_number_of_files < len(good_files):
+            good_files = good_files[: self.maximum_number_of_files]
+        return good_files
+
+    def __balanced_bunches(self, directory: Path, good_files: List[Path], number_of_bunches: int) -> List[List[Path]]:
+        assert self.balance_tree is not None
+        entries = entryCounts(good_files, self.balance_tree)
+        total_entries = sum(entries.values())
+
+        if self.target_minutes_per_bunch is not None:
+            events_per_second = measuredEventsPerSecond(directory)
+            if events_per_second is None:
+                events_per_second = self.events_per_second
+            if events_per_second is None:
+                print("WARNING! Don't know how fast createLmdFitData is (no manifests of an earlier run and no events_per_second), using files_per_bunch.")
+            else:
+                number_of_bunches = numberOfBunchesForRuntime(total_entries, self.target_minutes_per_bunch * 60, events_per_second)
+                print(f"{total_entries} events at {events_per_second:.0f} events/s: {number_of_bunches} bunches of {self.target_minutes_per_bunch} minutes")
+
+        bunches = balancedBunches(entries, number_of_bunches)
+        for index, bunch in enumerate(bunches, start=1):
+            print(f"bunch {index}: {len(bunch)} files, {sum(entries[trackFile] for trackFile in bunch)} events")
+        return bunches
+
+    def make_file_list_bunches(self, directory: Path) -> int:
+        """
+        Writes the file lists for this directory, returns how many.
+        """
+        good_files = self.__good_files(directory)
+        print(f"creating file lists for {directory}...")
+
+        number_of_bunches = -(-len(good_files) // self.files_per_bunch)
+        if self.balance_tree is not None:
+            bunches = self.__balanced_bunches(directory, good_files, number_of_bunches)
+        else:
+            bunches = [good_files[start : start + self.files_per_bunch] for start in range(0, len(good_files), self.files_per_bunch)]
+
+        output_bunch_dir = directory / generateRelativeBunchesDir()
+        if self.force:
+            # an earlier run may have made more bunches, those would be picked up as extra bunches
+            for old_file_list in output_bunch_dir.glob("filelist_*.txt"):
+                old_file_list.unlink()
+        for file_list_index, bunch in enumerate(bunches, start=1):
+            self.create_file_list_file(output_bunch_dir / f"filelist_{file_list_index}.txt", bunch)
+        return len(bunches)
+
+    def run(self) -> None:
+        if self.directory is not None and self.directory not in self._dirs:
+            self._dirs.append(self.directory)
+        if self.recursive:
+            self.collect_list_of_directories(self.directory)  # type: ignore
+
+        for directory in self._dirs:
+            self.make_file_list_bunches(directory)
@@ -0,0 +1,151 @@
+"""
+Creates the lmd data objects of all file list bunches with createLmdFitData (via createLumiFitData.sh
+or createKoaFitData.sh), one array task per bunch.
+
+With several binnings, createLmdFitData fills the lmd data of all of them in one pass over the
+track files. The first binning goes into bunches/binning (that's the one the fit uses), the
+others into bunches/binning_{bins}. Only createLumiFitData.sh splits the ':'-separated configs
+into one -c per config, createKoaFitData.sh and its binary take exactly one, so KOALA
+experiments only get the first binning (several raise a ValueError).
+
+The binary reads thousands of track files, so it always runs as a cluster job. This class prepares
+the binning dir and the data config and builds that job, in-process and without os.chdir, so the
+orchestrator can do that for many experiments at the same time. wrappers/lmdData.py uses it.
+"""
+
+import copy
+from pathlib import Path
+from typing import List, Optional
+
+from lumifit.cluster import Job, JobResourceRequest
+from lumifit.general import ConfigReaderAndWriter, getGoodFiles
+from lumifit.paths import (
+    generateAbsoluteROOTDataPath,
+    generateRelativeBinningDir,
+    generateRelativeBunchesDir,
+)
+from lumifit.recipe import SimulationDataType
+from lumifit.types import ConfigPackage, DataMode, ExperimentParameters, ExperimentType
+
+# the binning of the lmd data that is fitted
+DEFAULT_BINS = 300
+
+
+def lmdDataResourceRequest() -> JobResourceRequest:
+    resource_request = JobResourceRequest(3 * 60)
+    resource_request.number_of_nodes = 1
+    resource_request.processors_per_node = 1
+    resource_request.memory_in_mb = 2500
+    return resource_request
+
+
+def setBins(config: dict, bins: int) -> dict:
+    """
+    A copy of the data config with this many bins in both dimensions of the general data and the efficiency.
+    """
+    config = copy.deepcopy(config)
+    for section in ("general_data", "efficiency"):
+        for dimension in ("primary_dimension", "secondary_dimension"):
+            if "bins" in config.get(section, {}).get(dimension, {}):
+                config[section][dimension]["bins"] = bins
+    return config
+
+
+def writeBinningConfigs(inputConfigPath: Path, bunchesPath: Path, binnings: List[int]) -> List[Path]:
+    """
+    Writes bunches/binning/dataconfig.json for the first binning and bunches/binning_{bins}/dataconfig.json
+    for the others, returns their paths.
+    """
+    # Why OOP?
+    configIO = ConfigReaderAndWriter()
+    config = configIO.loadConfig(inputConfigPath)
+
+    configPaths: List[Path] = []
+    for index, bins in enumerate(binnings):
+        binningPath = bunchesPath / generateRelativeBinningDir(None if index == 0 else bins)
+        binningPath.mkdir(parents=True, exist_ok=True)
+        print(f"saving config with {bins} bins to {binningPath}")
+        configIO.writeConfigToPath(setBins(config, bins), binningPath / "dataconfig.json")
+        configPaths.append(binningPath / "dataconfig.json")
+    return configPaths
+
+
+class LmdDataCreator:
+    def __init__(
+        self,
+        experiment: ExperimentParameters,
+        simDataType: SimulationDataType,
+        elasticCrossSection: float,
+        binnings: Optional[List[int]] = None,
+    ) -> None:
+        self.experiment = experiment
+        self.simDataType = simDataType
+        self.binnings = binnings if binnings else [DEFAULT_BINS]
+        if len(self.binnings) > 1 and experiment.experimentType == ExperimentType.KOALA:
+            raise ValueError("createKoaFitData only takes one data config, KOALA lmd data can't have several binnings!")
+
+        # I think the binary has a special case for angular data
+        if simDataType != SimulationDataType.ANGULAR:
+            elasticCrossSection = 1.0
+        self.elasticCrossSection = elasticCrossSection
+
+        self.configPackage = self.__configPackage()
+        # make root data path
+        if simDataType == SimulationDataType.VERTEX:
+            self.pathToRootFiles = generateAbsoluteROOTDataPath(configPackage=self.configPackage, dataMode=DataMode.VERTEXDATA)
+        else:
+            self.pathToRootFiles = generateAbsoluteROOTDataPath(configPackage=self.configPackage)
+
+        self.fileListPath = self.pathToRootFiles / generateRelativeBunchesDir()
+        self.binningPath = self.pathToRootFiles / generateRelativeBunchesDir() / generateRelativeBinningDir()
+
+    def __configPackage(self) -> ConfigPackage:
+        if self.simDataType in (SimulationDataType.VERTEX, SimulationDataType.ANGULAR):
+            return self.experiment.dataPackage
+        elif self.simDataType == SimulationDataType.EFFICIENCY_RESOLUTION:
+            return self.experiment.resAccPackage
+        raise NotImplementedError(f"Simulation type {self.simDataType} is not implemented!")
+
+    def write_configs(self) -> List[Path]:
+        """
+        Writes the data config of every binning for the binary and returns their paths.
+        """
+        return writeBinningConfigs(self.experiment.dataConfigPath, self.fileListPath, self.binnings)
+
+    def number_of_file_lists(self) -> int:
+        fileList, _ = getGoodFiles(self.fileListPath, "filelist_*.txt", min_filesize_in_bytes=100)
+        return len(fileList)
+
+    def create_job(self, numFileLists: Optional[int] = None) -> Job:
+        """
+        Creates the job array that runs createLmdFitData on every file list bunch.
+
+        The array size is the number of file lists found in the bunches dir, unless numFileLists
+        is given. That's needed when the bunches don't exist yet because the bunching job is still
+        waiting in the queue. Array tasks without a file list exit early (see createLumiFitData.sh).
+        """
+        config_paths = self.write_configs()
+
+        numFileList = self.number_of_file_lists() if numFileLists is None else numFileLists
+        if numFileList < 1:
+            raise RuntimeError("No filelists found!")
+
+        job = Job(
+            lmdDataResourceRequest(),
+            self.experiment.LMDDataCommand,
+            "createFitData",
+            str(self.binningPath) + "/createFitData-%a.log",
+            array_indices=list(range(1, numFileList + 1)),
+        )
+        # apparently 0 means all?
+        job.exported_user_variables["numEv"] = str(0)
+        job.exported_user_variables["pbeam"] = f"{self.configPackage.recoParams.lab_momentum:.2f}"
+        job.exported_user_variables["input_path"] = self.pathToRootFiles  # bunches
+        job.exported_user_variables["filelist_path"] = self.fileListPath  # bunches
+        job.exported_user_variables["output_path"] = str(self.binningPath)  # bunches/binning
+        # separated like PATH (slurm's --export can't take spaces or commas), createLumiFitData.sh passes each with -c
+        job.exported_user_variables["config_path"] = ":".join(str(config_path) for config_path in config_paths)
+        job.exported_user_variables["type"] = self.simDataType.value
+        job.exported_user_variables["elastic_cross_section"] = self.elasticCrossSection
+
+        return job
@@ -0,0 +1,187 @@
+"""
+Merges the lmd data objects of all bunches with bin/mergeLmdData.
+
+This used to live in mergeMultipleLmdData.py, which parses its arguments at import time. The
+orchestrator now uses this class directly, mergeMultipleLmdData.py is just the command line for it.
+
+One mergeLmdData over hundreds of bunches takes minutes, so with more than fan_in files the merge
+is a tree: the files are merged in groups of fan_in at the same time, then the merged groups, and so
+on. Merged lmd data can be merged again, so the result is the same. Every group is a directory in
+binning/merge_tree_{type} with symlinks to its files, because mergeLmdData takes a directory.
+The data types (e and r of er) are merged at the same time, too.
+"""
+
+import os
+import shutil
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List, Optional
+
+from attrs import define
+from lumifit.general import getGoodFiles
+from lumifit.manifest import recordOutputs
+from lumifit.paths import (
+    generateRelativeBinningDir,
+    generateRelativeBunchesDir,
+    generateRelativeMergeDir,
+)
+
+
+@define(frozen=True)
+class DataTypeInfo:
+    data_type: str
+    patternForBinary: str
+    patternForGetGoodFiles: str
+
+
+# the binary takes a regex, getGoodFiles a glob
+DATA_TYPE_INFOS = {
+    "a": DataTypeInfo("a", "lmd_data_\\d*.root", "lmd_data_*.root"),
+    "e": DataTypeInfo("e", "lmd_acc_data_\\d*.root", "lmd_acc_data_*.root"),
+    "r": DataTypeInfo("r", "lmd_res_data_\\d*.root", "lmd_res_data_*.root"),
+    "h": DataTypeInfo("h", "lmd_res_data_\\d*.root", "lmd_res_data_*.root"),
+    "v": DataTypeInfo("v", "lmd_vertex_data_\\d*.root", "lmd_vertex_data_*.root"),
+}
+
+
+# files that mergeLmdData merges at once in a tree merge, 0 merges all files at once
+DEFAULT_FAN_IN = 16
+
+
+def dataTypeInfos(data_types: str) -> List[DataTypeInfo]:
+    """
+    One info per letter. This also catches multiple modes at once, like "er". This is by design, don't change it!
+    """
+    return [info for letter, info in DATA_TYPE_INFOS.items() if letter in data_types]
+
+
+class LmdDataMerger:
+    """
+    run() merges the lmd data of every type in data_types (a, e, r, h, v or combinations like er)
+    in directory/bunches/binning (or binning_{bins} for an additional binning) into its merge_data subdirectory.
+
+    processes is the number of mergeLmdData that run at the same time per data type.
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        data_types: str,
+        lmdfit_build_path: Path,
+        num_samples: int = 1,
+        sample_size: int = 0,
+        bins: Optional[int] = None,
+        fan_in: int = DEFAULT_FAN_IN,
+        processes: int = 4,
+    ) -> None:
+        self.directory = directory
+        self.data_types = data_types
+        self.lmdfit_build_path = lmdfit_build_path
+        self.num_samples = num_samples
+        self.sample_size = sample_size
+        self.fan_in = fan_in
+        self.processes = processes
+        self.pathToBinning = directory / generateRelativeBunchesDir() / generateRelativeBinningDir(bins)
+
+    def __good_files(self, data_type_info: DataTypeInfo) -> List[Path]:
+        goodFilesList, _ = getGoodFiles(self.pathToBinning, data_type_info.patternForGetGoodFiles)
+        if len(goodFilesList) < 1:
+            raise RuntimeError(f"no files found for {data_type_info.data_type} in {self.pathToBinning}")
+        return sorted(goodFilesList)
+
+    def __call_merge_binary(self, path: Path, data_type_info: DataTypeInfo) -> int:
+        """
+        Runs mergeLmdData on the files in path, the output goes into path/merge_data.
+        """
+        print(f"starting merge for {path}")
+        bashcommand = [
+            f"{self.lmdfit_build_path}/bin/mergeLmdData",
+            "-p",
+            str(path),
+            "-t",
+            data_type_info.data_type,
+            "-n",
+            str(self.num_samples),
+            "-s",
+            str(self.sample_size),
+            "-f",
+            data_type_info.patternForBinary,
+        ]
+        print(" ".join(bashcommand))
+        return subprocess.call(bashcommand)
+
+    def __record_merged_files(self, data_type_info: DataTypeInfo, start_time: float) -> None:
+        # the merged files go into the manifest of the merge dir, see lumifit.manifest
+        mergedFiles = sorted((self.pathToBinning / generateRelativeMergeDir()).glob(data_type_info.patternForGetGoodFiles))
+        recordOutputs(mergedFiles, "merge", timings={"mergeLmdData": time.time() - start_time})
+
+    def merge(self, data_type_info: DataTypeInfo) -> int:
+        """
+        Merges all files of one data type at once, returns the exit code of mergeLmdData.
+        Raises a RuntimeError if there is nothing to merge.
+        """
+        self.__good_files(data_type_info)
+        start_time = time.time()
+        returnvalue = self.__call_merge_binary(self.pathToBinning, data_type_info)
+        self.__record_merged_files(data_type_info, start_time)
+        return returnvalue
+
+    def __link_group(self, groupPath: Path, files: List[Path], data_type_info: DataTypeInfo) -> Path:
+        """
+        A directory with symlinks to these files, named so that mergeLmdData finds them.
+        """
+        groupPath.mkdir(parents=True)
+        for index, dataFile in enumerate(files, start=1):
+            os.symlink(dataFile.resolve(), groupPath / data_type_info.patternForGetGoodFiles.replace("*", str(index)))
+        return groupPath
+
+    def tree_merge(self, data_type_info: DataTypeInfo) -> int:
+        """
+        Merges one data type in a tree of groups of fan_in files, returns the exit code of the last
+        mergeLmdData. With few files (or bootstrapped samples), this is just merge().
+        Raises a RuntimeError if there is nothing to merge or a group fails.
+        """
+        partials = self.__good_files(data_type_info)
+        if self.fan_in < 2 or len(partials) <= self.fan_in or self.num_samples != 1:
+            return self.merge(data_type_info)
+
+        start_time = time.time()
+        treePath = self.pathToBinning / f"merge_tree_{data_type_info.data_type}"
+        # leftovers of a merge that was killed
+        shutil.rmtree(treePath, ignore_errors=True)
+
+        level = 0
+        while len(partials) > self.fan_in:
+            level += 1
+            groups = [partials[start : start + self.fan_in] for start in range(0, len(partials), self.fan_in)]
+            print(f"merge level {level}: {len(partials)} files of type {data_type_info.data_type} in {len(groups)} groups")
+            groupPaths = [self.__link_group(treePath / f"level_{level}" / f"group_{index}", group, data_type_info) for index, group in enumerate(groups, start=1)]
+
+            with ThreadPoolExecutor(max_workers=self.processes, thread_name_prefix=f"merge_{data_type_info.data_type}") as executor:
+                returnvalues = list(executor.map(lambda groupPath: self.__call_merge_binary(groupPath, data_type_info), groupPaths))
+            failed = [str(groupPath) for groupPath, returnvalue in zip(groupPaths, returnvalues) if returnvalue != 0]
+            if failed:
+                raise RuntimeError(f"mergeLmdData failed for {', '.join(failed)}")
+
+            partials = sorted(mergedFile for groupPath in groupPaths for mergedFile in (groupPath / generateRelativeMergeDir()).glob("*.root"))
+
+        # the last merge writes into the usual merge dir
+        finalPath = self.__link_group(treePath / "final", partials, data_type_info)
+        returnvalue = self.__call_merge_binary(finalPath, data_type_info)
+        if returnvalue == 0:
+            mergePath = self.pathToBinning / generateRelativeMergeDir()
+            mergePath.mkdir(exist_ok=True)
+            for mergedFile in (finalPath / generateRelativeMergeDir()).glob("*.root"):
+                os.replace(mergedFile, mergePath / mergedFile.name)
+            shutil.rmtree(treePath)
+        self.__record_merged_files(data_type_info, start_time)
+        return returnvalue
+
+    def run(self) -> None:
+        # This is either one mode (a,v) or two modes (er, which combines e and r), which are merged at the same time
+        data_type_infos = dataTypeInfos(self.data_types)
+        with ThreadPoolExecutor(max_workers=max(1, len(data_type_infos)), thread_name_prefix="merge") as executor:
+            # list() so that exceptions are raised here
+            list(executor.map(self.tree_merge, data_type_infos))
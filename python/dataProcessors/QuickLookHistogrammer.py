@@ -0,0 +1,76 @@
+"""
+Histograms the track files of all file list bunches with numpy (see lumifit.histograms), one
+process per bunch, and adds the histograms of the bunches up.
+
+A bunch is read from the track cache (see lumifit.trackCache) if it's cached, otherwise from
+the TrksQA files in its file list with uproot. This takes minutes on a workstation, instead of
+waiting for the createLmdFitData job array, but it's only for QA: the fit still needs the lmd data.
+"""
+
+import json
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List
+
+from lumifit.histograms import Histogram, HistogramSpec, fillHistograms, mergeHistogramFiles, saveHistograms, specsFromConfig
+from lumifit.paths import generateRelativeQuickLookDir
+from lumifit.trackCache import TREE_NAME, bunchNumbers, isCached, iterateTrackCache, iterateTrackFiles, readFileList, trackCachePath
+
+
+def histogramBunch(bunchesPath: Path, bunch: int, specs: List[HistogramSpec], treeName: str = TREE_NAME) -> Path:
+    """
+    Histograms one bunch into bunches/quickLook/histograms_N.npz. Module level, so the process pool can pickle it.
+    """
+    if isCached(bunchesPath, bunch):
+        chunks = iterateTrackCache([trackCachePath(bunchesPath, bunch)])
+    else:
+        chunks = iterateTrackFiles(readFileList(bunchesPath, bunch), treeName)
+
+    output = bunchesPath / generateRelativeQuickLookDir() / f"histograms_{bunch}.npz"
+    saveHistograms(fillHistograms(chunks, specs), output)
+    return output
+
+
+class QuickLookHistogrammer:
+    """
+    run() histograms the data types (a, e, r or combinations like er) of every bunch in
+    bunches_path with the binning of the data config, and writes the sum to
+    bunches/quickLook/histograms.npz.
+    """
+
+    def __init__(
+        self,
+        bunches_path: Path,
+        data_config_path: Path,
+        data_types: str = "a",
+        tree_name: str = TREE_NAME,
+        processes: int = 4,
+    ) -> None:
+        self.bunches_path = bunches_path
+        self.tree_name = tree_name
+        self.processes = processes
+
+        with open(data_config_path) as f:
+            self.specs = specsFromConfig(json.load(f), data_types)
+
+    def run(self) -> Dict[str, Histogram]:
+        bunches = bunchNumbers(self.bunches_path)
+        if len(bunches) < 1:
+            raise RuntimeError(f"No filelists found in {self.bunches_path}!")
+
+        print(f"histogramming {len(bunches)} bunches in {self.bunches_path} with {self.processes} processes")
+        with ProcessPoolExecutor(max_workers=min(self.processes, len(bunches))) as executor:
+            bunchFiles = list(
+                executor.map(
+                    histogramBunch,
+                    [self.bunches_path] * len(bunches),
+                    bunches,
+                    [self.specs] * len(bunches),
+                    [self.tree_name] * len(bunches),
+                )
+            )
+
+        output = self.bunches_path / generateRelativeQuickLookDir() / "histograms.npz"
+        merged = mergeHistogramFiles(bunchFiles, output)
+        print(f"saved the histograms of {len(bunchFiles)} bunches to {output}")
+        return merged
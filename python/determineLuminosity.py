@@ -1,40 +1,56 @@
 #!/usr/bin/env python3
 
 import argparse
-import concurrent.futures
+import asyncio
 import copy
 import json
-import math
 import os
-import subprocess
 from enum import Enum
 from pathlib import Path
-from time import sleep
-from typing import List, Optional
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
 
-from lumifit.cluster import ClusterJobManager
+from dataProcessors.FileListBuncher import FileListBuncher
+from dataProcessors.LmdDataCreator import DEFAULT_BINS, lmdDataResourceRequest
+from dataProcessors.LmdDataMerger import DEFAULT_FAN_IN, LmdDataMerger
+from lumifit.artifacts import ArtifactCache, configPackageHash, linkArtifacts, softwareVersion
+from lumifit.cluster import ClusterJobManager, Job, JobHandler, JobResourceRequest, LocalJobHandler
 from lumifit.config import load_params_from_file, write_params_to_file
-from lumifit.general import getGoodFiles
+from lumifit.general import getGoodFiles, isIndexedFilePresentAndValid
 from lumifit.gsi_virgo import create_virgo_job_handler
 from lumifit.himster import create_himster_job_handler
+from lumifit.journal import Journal
+from lumifit.manifest import isRecordValid, readManifest
+from lumifit.orchestrator import Orchestrator
 from lumifit.paths import (
-    generateAbsoluteMergeDataPath,
-    generateAbsoluteROOTDataPath,
+    generateAbsoluteROOTDataPathForSimType,
     generateRelativeBinningDir,
     generateRelativeBunchesDir,
     generateRelativeMergeDir,
+    generateRelativeTrackCacheDir,
 )
-from lumifit.recipe import (
-    SimRecipe,
-    SimulationDataType,
-    SimulationState,
-    SimulationTask,
+from lumifit.planner import Planner, exportPlan, printPlan
+from lumifit.precision import estimateAcceptancePrecision
+from lumifit.recipe import SimulationDataType, SimulationTask
+from lumifit.stages import Stage, StageGraph
+from lumifit.streaming import BunchStreamer
+from lumifit.trackCache import bunchNumbers, missingBunches
+from lumifit.types import ClusterEnvironment, DataMode, ExperimentParameters, ExperimentType
+from lumifit.validation import trackTreeName, validateRootFiles
+from wrappers.createRecoJob import create_reconstruction_job, recoResourceRequest
+from wrappers.createSimRecoJob import create_simulation_and_reconstruction_job, simRecoResourceRequest
+from wrappers.fileListBunches import createFileListBunchesJob, expectedNumberOfFileLists, getConfigPackageForSimType
+from wrappers.ipDetermination import (
+    adoptSpeculativeResAcc,
+    applyRecoIP,
+    createIPDeterminationJob,
+    createSpeculativeResAccExperiment,
+    determineIP,
+    speculativeResAccIsReusable,
 )
-from lumifit.types import ClusterEnvironment, DataMode, ExperimentParameters
-from wrappers.createRecoJob import create_reconstruction_job
-from wrappers.createSimRecoJob import create_simulation_and_reconstruction_job
 from wrappers.lmdData import createLmdDataJob
-from wrappers.lumiFit import createLumiFitJob
+from wrappers.lumiFit import createLumiFitJob, lumiFitResourceRequest
+from wrappers.mergeData import createMergeDataJob
+from wrappers.trackCache import createTrackCacheJob, trackCacheResourceRequest
 
 """
 
@@ -46,6 +62,13 @@ Determines the luminosity of a set of Lumi_TrksQA_* files.
 """
 
 
+# number of TrksQA files per file list bunch
+FILES_PER_BUNCH = 10
+
+# how often new track files are looked for with --stream_bunches
+STREAM_POLL_INTERVAL_IN_SECONDS = 60
+
+
 class StatusCode(Enum):
     ENOUGH_FILES = 0
     NO_FILES = 2
@@ -71,6 +94,7 @@ def enoughFilesPresent(
         directory,
         glob_pattern,
         min_filesize_in_bytes=min_filesize_in_bytes,
+        use_manifest=args.use_manifests,
     )
 
     print(f"files percentage (depends on getGoodFiles) is {files_percentage}")
@@ -81,516 +105,917 @@ def enoughFilesPresent(
     return StatusCode.NO_FILES
 
 
-def executeTask(experiment: ExperimentParameters, task: SimulationTask) -> Optional[int]:
-    """
-    A task is always three steps:
+def getDataPattern(simDataType: SimulationDataType) -> str:
+    if simDataType == SimulationDataType.VERTEX:
+        return "lmd_vertex_data_"
+    elif simDataType == SimulationDataType.ANGULAR:
+        return "lmd_data_"
+    elif simDataType == SimulationDataType.EFFICIENCY_RESOLUTION:
+        return "lmd_res_data_"
+    else:
+        raise NotImplementedError(f"Simulation type {simDataType} is not implemented!")
 
-    - simulate and/or reconstruct data
-    - make file list bunches (that means make some lists of files that are merged later)
-    - merge data (that means merge the bunches into one file)
 
-    If some of this data already exists, the intermediate step is skipped.
+def expectedArrayIndices(experiment: ExperimentParameters, simDataType: SimulationDataType) -> List[int]:
+    """
+    The array indices the sim/reco job for this data type runs with.
+    Must match createSimRecoJob (sim params) and createRecoJob (reco params).
+    """
+    if simDataType == SimulationDataType.ANGULAR:
+        params = experiment.dataPackage.recoParams
+    elif simDataType == SimulationDataType.VERTEX:
+        assert experiment.dataPackage.simParams is not None
+        params = experiment.dataPackage.simParams
+    elif simDataType == SimulationDataType.EFFICIENCY_RESOLUTION:
+        assert experiment.resAccPackage.simParams is not None
+        params = experiment.resAccPackage.simParams
+    else:
+        raise NotImplementedError(f"Simulation type {simDataType} is not implemented!")
 
-    That's it already, HOWEVER:
-    Since there are three different types of data (vertex, angular, res/acc)
-    and each of these can be in a different state, there are a lot of if branches
-    here.
+    return list(range(params.low_index, params.low_index + params.num_samples))
 
-    Worse, a task will have a state its in. When it finishes a step, this internal
-    state is incremented. That means a task must be handled multiple times UNTIL
-    it's in the done-state.
 
-    Returns: the job ID if a job was submitted or
-    None if an intermediate step was executed locally (i.e. not on a cluster).
+def missingArrayIndices(experiment: ExperimentParameters, simDataType: SimulationDataType) -> List[int]:
     """
-    print(f"executeTask: {experiment.experimentDir}")
-    print(f"running simulation of type {str(task.simDataType)} at states:")
-    print(f"current state: {str(task.simState)}")
+    Returns the array indices of the sim/reco job whose track file is missing or broken.
+
+    runLmdReco.py writes {trackFilePattern}{start_evt}.root with start_evt = num_events_per_sample * index,
+    so we can tell exactly which array task didn't produce its output.
 
-    # data pattern is used to check if previous simulation steps were successfully run
-    # the config patten switch is essential to generate the correct paths
-    data_pattern = ""
-    if task.simDataType == SimulationDataType.VERTEX:
-        data_pattern = "lmd_vertex_data_"
-        configPackage = experiment.dataPackage
-    elif task.simDataType == SimulationDataType.ANGULAR:
-        configPackage = experiment.dataPackage
-        data_pattern = "lmd_data_"
-    elif task.simDataType == SimulationDataType.EFFICIENCY_RESOLUTION:
-        configPackage = experiment.resAccPackage
-        data_pattern = "lmd_res_data_"
+    With --validate_root_files, truncated or empty track files count as missing too.
+    With --use_manifests, track files the reco tasks didn't report as done count as missing as well.
+    """
+    if simDataType == SimulationDataType.EFFICIENCY_RESOLUTION:
+        recoParams = experiment.resAccPackage.recoParams
     else:
-        raise NotImplementedError(f"Simulation type {task.simDataType} is not implemented!")
-
-    # 1. simulate data
-    if task.simState == SimulationState.START_SIM:
-        if task.simDataType == SimulationDataType.EFFICIENCY_RESOLUTION:
-            """
-            efficiency / resolution calculation.
-
-            Takes the offset of the IP into account.
-
-            TODO: This needs to know the misalignment of the detector for the sim steps
-            and the alignment for the reconstruction.
-            Since real data has unknown misalignment, we must use the inverse alignment matrices
-            to model the acceptance of the real detector faithfully.
-            """
-
-            assert experiment.resAccPackage.simParams is not None
-
-            # TODO: later, WITH alignment since that affects the acceptance!
-            resAccDataDir = generateAbsoluteROOTDataPath(configPackage=configPackage)
-            status_code = enoughFilesPresent(directory=resAccDataDir, glob_pattern=experiment.trackFilePattern + "*.root")
-
-            if status_code == StatusCode.ENOUGH_FILES:
-                task.simState = SimulationState.MAKE_BUNCHES
-                return None
-
-            elif status_code == StatusCode.NO_FILES:
-                # then lets simulate!
-                # this command runs the full sim software with box gen data
-                # (or dpm gen data for KOALA)
-                # to generate the acceptance and resolution information
-                # for this sample
-                # note: beam tilt and divergence are not necessary here,
-                # because that is handled completely by the model
-
-                # TODO: alignment part
-                # if alignement matrices were specified, we used them as a mis-alignment
-                # and alignment for the box simulations
-
-                job = create_simulation_and_reconstruction_job(
-                    experiment,
-                    thisMode=DataMode.RESACC,
-                    use_devel_queue=args.use_devel_queue,
-                )
-                returnJobID = job_manager.enqueue(job)
-                return int(returnJobID)
-            else:
-                raise RuntimeError(f"Status code {status_code} is unexpected!")
-
-        elif task.simDataType == SimulationDataType.ANGULAR:
-            """
-            a is the angular case. this is the data set onto which the luminosity fit is performed.
-            it is therefore REAL digi data (or DPM data of course) that must be reconstructed again
-            with the updated reco parameter (like the IP position, cuts applied and alignment).
-            note: beam tilt and divergence are not used here because
-            only the last reco steps are rerun of the track reco
-            """
-
-            angularDataDir = generateAbsoluteROOTDataPath(experiment.dataPackage)
-            status_code = enoughFilesPresent(
-                directory=angularDataDir,
-                glob_pattern=experiment.trackFilePattern + "*.root",
-            )
-            if status_code == StatusCode.ENOUGH_FILES:
-                task.simState = SimulationState.MAKE_BUNCHES
-                return None
+        recoParams = experiment.dataPackage.recoParams
+    pathToRootFiles = generateAbsoluteROOTDataPathForSimType(experiment, simDataType)
+
+    trackFiles = {
+        index: pathToRootFiles / f"{experiment.trackFilePattern}{recoParams.num_events_per_sample * index}.root" for index in expectedArrayIndices(experiment, simDataType)
+    }
+    records = readManifest(pathToRootFiles) if args.use_manifests else None
+    if records is not None:
+        missingIndices = [index for index, trackFile in trackFiles.items() if not isRecordValid(records.get(trackFile.name))]
+    else:
+        missingIndices = [index for index, trackFile in trackFiles.items() if not isIndexedFilePresentAndValid(trackFile)]
 
-            elif status_code == StatusCode.NO_FILES:
-                # TODO: alignment part
+    if args.validate_root_files:
+        presentFiles = [trackFile for index, trackFile in trackFiles.items() if index not in missingIndices]
+        verdicts = validateRootFiles(presentFiles, trackTreeName(experiment.experimentType))
+        missingIndices = [index for index, trackFile in trackFiles.items() if index in missingIndices or not verdicts[trackFile]]
 
-                job = create_reconstruction_job(
-                    experiment,
-                    thisMode=DataMode.DATA,
-                    use_devel_queue=args.use_devel_queue,
-                )
-                returnJobID = job_manager.enqueue(job)
-                return int(returnJobID)
-            else:
-                raise RuntimeError(f"Status code {status_code} is unexpected!")
+    return missingIndices
 
-        elif task.simDataType == SimulationDataType.VERTEX:
-            assert experiment.dataPackage.MCDataDir is not None
-            mcDataDir = experiment.dataPackage.MCDataDir
 
-            status_code = enoughFilesPresent(directory=mcDataDir, glob_pattern="Lumi_MC_*.root")
+def cachedDirectories(experiment: ExperimentParameters, simDataType: SimulationDataType) -> Dict[str, Tuple[Path, str]]:
+    """
+    The directories (and file patterns) the sim/reco job of this data type writes, by cache stage name.
+    The angular reconstruction needs the digi files of the vertex simulation, so those come along.
+    """
+    directories = {"trackFiles": (generateAbsoluteROOTDataPathForSimType(experiment, simDataType), f"{experiment.trackFilePattern}*.root")}
+    if simDataType == SimulationDataType.VERTEX:
+        assert experiment.dataPackage.MCDataDir is not None
+        directories["mcData"] = (experiment.dataPackage.MCDataDir, "Lumi_*.root")
+    return directories
 
-            if status_code == StatusCode.ENOUGH_FILES:
-                task.simState = SimulationState.MAKE_BUNCHES
-                return None
 
-            elif status_code == StatusCode.NO_FILES:
-                # vertex data must always be created without any cuts first
-                copyExperiment = copy.deepcopy(experiment)
-                copyExperiment.dataPackage.recoParams.disableCuts()
+def artifactKey(experiment: ExperimentParameters, simDataType: SimulationDataType) -> Optional[str]:
+    """
+    Returns the artifact cache key for the sim/reco outputs of this data type,
+    or None if there is no cache (or we don't know the software version).
+    """
+    if artifact_cache is None:
+        return None
+    version = softwareVersion(experiment.softwarePaths)
+    if version is None:
+        print("WARNING! Could not determine the software version, not using the artifact cache.")
+        return None
+
+    if simDataType == SimulationDataType.EFFICIENCY_RESOLUTION:
+        return configPackageHash(experiment.resAccPackage, DataMode.RESACC, version)
+    elif simDataType == SimulationDataType.VERTEX:
+        return configPackageHash(experiment.dataPackage, DataMode.VERTEXDATA, version)
+    else:
+        return configPackageHash(experiment.dataPackage, DataMode.DATA, version)
 
-                # TODO: misalignment is important here. the vertex data can have misalignment (because it's real data)
-                # but it has no alignment yet. that is only for the second reconstruction
 
-                job = create_simulation_and_reconstruction_job(
-                    copyExperiment,
-                    thisMode=DataMode.VERTEXDATA,
-                    use_devel_queue=args.use_devel_queue,
-                )
-                del copyExperiment
-                returnJobID = job_manager.enqueue(job)
-                return int(returnJobID)
-            else:
-                raise RuntimeError(f"Status code {status_code} is unexpected!")
+def linkCachedArtifacts(experiment: ExperimentParameters, simDataType: SimulationDataType) -> None:
+    """
+    Links the sim/reco outputs of another experiment with the same params, if there are any.
+    """
+    key = artifactKey(experiment, simDataType)
+    if key is None:
+        return
+    assert artifact_cache is not None
+    for stage, (directory, glob_pattern) in cachedDirectories(experiment, simDataType).items():
+        cachedDirectory = artifact_cache.lookup(key, stage)
+        if cachedDirectory is None or cachedDirectory == directory:
+            continue
+        linked = linkArtifacts(cachedDirectory, directory, glob_pattern)
+        print(f"linked {linked} cached {stage} files of {simDataType} from {cachedDirectory}")
 
-        else:
-            raise ValueError(f"This tasks simType is {task.simDataType}, which is invalid!")
 
-    # 2. create data (that means bunch data, create data objects)
-    if task.simState == SimulationState.MAKE_BUNCHES:
-        """
-        Okay, quick recap what's happening here:
+def registerArtifacts(experiment: ExperimentParameters, simDataType: SimulationDataType) -> None:
+    key = artifactKey(experiment, simDataType)
+    if key is None:
+        return
+    assert artifact_cache is not None
+    for stage, (directory, _) in cachedDirectories(experiment, simDataType).items():
+        artifact_cache.register(key, stage, directory)
 
-        makeMultipleFileListBunches is ALWAYS called, but the path depends on if
-        we're in angular, vertex or resAcc mode.
 
-        createMultipleLmdData is ALSO ALWAYS called, for the path same as above,
-        AND elastic_cross_section is passed IF we're in ANGULAR mode
+def createSimulationJob(experiment: ExperimentParameters, simDataType: SimulationDataType) -> Job:
+    if simDataType == SimulationDataType.EFFICIENCY_RESOLUTION:
+        """
+        efficiency / resolution calculation.
+
+        Takes the offset of the IP into account.
 
-        lastly the status_code check and the branch exits.
-        Fuck I want to rewrite this logic shit so badly, but the path shit is more
-        important shit right now, so I'll just leave this shit comment to do this
-        shit later.
+        TODO: This needs to know the misalignment of the detector for the sim steps
+        and the alignment for the reconstruction.
+        Since real data has unknown misalignment, we must use the inverse alignment matrices
+        to model the acceptance of the real detector faithfully.
         """
 
-        # okay, we are either in DATA mode or RESACC mode, so choose the
-        # correct configPackage. also, in VERTEX mode, the reco params don't
-        # have cuts!
-        # yes, I hate this too, this will all be scrapped
-        # once these scripts are proper modules
-        # TODO: kick this case switch!
-        if task.simDataType == SimulationDataType.VERTEX:
-            pathToRootFiles = generateAbsoluteROOTDataPath(configPackage=configPackage, dataMode=DataMode.VERTEXDATA)
-        else:
-            pathToRootFiles = generateAbsoluteROOTDataPath(configPackage=configPackage)
+        assert experiment.resAccPackage.simParams is not None
+
+        # this command runs the full sim software with box gen data
+        # (or dpm gen data for KOALA)
+        # to generate the acceptance and resolution information
+        # for this sample
+        # note: beam tilt and divergence are not necessary here,
+        # because that is handled completely by the model
 
-        binningPath = pathToRootFiles / generateRelativeBunchesDir() / generateRelativeBinningDir()
+        # TODO: alignment part
+        # if alignement matrices were specified, we used them as a mis-alignment
+        # and alignment for the box simulations
 
-        # TODO: this check shouldn't be here but in the makeMultipleFileListBunches or createMultipleLmdData modules. This script should only execute the steps in the right order. If anything is already there, the submodules can just exit early.
-        status_code = enoughFilesPresent(
-            directory=binningPath,
-            glob_pattern=data_pattern + "*",
+        return create_simulation_and_reconstruction_job(
+            experiment,
+            thisMode=DataMode.RESACC,
+            use_devel_queue=args.use_devel_queue,
         )
 
-        if status_code == StatusCode.ENOUGH_FILES:
-            print("skipping bunching and data object creation...")
-            task.simState = SimulationState.MERGE
-            return None
-
-        elif status_code == StatusCode.NO_FILES:
-            # create bunch files
-            os.chdir(experiment.softwarePaths.LmdFitScripts)
-            multiFileListCommand: List[str] = []
-            multiFileListCommand.append("python")
-            multiFileListCommand.append("makeMultipleFileListBunches.py")
-            multiFileListCommand.append("--filenamePrefix")
-            multiFileListCommand.append(f"{experiment.trackFilePattern}")
-            multiFileListCommand.append("--files_per_bunch")
-            multiFileListCommand.append("10")
-            multiFileListCommand.append("--maximum_number_of_files")
-
-            multiFileListCommand.append(str(configPackage.recoParams.num_samples))
-            multiFileListCommand.append(str(pathToRootFiles))
-
-            print(f"Bash command for file list bunch creation:\n{' '.join(multiFileListCommand)}\n")
-            _ = subprocess.call(multiFileListCommand)
-
-            multiFileListCommand.clear()
-
-            # we need the elastic cross section for the angular data
-            csFile = experiment.experimentDir / "elastic_cross_section.txt"
-            if not csFile.exists():
-                raise FileNotFoundError("ERROR! Can not find elastic cross section file! The determined Luminosity will be wrong!\n")
-            with open(csFile, "r") as f:
-                content = f.readlines()
-                el_cs = float(content[0])
-
-            # create LMD data objects
-            LMDdataJob = createLmdDataJob(experiment, task, el_cs)
-
-            # was apparently bunches
-            returnJobID = job_manager.enqueue(LMDdataJob)
-            return int(returnJobID)
-        else:
-            raise RuntimeError(f"Status code {status_code} is unexpected!")
+    elif simDataType == SimulationDataType.ANGULAR:
+        """
+        a is the angular case. this is the data set onto which the luminosity fit is performed.
+        it is therefore REAL digi data (or DPM data of course) that must be reconstructed again
+        with the updated reco parameter (like the IP position, cuts applied and alignment).
+        note: beam tilt and divergence are not used here because
+        only the last reco steps are rerun of the track reco
+        """
 
-    # 3. merge data
-    if task.simState == SimulationState.MERGE:
-        # TODO: kick this case switch!
-        if task.simDataType == SimulationDataType.VERTEX:
-            pathToRootFiles = generateAbsoluteROOTDataPath(configPackage=configPackage, dataMode=DataMode.VERTEXDATA)
-        else:
-            pathToRootFiles = generateAbsoluteROOTDataPath(configPackage=configPackage)
+        # TODO: alignment part
+
+        return create_reconstruction_job(
+            experiment,
+            thisMode=DataMode.DATA,
+            use_devel_queue=args.use_devel_queue,
+        )
+
+    elif simDataType == SimulationDataType.VERTEX:
+        # vertex data must always be created without any cuts first
+        copyExperiment = copy.deepcopy(experiment)
+        copyExperiment.dataPackage.recoParams.disableCuts()
 
-        mergePath = pathToRootFiles / generateRelativeBunchesDir() / generateRelativeBinningDir() / generateRelativeMergeDir()
+        # TODO: misalignment is important here. the vertex data can have misalignment (because it's real data)
+        # but it has no alignment yet. that is only for the second reconstruction
 
-        status_code = enoughFilesPresent(
-            directory=mergePath,
-            glob_pattern=data_pattern + "*",
+        return create_simulation_and_reconstruction_job(
+            copyExperiment,
+            thisMode=DataMode.VERTEXDATA,
+            use_devel_queue=args.use_devel_queue,
         )
 
-        if status_code == StatusCode.ENOUGH_FILES:
-            print("skipping data merging...")
-            task.simState = SimulationState.DONE
-            return None
-
-        elif status_code == StatusCode.NO_FILES:
-            os.chdir(experiment.softwarePaths.LmdFitScripts)
-            mergeCommand: List[str] = []
-            mergeCommand.append("python")
-            mergeCommand.append("mergeMultipleLmdData.py")
-            mergeCommand.append(str(task.simDataType.value))  # we have to give the value because the script expects a/er/v !
-            mergeCommand.append(str(pathToRootFiles))
-
-            # TODO: do we still need this?
-            # if task.simDataType == SimulationDataType.ANGULAR:
-            #     mergeCommand.append("--num_samples")
-            #     mergeCommand.append(str(1))
-
-            print(f"running command:\n{mergeCommand}")
-            _ = subprocess.call(mergeCommand)
-
-            task.simState = SimulationState.DONE
-            return None
-        else:
-            raise RuntimeError(f"Status code {status_code} is unexpected!")
+    else:
+        raise ValueError(f"This tasks simType is {simDataType}, which is invalid!")
 
+
+def plannedSimulationJob(experiment: ExperimentParameters, simDataType: SimulationDataType) -> Tuple[JobResourceRequest, int]:
+    """
+    Resource request and number of array tasks of the sim/reco job that would be submitted now,
+    without creating it (that makes dirs and computes the cross section). For --plan.
+    """
+    if simDataType == SimulationDataType.ANGULAR:
+        resource_request = recoResourceRequest(args.use_devel_queue)
     else:
-        raise NotImplementedError(f"Simulation state {task.simState} is not implemented!")
+        resource_request = simRecoResourceRequest(args.use_devel_queue)
+    return resource_request, len(missingArrayIndices(experiment, simDataType))
+
 
+def readElasticCrossSection(experiment: ExperimentParameters) -> float:
+    # we need the elastic cross section for the angular data
+    csFile = experiment.experimentDir / "elastic_cross_section.txt"
+    if not csFile.exists():
+        raise FileNotFoundError("ERROR! Can not find elastic cross section file! The determined Luminosity will be wrong!\n")
+    with open(csFile, "r") as f:
+        content = f.readlines()
+        return float(content[0])
 
-def singleTaskWorker(experiment: ExperimentParameters, task: SimulationTask) -> bool:
+
+async def enqueueJournaled(journal: Journal, task: str, state: str, job: Job) -> int:
+    """
+    Submits the job and writes its ID to the journal, so a restarted run can re-attach to it.
     """
-    The recipe will have one to many tasks. "Handling" a task means either running
-    some script to process data, or submit a job to the cluster to generate or process
-    data.
-    Either way, the handleTask() function either returns None, which means the task is
-    immediately ready for the next step (that means call handleTask() again)
-    or it returns a jobID, which means the task is submitted to the cluster and we have to wait for it.
+    jobID = await orchestrator.submit(job)
+    journal.recordSubmission(task, state, jobID, job.name, job.array_indices)
+    return jobID
 
-    A task has a state, which is changed by handleTask(). When it task is finished,
-    its state will be DONE.
 
-    This function will be called in a loop until all tasks are done. It must be wrapped
-    in a thread if multiple tasks are to be handled at the same time.
+async def reattachToJob(journal: Journal, task: str) -> Optional[int]:
+    """
+    If the journal knows a job of this task that we never saw finish (because the last run died)
+    and it's still in the queue, return its ID so we can wait for it instead of submitting it again.
+    """
+    unfinished = journal.unfinishedJob(task)
+    if unfinished is None:
+        return None
+    jobID, _ = unfinished
+    if await orchestrator.runLocal(job_manager.get_active_number_of_jobs, jobID) > 0:
+        print(f"re-attaching to job {jobID} of task {task} from an earlier run")
+        return jobID
+    journal.recordJobFinished(jobID)
+    return None
+
+
+def findMissingIndices(experiment: ExperimentParameters, simDataType: SimulationDataType, linkCache: bool) -> List[int]:
+    """
+    Returns the missing array indices of the sim/reco job. If linkCache is set, another
+    experiment may have simulated exactly this already, so its outputs are linked first.
+    Complete outputs are registered in the artifact cache.
+    """
+    missingIndices = missingArrayIndices(experiment, simDataType)
+    if missingIndices and linkCache:
+        linkCachedArtifacts(experiment, simDataType)
+        missingIndices = missingArrayIndices(experiment, simDataType)
+    if not missingIndices:
+        registerArtifacts(experiment, simDataType)
+    return missingIndices
 
-    Returns True once the task is finished successfully (so we can catch exceptions).
+
+def makeFileListBunches(experiment: ExperimentParameters, simDataType: SimulationDataType) -> None:
     """
-    iteration = 0
-    while True:
-        iteration += 1
-        print(f"Task: {task}, iteration {iteration}")
-        if task.simState == SimulationState.DONE:
-            print(f"task {task} is done, returning...")
-            return True
-        jobID = executeTask(experiment=experiment, task=task)
+    Runs in a thread of the orchestrator, like the other local steps.
+    """
+    configPackage = getConfigPackageForSimType(experiment, simDataType)
+    pathToRootFiles = generateAbsoluteROOTDataPathForSimType(experiment, simDataType)
+    trackTree = trackTreeName(experiment.experimentType)
+
+    # force, because stale file lists from an earlier run would point to the wrong files
+    buncher = FileListBuncher(
+        pathToRootFiles,
+        filename_prefix=experiment.trackFilePattern,
+        files_per_bunch=FILES_PER_BUNCH,
+        maximum_number_of_files=configPackage.recoParams.num_samples,
+        recursive=False,
+        force=True,
+        validate_tree=trackTree if args.validate_root_files else None,
+        balance_tree=trackTree if args.balance_bunches else None,
+        use_manifest=args.use_manifests,
+    )
+    buncher.run()
 
-        # no job was submitted, we can process the task again
-        if jobID is None:
-            continue
 
-        # a job was submitted, we have to wait for it
-        else:
-            print(f"Waiting for job ID {jobID}, task {task}...")
-            while True:
-                runningJobs = job_manager.get_active_number_of_jobs(jobID)
-                if runningJobs == 0:
-                    break
-                else:
-                    sleep(60)
+def lmdDataBinnings() -> List[int]:
+    """
+    The binning that is fitted, plus the ones of --extra_binnings. The lmd data jobs fill all of them in one pass.
+    """
+    return [DEFAULT_BINS] + args.extra_binnings
+
+
+def mergeLmdData(experiment: ExperimentParameters, simDataType: SimulationDataType) -> None:
+    pathToRootFiles = generateAbsoluteROOTDataPathForSimType(experiment, simDataType)
+
+    # the fitted binning and the extra ones, which are only merged for binning studies
+    for bins in [None] + args.extra_binnings:
+        # we have to give the value because the merger expects a/er/v !
+        merger = LmdDataMerger(
+            pathToRootFiles,
+            simDataType.value,
+            experiment.softwarePaths.LmdFitBuildDir,
+            bins=bins,
+            fan_in=args.merge_fan_in,
+            processes=args.merge_processes,
+        )
+        try:
+            merger.run()
+        except RuntimeError as e:
+            # the merge stage checks its outputs afterwards
+            print(f"ERROR! Merging {simDataType} failed: {e}")
+
+
+def createMergeDataJobFromArgs(experiment: ExperimentParameters, simDataType: SimulationDataType) -> Job:
+    return createMergeDataJob(experiment, simDataType, args.merge_fan_in, args.merge_processes, args.extra_binnings)
+
+
+def filesPresent(journal: Journal, stageName: str, directory: Path, glob_pattern: str) -> bool:
+    """
+    The outputs of a stage are complete if enough files are there, and no job of this stage
+    from an earlier run is still writing them.
+    """
+    if journal.unfinishedJob(stageName) is not None:
+        return False
+    return enoughFilesPresent(directory=directory, glob_pattern=glob_pattern) == StatusCode.ENOUGH_FILES
 
 
-def processSimulationTasks(experiment: ExperimentParameters, recipe: SimRecipe) -> None:
+async def runJobStage(journal: Journal, stageName: str, createJob: Callable[[], Job]) -> bool:
     """
-    The recipe will contain one to many SimulationTasks.
-    Use a thread pool to process all tasks at the same time,
-    use the singleTaskWorker() method for that. It will return True
-    once the task is finished.
+    Submits the job of a stage (or re-attaches to it if an earlier run submitted it already)
+    and waits for it.
+    """
+    jobID = await reattachToJob(journal, stageName)
+    if jobID is None:
+        job = await orchestrator.runLocal(createJob)
+        jobID = await enqueueJournaled(journal, stageName, "SUBMITTED", job)
+    print(f"Waiting for job ID {jobID}, stage {stageName}...")
+    await orchestrator.waitForJob(jobID)
+    journal.recordJobFinished(jobID)
+    return True
+
 
-    If the debug flag is set, all tasks are processed sequentially
+def resAccPrecision(experiment: ExperimentParameters) -> Optional[float]:
+    """
+    Relative statistical error of the acceptance (in the efficiency binning of the data config)
+    from the res/acc track files that are there. None if it can't be estimated (yet).
+    """
+    pathToRootFiles = generateAbsoluteROOTDataPathForSimType(experiment, SimulationDataType.EFFICIENCY_RESOLUTION)
+    num_events_per_sample = experiment.resAccPackage.recoParams.num_events_per_sample
+    trackFiles = [
+        pathToRootFiles / f"{experiment.trackFilePattern}{num_events_per_sample * index}.root"
+        for index in expectedArrayIndices(experiment, SimulationDataType.EFFICIENCY_RESOLUTION)
+    ]
+    trackFiles = [trackFile for trackFile in trackFiles if isIndexedFilePresentAndValid(trackFile)]
+    try:
+        with open(experiment.dataConfigPath) as f:
+            dataConfig = json.load(f)
+        return estimateAcceptancePrecision(trackFiles, dataConfig, args.adaptive_resacc_quantile, trackTreeName(experiment.experimentType))
+    except Exception as e:
+        # not worth failing for, we just simulate more
+        print(f"WARNING! Could not estimate the res/acc precision: {e}")
+        return None
+
+
+async def simulate(experiment: ExperimentParameters, simDataType: SimulationDataType, journal: Journal, stageName: str) -> bool:
     """
+    Submits the sim/reco job for all array indices whose output is missing. Failed indices
+    are resubmitted on their own, each of them up to --max_attempts_per_index times in this
+    run (a job of an earlier run that is reattached to doesn't count).
 
-    if args.debug:
-        print("DEBUG: running task sequentially without thread pool.")
-        for task in recipe.SimulationTasks:
-            singleTaskWorker(experiment, task)
-    else:
-        print(f"Submitting {len(recipe.SimulationTasks)} tasks to thread pool...")
+    With --adaptive_resacc_precision, res/acc samples are submitted in waves of
+    --adaptive_wave_size instead, and no more waves are submitted once the relative
+    acceptance error of what has arrived is below the target in --adaptive_resacc_quantile
+    of the populated bins of the efficiency binning.
+
+    Returns True if any job ran.
+    """
+    attemptsPerIndex = journal.attemptsPerIndex(stageName, "SUBMITTED")
+    ran = False
+    adaptive = simDataType == SimulationDataType.EFFICIENCY_RESOLUTION and args.adaptive_resacc_precision is not None
+
+    jobID = await reattachToJob(journal, stageName)
+    if jobID is not None:
+        await orchestrator.waitForJob(jobID)
+        journal.recordJobFinished(jobID)
+        ran = True
 
-        with concurrent.futures.ThreadPoolExecutor() as taskExecutor:
-            futures = [taskExecutor.submit(singleTaskWorker, experiment, task) for task in recipe.SimulationTasks]
+    while True:
+        missingIndices = await orchestrator.runLocal(findMissingIndices, experiment, simDataType, not attemptsPerIndex)
+        if not missingIndices:
+            return ran
+
+        if adaptive:
+            precision = await orchestrator.runLocal(resAccPrecision, experiment)
+            if precision is not None and precision <= args.adaptive_resacc_precision:
+                print(
+                    f"Relative acceptance error per bin {precision:.2e} is below the target {args.adaptive_resacc_precision}, "
+                    + f"skipping the remaining {len(missingIndices)} samples."
+                )
+                return ran
+
+        # only resubmit the array tasks that failed, and each of them only a few times
+        indicesToSubmit = [index for index in missingIndices if attemptsPerIndex.get(index, 0) < args.max_attempts_per_index]
+        retryIndices = [index for index in indicesToSubmit if index in attemptsPerIndex]
+
+        if adaptive:
+            # failed samples are retried right away, new ones only one wave at a time
+            newIndices = [index for index in indicesToSubmit if index not in attemptsPerIndex]
+            indicesToSubmit = retryIndices + newIndices[: args.adaptive_wave_size]
+
+        if not indicesToSubmit:
+            if len(missingIndices) == len(expectedArrayIndices(experiment, simDataType)):
+                raise RuntimeError(f"ERROR! All {len(missingIndices)} array tasks of {simDataType} failed {args.max_attempts_per_index} times!")
+
+            # don't lose statistics silently
+            print("============================================================")
+            print(f"WARNING! {len(missingIndices)} array tasks of {simDataType} failed {args.max_attempts_per_index} times,")
+            print(f"continuing without them. Missing indices: {missingIndices}")
+            print("============================================================")
+            return ran
+
+        job = await orchestrator.runLocal(createSimulationJob, experiment, simDataType)
+        if retryIndices:
+            print(f"resubmitting {len(retryIndices)} failed array tasks of {simDataType}: {retryIndices}")
+        job.array_indices = indicesToSubmit
+        for index in indicesToSubmit:
+            attemptsPerIndex[index] = attemptsPerIndex.get(index, 0) + 1
+
+        jobID = await enqueueJournaled(journal, stageName, "SUBMITTED", job)
+        ran = True
+        print(f"Waiting for job ID {jobID}, stage {stageName}...")
+        await orchestrator.waitForJob(jobID)
+        journal.recordJobFinished(jobID)
+
+
+async def streamLmdData(experiment: ExperimentParameters, simDataType: SimulationDataType, journal: Journal, stageName: str, simulationDone: asyncio.Event) -> bool:
+    """
+    Runs while the sim/reco job of this data type is running: as soon as FILES_PER_BUNCH track files
+    are finished, their file list is written and a createLmdFitData job is submitted for it.
+    The last (maybe smaller) bunch is written once the simulation is done.
+
+    Returns True if any lmd data was created.
+    """
+    # lmd data jobs of an earlier run that are still in the queue
+    ran = False
+    jobID = await reattachToJob(journal, stageName)
+    while jobID is not None:
+        await orchestrator.waitForJob(jobID)
+        journal.recordJobFinished(jobID)
+        ran = True
+        jobID = await reattachToJob(journal, stageName)
+
+    configPackage = getConfigPackageForSimType(experiment, simDataType)
+    streamer = await orchestrator.runLocal(
+        BunchStreamer,
+        generateAbsoluteROOTDataPathForSimType(experiment, simDataType),
+        f"{experiment.trackFilePattern}*",
+        FILES_PER_BUNCH,
+        configPackage.recoParams.num_samples,
+        treeName=trackTreeName(experiment.experimentType) if args.validate_root_files else None,
+        use_manifest=args.use_manifests,
+    )
+    el_cs = readElasticCrossSection(experiment) if simDataType == SimulationDataType.ANGULAR else 1.0
+
+    jobIDs: List[int] = []
+    while True:
+        final = simulationDone.is_set()
+        newBunches = await orchestrator.runLocal(streamer.poll, final)
+        if newBunches:
+            job = await orchestrator.runLocal(createLmdDataJob, experiment, SimulationTask(simDataType=simDataType), el_cs, streamer.numberOfBunches, lmdDataBinnings())
+            job.array_indices = newBunches
+            jobIDs.append(await enqueueJournaled(journal, stageName, "SUBMITTED", job))
+            print(f"submitted lmd data for bunches {newBunches} of {simDataType} as job {jobIDs[-1]}")
+        if final:
+            break
+        try:
+            await asyncio.wait_for(simulationDone.wait(), STREAM_POLL_INTERVAL_IN_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+
+    for jobID in jobIDs:
+        await orchestrator.waitForJob(jobID)
+        journal.recordJobFinished(jobID)
+    return ran or len(jobIDs) > 0
+
+
+def addDataStages(
+    graph: StageGraph,
+    experiment: ExperimentParameters,
+    simDataType: SimulationDataType,
+    journal: Journal,
+    inputs: List[str],
+    simulateAction: Optional[Callable[[], Awaitable[bool]]] = None,
+) -> str:
+    """
+    Adds the four stages of one data type: simulation/reconstruction -> bunching ->
+    lmd data creation -> merging. Returns the name of the merge stage.
+
+    simulateAction replaces the default action of the sim/reco stage.
+
+    With --stream_bunches, there is no bunching stage. The lmd data stage starts together
+    with the sim/reco stage and bunches the track files as they arrive, see streamLmdData.
+
+    The paths are only looked up when the stages run, because they are generated from the
+    config packages of the experiment, which the IP determination stage rewrites: applyRecoIP
+    sets the new IP in the reco params, and adoptSpeculativeResAcc may swap the whole res/acc
+    package (and with it the data dir).
+    """
+    prefix = simDataType.value
+    data_pattern = getDataPattern(simDataType)
+
+    def rootPath() -> Path:
+        return generateAbsoluteROOTDataPathForSimType(experiment, simDataType)
+
+    def bunchesPath() -> Path:
+        return rootPath() / generateRelativeBunchesDir()
+
+    def binningPath() -> Path:
+        return bunchesPath() / generateRelativeBinningDir()
+
+    def mergePath() -> Path:
+        return binningPath() / generateRelativeMergeDir()
+
+    simName = f"{prefix}-simreco"
+    lmdDataName = f"{prefix}-lmdData"
+    simulationAction = simulateAction or (lambda: simulate(experiment, simDataType, journal, simName))
+
+    def plannedDataJob() -> Tuple[JobResourceRequest, int]:
+        return lmdDataResourceRequest(), expectedNumberOfFileLists(experiment, simDataType, FILES_PER_BUNCH)
+
+    if args.stream_bunches:
+        simulationDone = asyncio.Event()
+
+        async def simulateAndSignal() -> bool:
+            try:
+                return await simulationAction()
+            finally:
+                simulationDone.set()
+
+        graph.add(
+            Stage(
+                simName,
+                simulateAndSignal,
+                inputs=inputs,
+                outputs=lambda: (rootPath(), f"{experiment.trackFilePattern}*.root"),
+                plannedJob=lambda: plannedSimulationJob(experiment, simDataType),
+            )
+        )
+        # starts together with the simulation, not after it
+        graph.add(
+            Stage(
+                lmdDataName,
+                lambda: streamLmdData(experiment, simDataType, journal, lmdDataName, simulationDone),
+                inputs=inputs,
+                outputs=lambda: (binningPath(), data_pattern + "*"),
+                plannedJob=plannedDataJob,
+            )
+        )
+        mergeInputs = [simName, lmdDataName]
 
-            # wait for all tasks to finish
-            print("submitted, waiting...")
-            taskExecutor.shutdown(wait=True)
+    else:
+        graph.add(
+            Stage(
+                simName,
+                simulationAction,
+                inputs=inputs,
+                outputs=lambda: (rootPath(), f"{experiment.trackFilePattern}*.root"),
+                plannedJob=lambda: plannedSimulationJob(experiment, simDataType),
+            )
+        )
 
-        print("All threads done!")
+        async def bunch() -> bool:
+            await orchestrator.runLocal(makeFileListBunches, experiment, simDataType)
+            return True
 
-        # check the results of the futures to see if a task raised an exception
-        # it will be raised here
-        for future in futures:
-            if future.result() is False:
-                raise RuntimeError("ERROR! A task crashed!")
+        bunchesName = f"{prefix}-bunches"
+        graph.add(
+            Stage(
+                bunchesName,
+                bunch,
+                inputs=[simName],
+                outputs=lambda: (bunchesPath(), "filelist_*.txt"),
+                isComplete=lambda: len(getGoodFiles(bunchesPath(), "filelist_*.txt", min_filesize_in_bytes=100)[0]) > 0,
+            )
+        )
 
-    # check if all tasks are finished. ALL should be finished here!
-    recipe.SimulationTasks = [simTask for simTask in recipe.SimulationTasks if simTask.simState != SimulationState.DONE]
+        def createDataJob() -> Job:
+            el_cs = readElasticCrossSection(experiment) if simDataType == SimulationDataType.ANGULAR else 1.0
+            return createLmdDataJob(experiment, SimulationTask(simDataType=simDataType), el_cs, binnings=lmdDataBinnings())
+
+        graph.add(
+            Stage(
+                lmdDataName,
+                lambda: runJobStage(journal, lmdDataName, createDataJob),
+                inputs=[bunchesName],
+                outputs=lambda: (binningPath(), data_pattern + "*"),
+                isComplete=lambda: filesPresent(journal, lmdDataName, binningPath(), data_pattern + "*"),
+                plannedJob=plannedDataJob,
+            )
+        )
+        mergeInputs = [lmdDataName]
+
+        # a side branch, nothing waits for it. the cache is only for repeated analyses of these tracks
+        if args.track_cache and experiment.experimentType == ExperimentType.LUMI:
+            trackCacheName = f"{prefix}-trackCache"
+            graph.add(
+                Stage(
+                    trackCacheName,
+                    lambda: runJobStage(journal, trackCacheName, lambda: createTrackCacheJob(experiment, simDataType)),
+                    inputs=[bunchesName],
+                    outputs=lambda: (bunchesPath() / generateRelativeTrackCacheDir(), "tracks_*.npy"),
+                    isComplete=lambda: journal.unfinishedJob(trackCacheName) is None and len(bunchNumbers(bunchesPath())) > 0 and not missingBunches(bunchesPath()),
+                    plannedJob=lambda: (trackCacheResourceRequest(), expectedNumberOfFileLists(experiment, simDataType, FILES_PER_BUNCH)),
+                )
+            )
 
-    if len(recipe.SimulationTasks) > 0:
-        raise RuntimeError(
-            f"ERROR! There are still {len(recipe.SimulationTasks)} tasks left to process, but all should be done or still processing. That means one of the threads crashed unexpectedly."
+    async def merge() -> bool:
+        if args.merge_on_cluster:
+            return await runJobStage(journal, mergeName, lambda: createMergeDataJobFromArgs(experiment, simDataType))
+        await orchestrator.runLocal(mergeLmdData, experiment, simDataType)
+        return True
+
+    mergeName = f"{prefix}-merge"
+    graph.add(
+        Stage(
+            mergeName,
+            merge,
+            inputs=mergeInputs,
+            outputs=lambda: (mergePath(), data_pattern + "*"),
+            isComplete=lambda: enoughFilesPresent(directory=mergePath(), glob_pattern=data_pattern + "*") == StatusCode.ENOUGH_FILES,
         )
+    )
+    return mergeName
 
 
-def lumiDetermination(thisExperiment: ExperimentParameters, recipe: SimRecipe) -> bool:
-    print(f"processing recipe {thisExperiment.experimentDir}")
+def addSpeculativeResAccStage(graph: StageGraph, thisExperiment: ExperimentParameters, journal: Journal) -> Tuple[Callable[[], None], Callable[[], Awaitable[bool]]]:
+    """
+    Adds a stage that simulates res/acc at the IP from the config right away, in parallel
+    to the vertex stages, instead of waiting for the IP determination.
+
+    Returns two functions:
+    - decide() must be called once the reconstructed IP is applied (it blocks). It adopts
+      the speculative res/acc data if the IP is within --speculative_ip_tolerance.
+    - simulateResAcc() is the action of the res/acc sim/reco stage. With an adopted speculation
+      it waits for the speculative simulation and only resubmits what's missing, otherwise
+      it simulates res/acc at the reconstructed IP as usual.
+    """
+    speculative = createSpeculativeResAccExperiment(thisExperiment, args.speculative_ip_tolerance)
+    reuse = False
+    speculationRan = False
+    speculationDone = asyncio.Event()
+
+    async def speculate() -> bool:
+        nonlocal speculationRan
+        try:
+            # the compute nodes read the speculative params from here
+            await orchestrator.runLocal(write_params_to_file, speculative, speculative.experimentDir, "experiment.config", overwrite=True)
+            speculationRan = await simulate(speculative, SimulationDataType.EFFICIENCY_RESOLUTION, journal, "er-speculative")
+        except Exception as e:
+            # no harm done, the res/acc stage simulates whatever is missing itself
+            print(f"WARNING! Speculative res/acc simulation failed: {e}")
+        finally:
+            speculationDone.set()
+        return speculationRan
+
+    def decide() -> None:
+        nonlocal reuse
+        if speculativeResAccIsReusable(thisExperiment, speculative, args.speculative_ip_tolerance):
+            adoptSpeculativeResAcc(thisExperiment, speculative)
+            reuse = True
+        else:
+            print("Reconstructed IP is too far off, simulating res/acc again at the reconstructed IP.")
+
+    async def simulateResAcc() -> bool:
+        if reuse:
+            await speculationDone.wait()
+        ran = await simulate(thisExperiment, SimulationDataType.EFFICIENCY_RESOLUTION, journal, "er-simreco")
+        return ran or (reuse and speculationRan)
+
+    graph.add(
+        Stage(
+            "er-speculative",
+            speculate,
+            outputs=lambda: (generateAbsoluteROOTDataPathForSimType(speculative, SimulationDataType.EFFICIENCY_RESOLUTION), f"{speculative.trackFilePattern}*.root"),
+            plannedJob=lambda: plannedSimulationJob(speculative, SimulationDataType.EFFICIENCY_RESOLUTION),
+        )
+    )
+    return decide, simulateResAcc
+
 
+def buildStageGraph(thisExperiment: ExperimentParameters, journal: Journal) -> StageGraph:
     """
-    *
-    State 1 simulates vertex data from which the IP can be determined.
-    
-    by default, we always start with SIMULATE_VERTEX_DATA, even though
-    runSimulationReconstruction has probably already been run.
+    The stages of a luminosity determination:
+
+    - vertex data: sim/reco -> bunches -> lmd data -> merge
+    - IP determination from the merged vertex data (if use_ip_determination is set)
+    - res/acc and angular data, same stages as vertex, both with the new IP
+    - the luminosity fit on the merged angular and res/acc data
+
+    The res/acc and angular branches are independent, each stage starts as soon as
+    its own inputs are done. With --speculative_resacc, the res/acc simulation starts
+    right away at the config IP, see addSpeculativeResAccStage.
     """
-    recipe.SimulationTasks.append(SimulationTask(simDataType=SimulationDataType.VERTEX, simState=SimulationState.START_SIM))
-    processSimulationTasks(thisExperiment, recipe)
+    graph = StageGraph()
+
+    decideSpeculation: Optional[Callable[[], None]] = None
+    simulateResAcc: Optional[Callable[[], Awaitable[bool]]] = None
+    if args.speculative_resacc and thisExperiment.dataPackage.recoParams.use_ip_determination:
+        decideSpeculation, simulateResAcc = addSpeculativeResAccStage(graph, thisExperiment, journal)
+
+    vertexMerge = addDataStages(graph, thisExperiment, SimulationDataType.VERTEX, journal, [])
 
     """
-    *
-    State 2 only handles the reconstructed IP. If use_ip_determination is set,
-    the IP is reconstructed from the uncut data set and written to a reco_ip.json
+    The IP is reconstructed from the uncut vertex data set and written to a reco_ip.json
     file. The IP position will only be used from this file from now on.
 
     If use_ip_determination is false, the reconstruction will use the IP as
     specified from the reco params of the experiment config.
 
-    ! Therefore, this is the ONLY place where a new IP may be set.
+    ! The new IP is only ever set by wrappers.ipDetermination.applyRecoIP.
     """
-
+    ipInputs: List[str] = []
     if thisExperiment.dataPackage.recoParams.use_ip_determination:
-        assert thisExperiment.resAccPackage.simParams is not None, "ERROR! simParams are not set in config!"
+
+        async def ipDetermination() -> bool:
+            await orchestrator.runLocal(determineIP, thisExperiment)
+            # remember, this also overwrites the experiment config on disk
+            await orchestrator.runLocal(applyRecoIP, thisExperiment)
+            if decideSpeculation is not None:
+                await orchestrator.runLocal(decideSpeculation)
+            return True
+
         assert thisExperiment.recoIPpath is not None, "ERROR! path to recoIP.json is not set in config!"
+        recoIPpath = thisExperiment.recoIPpath
+        graph.add(Stage("ipDetermination", ipDetermination, inputs=[vertexMerge], outputs=lambda: (recoIPpath.parent, recoIPpath.name)))
+        ipInputs = ["ipDetermination"]
+    else:
+        print("Skipped IP determination for this recipe, using values from config.")
 
-        vertexDataMergePath = generateAbsoluteMergeDataPath(
-            thisExperiment.dataPackage,
-            dataMode=DataMode.VERTEXDATA,
+    # these run with the new IP (if any), see addDataStages
+    mergeStages = [
+        addDataStages(graph, thisExperiment, SimulationDataType.EFFICIENCY_RESOLUTION, journal, ipInputs, simulateAction=simulateResAcc),
+        addDataStages(graph, thisExperiment, SimulationDataType.ANGULAR, journal, ipInputs),
+    ]
+
+    graph.add(
+        Stage(
+            "lumiFit",
+            lambda: runJobStage(journal, "lumiFit", lambda: createLumiFitJob(thisExperiment)),
+            inputs=mergeStages,
+            plannedJob=lambda: (lumiFitResourceRequest(), 1),
         )
+    )
+    return graph
 
-        if not thisExperiment.recoIPpath.exists():
-            # 2. determine offset on the vertex data sample
-            bashCommand: List[str] = []
-            bashCommand.append(str(thisExperiment.softwarePaths.LmdFitBuildDir / "bin/determineBeamOffset"))
-            bashCommand.append("-p")
-            bashCommand.append(str(vertexDataMergePath))
-            bashCommand.append("-c")
-            bashCommand.append(str(thisExperiment.vertexConfigPath))
-            bashCommand.append("-o")
-            bashCommand.append(str(thisExperiment.recoIPpath))
 
-            print(f"beam offset determination command:\n{bashCommand}")
-            _ = subprocess.call(bashCommand)
+async def lumiDetermination(thisExperiment: ExperimentParameters, journal: Journal) -> bool:
+    print(f"processing recipe {thisExperiment.experimentDir}")
 
-        else:
-            print("IP determination file already exists, skipping IP determination!")
-
-        with open(str(thisExperiment.recoIPpath), "r") as f:
-            ip_rec_data = json.load(f)
-
-        # check if ip_x and ip_y are in the reco_ip.json file
-        # if not, the IP was not determined correctly
-        if "ip_x" not in ip_rec_data or "ip_y" not in ip_rec_data:
-            raise RuntimeError(f"ERROR! Reco IP file {thisExperiment.recoIPpath} does not contain ip_x or ip_y!")
-
-        newRecoIPX = float("{0:.3f}".format(round(float(ip_rec_data["ip_x"]), 3)))  # in cm
-        newRecoIPY = float("{0:.3f}".format(round(float(ip_rec_data["ip_y"]), 3)))
-
-        newRecoIPZ = 0 # we can't detect anything else anyway, so why bother
-        # newRecoIPZ = thisExperiment.dataPackage.simParams.ip_offset_z
-
-        # I don't like this. Actually I hate this.
-        # The experiment config is frozen for a reason.
-        # But unfortunately there doesn't seem to be a better way
-
-        # so, three param sets must be updated with the new IP:
-        # - the dataPackage recoParams
-        # - the resAccPackage simParams (both IP and theta min/max)
-        # - the resAccPackage recoParams
-        #
-        # at least we know it can happen ONLY here
-        # remember, this config is never written to disk
-
-        max_xy_shift = math.sqrt(newRecoIPX**2 + newRecoIPY**2)
-        max_xy_shift = float("{0:.2f}".format(round(float(max_xy_shift), 2)))
-
-        resAccThetaMin = thisExperiment.resAccPackage.simParams.theta_min_in_mrad - max_xy_shift
-        resAccThetaMax = thisExperiment.resAccPackage.simParams.theta_max_in_mrad + max_xy_shift
-
-        thisExperiment.dataPackage.recoParams.setNewIPPosition(newRecoIPX, newRecoIPY, newRecoIPZ)
-        thisExperiment.resAccPackage.simParams.setNewIPPosition(newRecoIPX, newRecoIPY, newRecoIPZ)
-        thisExperiment.resAccPackage.simParams.setNewThetaAngles(resAccThetaMin, resAccThetaMax)
-        thisExperiment.resAccPackage.recoParams.setNewIPPosition(newRecoIPX, newRecoIPY, newRecoIPZ)
-
-        print("============================================================")
-        print("                       Attention!                           ")
-        print("     Experiment Config has been changed in memory!          ")
-        print("This MUST only happen if you are using the IP determination!")
-        print("                                                            ")
-        print("New IP position:                                            ")
-        print(f"  x: {thisExperiment.dataPackage.recoParams.recoIPX} cm    ")
-        print(f"  y: {thisExperiment.dataPackage.recoParams.recoIPY} cm    ")
-        print(f"  z: {thisExperiment.dataPackage.recoParams.recoIPZ} cm    ")
-        print("                                                            ")
-        print("New theta angles:                                           ")
-        print(f"  theta min: {thisExperiment.resAccPackage.simParams.theta_min_in_mrad} mrad")
-        print(f"  theta max: {thisExperiment.resAccPackage.simParams.theta_max_in_mrad} mrad")
-        print("                                                            ")
-        print("============================================================")
-        print("Finished IP determination for this recipe!                  ")
-
-        # overwrite existing config file, otherwise the scripts on the compute nodes don't have access to the 
-        # new IP position
-        print(f"Overwriting experiment config file at {thisExperiment.experimentDir}/experiment.config with new IP position...")
-        write_params_to_file(thisExperiment, thisExperiment.experimentDir, "experiment.config", overwrite=True)
-    else:
-        print("Skipped IP determination for this recipe, using values from config.")
+    graph = buildStageGraph(thisExperiment, journal)
+    await graph.run(orchestrator, onTransition=journal.recordTransition)
+
+    print("this recipe is fully processed!!!")
 
+    return True
+
+
+async def submitChainedStages(experiment: ExperimentParameters, simDataType: SimulationDataType, dependencies: List[int], journal: Journal) -> Optional[int]:
     """
-    *
-    State 3
-    the IP position is now reconstructed. filter the DPM data again,
-    this time using the newly determined IP position as a cut criterion.
-    (that also means create fileLists -> bunches/binning -> merge)
-    at the same time:
-    generate acceptance and resolution with these reconstructed ip values
-    (that means simulation + bunching + creating data objects + merging)
+    Submits all jobs for one data type at once: simulation/reconstruction -> bunching ->
+    lmd data creation -> merging. Every job waits for the previous one via slurm dependencies,
+    so nothing has to wait on the submit node.
+
+    Stages whose output already exists are skipped, but only as long as nothing before them
+    was submitted (otherwise their output would be stale). Stages whose job from an earlier
+    run is still in the queue aren't submitted again.
+
+    Returns the job ID of the last submitted job, or None if all output was there already.
     """
+    lastJobID: Optional[int] = None
+    pathToRootFiles = generateAbsoluteROOTDataPathForSimType(experiment, simDataType)
+    binningPath = pathToRootFiles / generateRelativeBunchesDir() / generateRelativeBinningDir()
+    mergePath = binningPath / generateRelativeMergeDir()
+    data_pattern = getDataPattern(simDataType)
+
+    async def submit(job: Job, dependency_type: str) -> int:
+        nonlocal lastJobID
+        stageName = f"{simDataType.value}-{job.name}"
+        reattachedJobID = await reattachToJob(journal, stageName)
+        if reattachedJobID is not None:
+            lastJobID = reattachedJobID
+            return lastJobID
+
+        if lastJobID is not None:
+            job.dependencies = [lastJobID]
+        else:
+            job.dependencies = list(dependencies)
+        job.dependency_type = dependency_type
+        lastJobID = await enqueueJournaled(journal, stageName, "SUBMITTED", job)
+        print(f"submitted {job.name} for {simDataType} as job {lastJobID}, depends on {job.dependencies}")
+        return lastJobID
+
+    async def mustRun(directory: Path, glob_pattern: str) -> bool:
+        if lastJobID is not None or dependencies:
+            return True
+        return await orchestrator.runLocal(enoughFilesPresent, directory=directory, glob_pattern=glob_pattern) == StatusCode.NO_FILES
+
+    # the upstream job must have succeeded before the simulation can start (it needs the IP).
+    # without upstream jobs, only the array tasks whose output is missing must run
+    if dependencies:
+        await submit(await orchestrator.runLocal(createSimulationJob, experiment, simDataType), "afterok")
+    else:
+        missingIndices = await orchestrator.runLocal(findMissingIndices, experiment, simDataType, True)
+        if missingIndices:
+            job = await orchestrator.runLocal(createSimulationJob, experiment, simDataType)
+            job.array_indices = missingIndices
+            await submit(job, "afterok")
+
+    if await mustRun(binningPath, data_pattern + "*"):
+        # afterany: a few failed simulation tasks are fine, we just bunch what's there
+        bunchesJob = await orchestrator.runLocal(
+            createFileListBunchesJob,
+            experiment,
+            simDataType,
+            FILES_PER_BUNCH,
+            validate=args.validate_root_files,
+            use_manifest=args.use_manifests,
+            balance=args.balance_bunches,
+        )
+        await submit(bunchesJob, "afterany")
+
+        el_cs = readElasticCrossSection(experiment) if simDataType == SimulationDataType.ANGULAR else 1.0
+        task = SimulationTask(simDataType=simDataType)
+        numFileLists = expectedNumberOfFileLists(experiment, simDataType, FILES_PER_BUNCH)
+        await submit(await orchestrator.runLocal(createLmdDataJob, experiment, task, el_cs, numFileLists=numFileLists, binnings=lmdDataBinnings()), "afterok")
+
+    if await mustRun(mergePath, data_pattern + "*"):
+        # afterany again, the merge works with whatever lmd data objects were made
+        await submit(await orchestrator.runLocal(createMergeDataJobFromArgs, experiment, simDataType), "afterany")
 
-    recipe.SimulationTasks.append(SimulationTask(simDataType=SimulationDataType.EFFICIENCY_RESOLUTION, simState=SimulationState.START_SIM))
-    recipe.SimulationTasks.append(SimulationTask(simDataType=SimulationDataType.ANGULAR, simState=SimulationState.START_SIM))
+    return lastJobID
 
-    # remember, the experiment config may now contain the updated IP
-    # there are now two simulation tasks running, but this call only returns once BOTH are done
-    processSimulationTasks(thisExperiment, recipe)
 
+async def chainedLumiDetermination(thisExperiment: ExperimentParameters, journal: Journal) -> bool:
     """
-    *
-    State 4: Luminosity Fit
+    Same stages as lumiDetermination, but all jobs are submitted up front and
+    chained with slurm dependencies. The submit node only waits for the final fit job.
     """
-    lumiFitJob = createLumiFitJob(thisExperiment)
+    print(f"processing recipe {thisExperiment.experimentDir} with chained jobs")
 
-    # TODO: ayo we get the job ID, let's wait for it to finish?
-    fitJobId = job_manager.enqueue(job=lumiFitJob)
+    # if the last run got as far as submitting the fit, everything else is submitted as well
+    fitJobId = await reattachToJob(journal, "lumiFit")
+    if fitJobId is not None:
+        print(f"waiting for job {fitJobId} to finish...\n")
+        await orchestrator.waitForJob(fitJobId)
+        journal.recordJobFinished(fitJobId)
+        print("this recipe is fully processed!!!")
+        return True
 
-    print(f"waiting for job {fitJobId} to finish...\n")
+    vertexJobID = await submitChainedStages(thisExperiment, SimulationDataType.VERTEX, [], journal)
 
-    while True:
-        runningJobs = job_manager.get_active_number_of_jobs(fitJobId)
-        if runningJobs == 0:
-            break
+    dependencies: List[int] = []
+    if thisExperiment.dataPackage.recoParams.use_ip_determination:
+        assert thisExperiment.recoIPpath is not None, "ERROR! path to recoIP.json is not set in config!"
+
+        ipJobID = await reattachToJob(journal, "ipDetermination")
+        if ipJobID is not None:
+            dependencies = [ipJobID]
+        elif vertexJobID is not None or not thisExperiment.recoIPpath.exists():
+            # the IP job writes the new IP to the experiment config, the later jobs read it from there
+            ipJob = await orchestrator.runLocal(createIPDeterminationJob, thisExperiment)
+            if vertexJobID is not None:
+                ipJob.dependencies = [vertexJobID]
+            dependencies = [await enqueueJournaled(journal, "ipDetermination", "SUBMITTED", ipJob)]
+            print(f"submitted IP determination as job {dependencies[0]}")
         else:
-            sleep(30)
+            await orchestrator.runLocal(applyRecoIP, thisExperiment)
+    else:
+        print("Skipped IP determination for this recipe, using values from config.")
+
+    mergeJobIDs = await orchestrator.gather(
+        submitChainedStages(thisExperiment, simDataType, dependencies, journal) for simDataType in (SimulationDataType.EFFICIENCY_RESOLUTION, SimulationDataType.ANGULAR)
+    )
+
+    # this writes the recoIP file for the fit, so it runs off the event loop as well
+    lumiFitJob = await orchestrator.runLocal(createLumiFitJob, thisExperiment)
+    lumiFitJob.dependencies = [jobID for jobID in mergeJobIDs if jobID is not None]
+    fitJobId = await enqueueJournaled(journal, "lumiFit", "SUBMITTED", lumiFitJob)
+
+    print(f"waiting for job {fitJobId} to finish...\n")
+    await orchestrator.waitForJob(fitJobId)
+    journal.recordJobFinished(fitJobId)
 
     print("this recipe is fully processed!!!")
 
     return True
 
 
-def experimentWorker(experiment: ExperimentParameters) -> None:
+def planExperiments(experiments: List[ExperimentParameters], planFile: Path) -> None:
+    """
+    Prints (and writes to planFile) what processing these experiments would do now:
+    skipped stages, array tasks, requested core-hours and expected storage. Submits and writes nothing else.
+    """
+    planner = Planner()
+    journals: List[Journal] = []
+    for experiment in experiments:
+        # an in-memory journal if there is none yet, so the plan doesn't create anything
+        journalPath = experiment.experimentDir / Journal.fileName
+        journal = Journal(journalPath if journalPath.exists() else Path(":memory:"))
+        journals.append(journal)
+        planner.add(experiment.experimentDir, buildStageGraph(experiment, journal), journal.jobTurnarounds())
+
+    try:
+        estimates = planner.estimate()
+    finally:
+        for journal in journals:
+            journal.close()
+
+    printPlan(estimates)
+    exportPlan(estimates, planFile)
+    print(f"\nplan written to {planFile}")
+
+
+async def experimentWorker(experiment: ExperimentParameters) -> None:
     experiment.experimentDir.mkdir(parents=True, exist_ok=True)
 
     # before anything else, check if config is internally consistant
@@ -601,11 +1026,20 @@ def experimentWorker(experiment: ExperimentParameters) -> None:
     # overwrite existing config file, otherwise old settings from the last run could remain
     write_params_to_file(experiment, experiment.experimentDir, "experiment.config", overwrite=True)
 
-    # create a recipe object. it resides only in memory and is never written to disk
-    # it is however liberally modified and passed around
-    recipe = SimRecipe()
+    # the stage transitions and jobs are written to the journal,
+    # so we can pick up where a crashed run left off
+    journal = Journal.forExperiment(experiment.experimentDir)
+    if args.local:
+        # local jobs died with the last run, there is nothing to re-attach to
+        journal.abandonUnfinishedJobs()
 
-    lumiDetermination(experiment, recipe)
+    try:
+        if args.chain_jobs:
+            await chainedLumiDetermination(experiment, journal)
+        else:
+            await lumiDetermination(experiment, journal)
+    finally:
+        journal.close()
 
 
 #! --------------------------------------------------
@@ -655,6 +1089,167 @@ parser.add_argument(
     help="If flag is set, the devel queue is used",
 )
 
+parser.add_argument(
+    "--local",
+    action="store_true",
+    help="Run all jobs on this machine instead of submitting them to the cluster.",
+)
+
+parser.add_argument(
+    "--local_processes",
+    type=int,
+    default=None,
+    help="Maximum number of array tasks that run at the same time in --local mode (default: number of cores).",
+)
+
+parser.add_argument(
+    "--max_attempts_per_index",
+    type=int,
+    default=3,
+    help="How often a single array task of a simulation/reconstruction job is submitted before we give up on it.",
+)
+
+parser.add_argument(
+    "--artifact_cache",
+    type=Path,
+    default=os.environ.get("LMDFIT_ARTIFACT_CACHE"),
+    help="SQLite file of the artifact cache that is shared by all experiments (default: $LMDFIT_ARTIFACT_CACHE). "
+    + "Sim/reco outputs of experiments with the same params are linked instead of simulated again. Not used if not set.",
+)
+
+parser.add_argument(
+    "--speculative_resacc",
+    action="store_true",
+    help="Start the res/acc simulation right away at the IP from the config, instead of waiting for the IP determination. "
+    + "It is reused if the reconstructed IP is within --speculative_ip_tolerance, otherwise res/acc is simulated again.",
+)
+
+parser.add_argument(
+    "--speculative_ip_tolerance",
+    type=float,
+    default=0.05,
+    help="How far (in cm) the reconstructed IP may be from the config IP for the speculative res/acc simulation to be reused. "
+    + "The speculative theta range is widened by this much on top of the usual widening.",
+)
+
+parser.add_argument(
+    "--adaptive_resacc_precision",
+    type=float,
+    default=None,
+    help="Submit the res/acc samples in waves, and stop once the relative statistical error of the acceptance is below this "
+    + "(i.e. 0.05) in the bins of the efficiency binning of the data config, see --adaptive_resacc_quantile. "
+    + "Not used if not set, then all samples are simulated.",
+)
+
+parser.add_argument(
+    "--adaptive_resacc_quantile",
+    type=float,
+    default=0.9,
+    help="With --adaptive_resacc_precision, this fraction of the bins with reconstructed tracks must be below the target "
+    + "(1.0: the worst bin).",
+)
+
+parser.add_argument(
+    "--adaptive_wave_size",
+    type=int,
+    default=50,
+    help="Number of res/acc samples per wave with --adaptive_resacc_precision.",
+)
+
+parser.add_argument(
+    "--max_concurrent_experiments",
+    type=int,
+    default=None,
+    help="Maximum number of experiments that are processed at the same time (default: all of them).",
+)
+
+parser.add_argument(
+    "--max_local_steps",
+    type=int,
+    default=8,
+    help="Maximum number of local steps (file checks, bunching, merging...) that run at the same time.",
+)
+
+parser.add_argument(
+    "--validate_root_files",
+    action="store_true",
+    help="Open the track files with uproot before they are bunched, and treat files without entries in the track tree "
+    + "(truncated, never closed...) as missing, so they are simulated again instead of crashing the lmd data creation.",
+)
+
+parser.add_argument(
+    "--merge_fan_in",
+    type=int,
+    default=DEFAULT_FAN_IN,
+    help="Merge the lmd data of more bunches than this in a tree of groups of this many files, the groups at the same time. "
+    + "0 merges all bunches with one mergeLmdData.",
+)
+parser.add_argument(
+    "--merge_processes",
+    type=int,
+    default=4,
+    help="How many mergeLmdData run at the same time per data type in a tree merge.",
+)
+parser.add_argument(
+    "--merge_on_cluster",
+    action="store_true",
+    help="Submit the merges as cluster jobs (with --merge_processes cores per data type) instead of running them on the submit node.",
+)
+
+parser.add_argument(
+    "--track_cache",
+    action="store_true",
+    help="After bunching, also extract the track parameters of every bunch into a columnar float32 cache in bunches/trackCache "
+    + "(one job array task per bunch), so that later analyses don't have to read the TrksQA files again. See lumifit/trackCache.py. "
+    + "Doesn't apply to --stream_bunches or KOALA.",
+)
+
+parser.add_argument(
+    "--extra_binnings",
+    type=int,
+    nargs="+",
+    default=[],
+    help=f"Also create and merge lmd data with these numbers of bins (besides the {DEFAULT_BINS} that are fitted), "
+    + "in the same pass over the track files. They go into bunches/binning_{bins}, for binning studies. Not supported for KOALA.",
+)
+
+parser.add_argument(
+    "--balance_bunches",
+    action="store_true",
+    help="Put about the same number of events into every file list bunch instead of the same number of track files, "
+    + "so the createLmdFitData tasks take about equally long. Doesn't apply to --stream_bunches.",
+)
+
+parser.add_argument(
+    "--use_manifests",
+    action="store_true",
+    help="Trust the manifest.jsonl the jobs write into their output directories (see lumifit/manifest.py) instead of "
+    + "looking at every file: only outputs the jobs reported as done count. Don't use it with outputs from before there were manifests.",
+)
+
+parser.add_argument(
+    "--stream_bunches",
+    action="store_true",
+    help="Write the file list bunches and submit their lmd data jobs while the sim/reco job is still running, "
+    + f"as soon as {FILES_PER_BUNCH} track files are finished. The merge starts once the last bunch is done.",
+)
+
+parser.add_argument(
+    "--plan",
+    type=Path,
+    nargs="?",
+    const=Path("determineLuminosity.plan.json"),
+    default=None,
+    help="Only print which stages would run, how many array tasks and core-hours they request and how much storage they "
+    + "would need, and write that as json to this file (default: determineLuminosity.plan.json). Nothing is submitted.",
+)
+
+parser.add_argument(
+    "--chain_jobs",
+    action="store_true",
+    help="Submit all jobs of an experiment at once and let slurm start them via job dependencies, instead of waiting for each step.",
+)
+
 args = parser.parse_args()
 
 experiments: List[ExperimentParameters] = []
@@ -678,6 +1273,15 @@ elif args.ExperimentConfigFile is not None:
     experiment = load_params_from_file(args.ExperimentConfigFile, ExperimentParameters)
     experiments.append(experiment)
 
+# createKoaFitData only takes one data config
+if args.extra_binnings and any(experiment.experimentType == ExperimentType.KOALA for experiment in experiments):
+    raise ValueError("ERROR! --extra_binnings is not supported for KOALA experiments!")
+
+artifact_cache: Optional[ArtifactCache] = None
+if args.plan is not None:
+    planExperiments(experiments, args.plan)
+    exit(0)
+
 # ask confirmation
 print("The following experiments will be processed:")
 for experiment in experiments:
@@ -689,9 +1293,15 @@ if user_input != "y":
     print("Aborting!")
     exit(0)
 
+if args.artifact_cache is not None:
+    artifact_cache = ArtifactCache(Path(args.artifact_cache))
+
 # check which cluster we're on and create job handler
 # we know there is at least one config, and we just assume all use the same cluster
-if experiments[0].cluster == ClusterEnvironment.VIRGO:
+job_handler: JobHandler
+if args.local:
+    job_handler = LocalJobHandler(args.local_processes)
+elif experiments[0].cluster == ClusterEnvironment.VIRGO:
     job_handler = create_virgo_job_handler("long")
 elif experiments[0].cluster == ClusterEnvironment.HIMSTER:
     if args.use_devel_queue:
@@ -703,22 +1313,20 @@ else:
 
 # job threshold of this type (too many jobs could generate to much io load
 # as quite a lot of data is read in from the storage...)
-job_manager = ClusterJobManager(job_handler, 2000, 3600)
+# (local jobs show up in our process table immediately, no need to wait after submitting)
+job_manager = ClusterJobManager(job_handler, 2000, 3600, time_to_sleep_after_submission=0 if args.local else 3)
 
+# all experiments and their tasks are coroutines on one event loop. waiting for jobs
+# doesn't need threads, only the local steps run in a (limited) thread pool
 if args.debug:
-    print("DEBUG: running experiment sequentially without thread pool.")
-    for experiment in experiments:
-        experimentWorker(experiment)
+    print("DEBUG: running experiments and tasks sequentially.")
+    orchestrator = Orchestrator(job_manager, max_local_steps=1, sequential=True)
 else:
-    with concurrent.futures.ThreadPoolExecutor() as recipeExecutor:
-        futures = [recipeExecutor.submit(experimentWorker, experiment) for experiment in experiments]
-
-        # wait for all tasks to finish
-        print("Enqueued all experiments, waiting...")
-        recipeExecutor.shutdown(wait=True)
+    orchestrator = Orchestrator(job_manager, max_local_steps=args.max_local_steps)
 
-        for future in futures:
-            if future.result() is False:
-                raise RuntimeError("ERROR! A recipe crashed!")
+print("Processing all experiments, waiting...")
+results = orchestrator.run((experimentWorker(experiment) for experiment in experiments), max_concurrent=args.max_concurrent_experiments)
+if False in results:
+    raise RuntimeError("ERROR! A recipe crashed!")
 
 print("all done!")
@@ -1,26 +1,33 @@
 #!/usr/bin/env python3
 """
-Simple program that runs commands given as a json-formatted object
-in a named pipe and returns their outputs and return code in the same way.
+Simple program that runs commands given as json-formatted objects
+on a unix domain socket and returns their outputs and return code in the same way.
 
 the structure of the order and return object is governed by the SlurmOrder Class.
+
+Every order carries a request ID. Many clients (and many threads of one client)
+can share one agent: orders are executed concurrently by a bounded pool of
+worker threads, and each reply is sent back on the connection it came from,
+with the request ID of its order.
 """
 
+import argparse
 import datetime
+import itertools
 import json
 import logging
 import os
-import random
 import shlex
+import socket
 import stat
-import string
 import subprocess
 import sys
 import threading as th
 import time
+from concurrent.futures import Future, ThreadPoolExecutor
 from enum import IntEnum
 from pathlib import Path
-from typing import Dict
+from typing import Dict, Optional, Tuple
 
 import attr
 
@@ -33,8 +40,8 @@ class orderType(IntEnum):
     EXIT = -1
     META = 0
     REGULAR = 1
-    MAKE_UNQUE = 2
-    UNIQUE_CONFIRM = 4
+    # read-only commands (like squeue) whose results may be cached and shared
+    QUERY = 2
 
 
 @attr.s(hash=True)
@@ -46,7 +53,9 @@ class SlurmOrder:
     stderr: str = attr.ib(default="")
     env: Dict = attr.ib(default={})
     runShell: bool = attr.ib(default=False)
-    version: int = attr.ib(default=1)
+    version: int = attr.ib(default=2)
+    # set by the client, the agent copies it to the reply
+    requestID: int = attr.ib(default=0)
 
     # TODO: I think there is a more modern way to do this, but cattrs is still too flakey
     @classmethod
@@ -58,185 +67,253 @@ class SlurmOrder:
 
 
 class Agent:
-    universalPipePath: Path = Path(f"{os.getenv('HOME')}/tmp/lmdfit")
+    universalSocketPath: Path = Path(f"{os.getenv('HOME')}/tmp/lmdfit.sock")
+
+    def __init__(self, socketPath: Optional[Path] = None) -> None:
+        if socketPath is not None:
+            self.universalSocketPath = socketPath
 
-    def SlurmOrderExamples(self) -> None:
+    @staticmethod
+    def encodeOrder(thisOrder: SlurmOrder) -> bytes:
         """
-        This function currently doesn't work. I wanted to use cattrs to serialize and deserialize slurmOrders,
-        but on Virgo only python 3.6 is available. So I'll leave this for now and will implement more cleanly
-        once I get access to python 3.7 on Virgo.
+        One order per line, json never contains raw newlines.
         """
-        # slurmOrder = SlurmOrder()
-        # print(f"This is the Slurm Order:\n{slurmOrder}\n")
-        # print(f"This is the Slurm Order as dict:\n{slurmOrder.toJson()}\n")
-        # jsonString = slurmOrder.toJson()
-        # jsonObj = json.loads(str(jsonString))
-        # jsonObj["cmd"] = "whoami"
-        # jsonObj["env"] = {"AWESOME": "hellYes"}
-        # jsonString = json.dumps(jsonObj)
-        # print(f"Let's change it up a bit:\n{jsonString}\n")
-        # print(
-        #     f"now, backwards from Json:\n{SlurmOrder.fromJson(jsonString)}\n"
-        # )
-        sys.exit(0)
-
-    def sendOrder(self, thisOrder: SlurmOrder, timeout: float = 5.0) -> bool:
-        self.sendOrderBlocking(thisOrder)
-        return True
-        # proc = mp.Process(target=self.sendOrderBlocking, args=(thisOrder,))
-        proc = th.Thread(target=self.sendOrderBlocking, args=(thisOrder,))
-        proc.start()
-        # writing alone shouldn't take long
-        proc.join(timeout)
-
-        if proc.is_alive():
-            proc.terminate()
-            raise TimeoutError("Could not write to pipe! Is the agent listening?")
-        return True
-
-    def sendOrderBlocking(self, thisOrder: SlurmOrder) -> None:
-        with open(self.universalPipePath, "w", encoding="utf-8") as universalPipe:
-            payload = thisOrder.__dict__
-            json.dump(payload, universalPipe)
+        return (json.dumps(thisOrder.__dict__) + "\n").encode("utf-8")
 
-    def receiveOrder(self) -> SlurmOrder:
-        with open(self.universalPipePath, "r", encoding="utf-8") as universalPipe:
-            try:
-                payload = json.load(universalPipe)
-            except Exception:
-                print(f"error parsing json order from pipe!")
-                return SlurmOrder(thisType=orderType.PARSE_FAILED)
+    @staticmethod
+    def decodeOrder(line: bytes) -> SlurmOrder:
+        try:
+            payload = json.loads(line.decode("utf-8"))
+        except Exception:
+            print("error parsing json order from socket!")
+            return SlurmOrder(thisType=orderType.PARSE_FAILED)
 
         # python json's are actually dicts
         return SlurmOrder.fromDict(payload)
 
 
+# return code, stdout, stderr
+CommandResult = Tuple[int, str, str]
+
+
 class Server(Agent):
     """
-    checks:
-    - if pipe exists and is pipe. if yes, return. else:
-    - if its regular file, delete it. then:
-    - if parent path for pipe exists, if not, creates it. then make pipe
+    Listens on a unix domain socket, one thread per connection reads the orders.
+    The orders themselves are executed by a bounded thread pool, so a slow sbatch
+    doesn't hold up anyone else.
+
+    QUERY orders are read-only, so their results are cached for cacheTTL seconds,
+    and identical queries that arrive while one is already running wait for that
+    one instead of running again. A query is identified by its command alone,
+    the environment is assumed to be the same for all clients of one agent.
     """
 
-    def migrateToNewPipePath(self) -> Path:
+    def __init__(self, socketPath: Optional[Path] = None, maxWorkers: int = 8, cacheTTL: float = 10.0) -> None:
+        super().__init__(socketPath)
+        self.maxWorkers = maxWorkers
+        self.cacheTTL = cacheTTL
+        self.cacheLock = th.Lock()
+        self.queryCache: Dict[Tuple[str, bool], Tuple[float, CommandResult]] = {}
+        self.inFlightQueries: Dict[Tuple[str, bool], "Future[CommandResult]"] = {}
+        self.cacheStats: Dict[str, int] = {"hits": 0, "misses": 0, "coalesced": 0}
+        self.executor: Optional[ThreadPoolExecutor] = None
+        self.listeningSocket: Optional[socket.socket] = None
+        self.shutdownEvent = th.Event()
+
+    def prepareSocket(self) -> socket.socket:
         """
-        If multiple clients connect to one server, the server may get too many requests at the same time and may confuse the orders and results. This method returns the path to a new named pipe that is to be used by only one client. This way the order -> result structure is preserved and only one command is expected and executed.
-
-        This is made this way so that each client instance can choose to get a unique server and doesn't have to care if it gets results for someone elses order.
+        checks:
+        - if path exists and is a socket, it's left over from a previous agent. remove it.
+        - if it's anything else, delete it with a warning.
+        - if parent path for socket exists, if not, creates it. then bind.
         """
-
-        # generate random suffix for named pipe name, 8 should do just fine
-        letters = string.ascii_lowercase
-        newNamedPipeSuffix = "-" + "".join(random.choice(letters) for _ in range(8))
-        newPipe = self.universalPipePath.with_name(self.universalPipePath.stem + newNamedPipeSuffix)
-
-        # create new server just for this caller
-        pid = os.fork()
-
-        # child
-        if pid > 0:
-            self.universalPipePath = newPipe
-            self.preparePipe()
-            # print(f"Im child {pid}, server at {self.universalPipePath}")
-            logging.info(f"created new server with pipe at {newPipe}")
-
-        # both parent and child
-        # print(f"Im parent {pid}, server at {self.universalPipePath}")
-        return newPipe
-
-    def preparePipe(self) -> None:
-        if self.universalPipePath.exists():
-            if not stat.S_ISFIFO(os.stat(self.universalPipePath).st_mode):
-                print(f"Warning! Path {self.universalPipePath} exists but is not a pipe. Deleting!")
-                self.universalPipePath.unlink()
-
-        if not self.universalPipePath.parent.exists():
-            self.universalPipePath.parent.mkdir()
-
-        if not os.path.exists(self.universalPipePath):
-            os.mkfifo(self.universalPipePath)
-
-    def deletePipes(self) -> None:
-        if self.universalPipePath.exists():
-            self.universalPipePath.unlink()
+        if self.universalSocketPath.exists() or self.universalSocketPath.is_symlink():
+            if not stat.S_ISSOCK(os.stat(self.universalSocketPath).st_mode):
+                print(f"Warning! Path {self.universalSocketPath} exists but is not a socket. Deleting!")
+            self.universalSocketPath.unlink()
+
+        if not self.universalSocketPath.parent.exists():
+            self.universalSocketPath.parent.mkdir(parents=True)
+
+        serverSocket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        serverSocket.bind(str(self.universalSocketPath))
+        # only the user who runs the agent may send orders
+        os.chmod(self.universalSocketPath, 0o600)
+        serverSocket.listen()
+        # so that the accept loop notices a shutdown
+        serverSocket.settimeout(1.0)
+        return serverSocket
+
+    def deleteSocket(self) -> None:
+        if self.universalSocketPath.exists():
+            self.universalSocketPath.unlink()
 
     def mainLoop(self) -> None:
         """
-        continuously read from pipe and execute, write output and return codes back.
+        continuously accept new clients, each connection is served by its own thread.
         """
-        while True:
-            # read entire pipe contents and try to deserialize json from it (close pipe!)
-            thisOrder = self.receiveOrder()
-            if thisOrder.thisType == orderType.PARSE_FAILED:
-                # TODO: better error handling
-                raise Exception("Could not parse order!")
-
-            if thisOrder is not None:
-                logging.info(f"{datetime.datetime.now().isoformat(timespec='seconds')}: Received Order:")
-                logging.info(f"cmd: {thisOrder.cmd}")
-
-                logging.debug(f"{datetime.datetime.now().isoformat(timespec='seconds')}: Received Order:\n{thisOrder}\n")
+        assert self.listeningSocket is not None
+        while not self.shutdownEvent.is_set():
+            try:
+                connection, _ = self.listeningSocket.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                # listening socket was closed by bail()
+                break
+            connection.settimeout(None)
+            th.Thread(target=self.handleConnection, args=(connection,), daemon=True).start()
 
-                # execute command as ordered
+    def handleConnection(self, connection: socket.socket) -> None:
+        """
+        read orders line by line and hand them to the worker pool. Replies are written
+        back from the worker threads, so the write lock keeps them from interleaving.
+        """
+        assert self.executor is not None
+        writeLock = th.Lock()
+
+        def sendReply(returnOrder: SlurmOrder) -> None:
+            logging.info(f"{datetime.datetime.now().isoformat(timespec='seconds')}: Sent back result for request {returnOrder.requestID}:")
+            logging.info(f"stdout: {returnOrder.stdout}")
+            logging.debug(f"{datetime.datetime.now().isoformat(timespec='seconds')}: Sent back result:\n{returnOrder}\n")
+            with writeLock:
+                try:
+                    connection.sendall(self.encodeOrder(returnOrder))
+                except OSError:
+                    logging.warning(f"client went away before it got the result of request {returnOrder.requestID}")
+
+        def executeAndReply(thisOrder: SlurmOrder) -> None:
+            try:
                 returnOrder = self.execute(thisOrder)
+            except Exception as e:
+                returnOrder = thisOrder
+                returnOrder.thisType = orderType.FAILED
+                returnOrder.stderr = str(e)
+            sendReply(returnOrder)
+
+        with connection, connection.makefile("rb") as reader:
+            for line in reader:
+                thisOrder = self.decodeOrder(line)
+                if thisOrder.thisType == orderType.PARSE_FAILED:
+                    sendReply(thisOrder)
+                    continue
+
+                logging.info(f"{datetime.datetime.now().isoformat(timespec='seconds')}: Received Order {thisOrder.requestID}:")
+                logging.info(f"cmd: {thisOrder.cmd}")
+                logging.debug(f"{datetime.datetime.now().isoformat(timespec='seconds')}: Received Order:\n{thisOrder}\n")
 
-                # return result
-                logging.info(f"{datetime.datetime.now().isoformat(timespec='seconds')}: Sent back result:")
-                logging.info(f"stdout: {returnOrder.stdout}")
+                if thisOrder.thisType == orderType.EXIT:
+                    self.bail()
+                    return
 
-                logging.debug(f"{datetime.datetime.now().isoformat(timespec='seconds')}: Sent back result:\n{returnOrder}\n")
-                self.sendOrder(returnOrder)
+                self.executor.submit(executeAndReply, thisOrder)
 
     def execute(self, thisOrder: SlurmOrder) -> SlurmOrder:
-        if thisOrder.thisType == orderType.EXIT:
-            self.bail()
-
-        elif thisOrder.thisType == orderType.META:
+        if thisOrder.thisType == orderType.META:
             if thisOrder.cmd == "test":
                 thisOrder.stdout = "ok"
                 thisOrder.returnCode = 0
                 return thisOrder
-
-        elif thisOrder.thisType == orderType.MAKE_UNQUE:
-            thisOrder.stdout = str(self.migrateToNewPipePath())
-            thisOrder.returnCode = 0
-            thisOrder.thisType = orderType.UNIQUE_CONFIRM
-            return thisOrder
+            if thisOrder.cmd == "stats":
+                with self.cacheLock:
+                    thisOrder.stdout = json.dumps(self.cacheStats)
+                thisOrder.returnCode = 0
+                return thisOrder
+            raise NotImplementedError(f"meta command {thisOrder.cmd} is not implemented!")
 
         elif thisOrder.thisType == orderType.REGULAR:
-            if not thisOrder.runShell:
-                cmds = shlex.split(thisOrder.cmd)
-                # this returns a CompletedProcess
-                process = subprocess.run(
-                    cmds,
-                    env=thisOrder.env,
-                    capture_output=True,  # this is available from Python 3.7 onwards, but NOT 3.6 (which is on himster)
-                    shell=False,
-                    encoding="utf-8",
-                )
+            result = self.runCommand(thisOrder)
+
+        elif thisOrder.thisType == orderType.QUERY:
+            result = self.runQuery(thisOrder)
+
+        else:
+            raise NotImplementedError(f"order type {thisOrder.thisType} is not implemented!")
+
+        # write stdout, stderr and return code to returned SlurmOrder
+        thisOrder.returnCode, thisOrder.stdout, thisOrder.stderr = result
+        return thisOrder
+
+    def runCommand(self, thisOrder: SlurmOrder) -> CommandResult:
+        if not thisOrder.runShell:
+            cmds = shlex.split(thisOrder.cmd)
+            # this returns a CompletedProcess
+            process = subprocess.run(
+                cmds,
+                env=thisOrder.env,
+                capture_output=True,  # this is available from Python 3.7 onwards, but NOT 3.6 (which is on himster)
+                shell=False,
+                encoding="utf-8",
+            )
+        else:
+            process = subprocess.run(
+                thisOrder.cmd,
+                env=thisOrder.env,
+                capture_output=True,
+                shell=True,
+                encoding="utf-8",
+            )
+        return process.returncode, process.stdout, process.stderr
+
+    def runQuery(self, thisOrder: SlurmOrder) -> CommandResult:
+        """
+        Answers a read-only order from the cache, from an identical order that is
+        currently running, or runs it. Only successful, non-empty results are cached.
+        """
+        key = (thisOrder.cmd, thisOrder.runShell)
+        isRunner = False
+        with self.cacheLock:
+            cached = self.queryCache.get(key)
+            if cached is not None and time.monotonic() - cached[0] < self.cacheTTL:
+                self.cacheStats["hits"] += 1
+                return cached[1]
+
+            inFlight = self.inFlightQueries.get(key)
+            if inFlight is not None:
+                self.cacheStats["coalesced"] += 1
             else:
-                process = subprocess.run(
-                    thisOrder.cmd,
-                    env=thisOrder.env,
-                    capture_output=True,
-                    shell=True,
-                    encoding="utf-8",
-                )
-
-            # write stdout, stderr and return code to returned SlurmOrder
-            thisOrder.returnCode = process.returncode
-            thisOrder.stdout = process.stdout
-            thisOrder.stderr = process.stderr
-            return thisOrder
-
-        raise NotImplementedError(f"order type {thisOrder.thisType} is not implemented!")
+                self.cacheStats["misses"] += 1
+                inFlight = Future()
+                self.inFlightQueries[key] = inFlight
+                isRunner = True
+
+        if not isRunner:
+            return inFlight.result()
+
+        try:
+            result = self.runCommand(thisOrder)
+        except Exception as e:
+            with self.cacheLock:
+                del self.inFlightQueries[key]
+            inFlight.set_exception(e)
+            raise
+
+        with self.cacheLock:
+            del self.inFlightQueries[key]
+            if result[0] == 0 and result[1] != "":
+                self.queryCache[key] = (time.monotonic(), result)
+        inFlight.set_result(result)
+        return result
 
     def bail(self) -> None:
         # print(f'Received "exit" command. Exiting now.')
-        self.deletePipes()
-        # print("Have a nice day.")
-        sys.exit(0)
+        self.shutdownEvent.set()
+        if self.listeningSocket is not None:
+            self.listeningSocket.close()
+        self.deleteSocket()
+
+    def serve(self) -> None:
+        """
+        Runs the agent in the current process until it receives an EXIT order.
+        """
+        self.executor = ThreadPoolExecutor(max_workers=self.maxWorkers)
+        self.listeningSocket = self.prepareSocket()
+        try:
+            self.mainLoop()
+        finally:
+            # let running orders finish, their clients are waiting for them
+            self.executor.shutdown(wait=True)
+            self.bail()
 
     def run(self, debug: bool = False) -> None:
         if not debug:
@@ -252,10 +329,10 @@ class Server(Agent):
                 sys.exit(1)
 
         welcome = f"""
-        Agent starting and forking to background. Write: {{"orderType": -1}} to orderPipe to exit agent.
-        Or, just copy this command:
+        Agent starting and forking to background, listening on {self.universalSocketPath}.
+        To stop the agent, run:
 
-        echo '{{"orderType":-1 }}' > {self.universalPipePath}
+        {sys.argv[0]} --stop
         """
 
         print(welcome)
@@ -273,89 +350,153 @@ class Server(Agent):
         )
         logging.info(f"Starting Log at {datetime.datetime.now().isoformat()}\n")
 
-        self.preparePipe()
-        self.mainLoop()
+        self.serve()
 
 
 class Client(Agent):
+    """
+    A client holds one connection to the agent. It is thread safe: every order gets
+    a unique request ID and the reply is handed to whoever sent the order, no matter
+    in which order the agent finishes them.
+
+    Once the connection is lost, all orders still waiting for a reply fail with a
+    ConnectionError, and so does every new order.
+    """
+
+    def __init__(self, socketPath: Optional[Path] = None) -> None:
+        super().__init__(socketPath)
+        if not os.path.exists(self.universalSocketPath):
+            raise FileNotFoundError(f"agent socket not found at {self.universalSocketPath}. Please start the agent first!")
+        if not stat.S_ISSOCK(os.stat(self.universalSocketPath).st_mode):
+            raise FileExistsError(f"\nERROR! Path {self.universalSocketPath} is not a socket!")
+
+        self.connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.connection.connect(str(self.universalSocketPath))
+
+        self.requestCounter = itertools.count(1)
+        self.sendLock = th.Lock()
+        self.pendingLock = th.Lock()
+        self.pendingOrders: Dict[int, "Future[SlurmOrder]"] = {}
+        # set by the reader thread when it stops, no replies can arrive after that
+        self.closed = False
+
+        self.readerThread = th.Thread(target=self.readReplies, daemon=True)
+        self.readerThread.start()
+
+        self.checkConnection()
+
     def checkConnection(self) -> bool:
         testOrder = SlurmOrder()
         testOrder.thisType = orderType.META
         testOrder.cmd = "test"
-        self.sendOrder(testOrder)
-        resultOrder = self.receiveOrder()
+        resultOrder = self.execute(testOrder, timeout=10)
         assert resultOrder.stdout == "ok", "Unexpected answer!"
         return True
 
-    def __init__(self) -> None:
-        if not os.path.exists(self.universalPipePath):
-            raise FileNotFoundError(f"named pipe not found at {self.universalPipePath}. Please start the agent first!")
-        if not stat.S_ISFIFO(os.stat(self.universalPipePath).st_mode):
-            raise FileExistsError(f"\nERROR! Path {self.universalPipePath} is not a pipe!")
-
-        self.checkConnection()
-
-    def __enter__(self) -> "Client":
-        return self.getUniqueServer()
-
-    def getUniqueServer(self) -> "Client":
+    def readReplies(self) -> None:
+        try:
+            with self.connection.makefile("rb") as reader:
+                for line in reader:
+                    resultOrder = self.decodeOrder(line)
+                    with self.pendingLock:
+                        future = self.pendingOrders.pop(resultOrder.requestID, None)
+                    if future is None:
+                        logging.warning(f"received result for unknown request {resultOrder.requestID}")
+                        continue
+                    if not future.cancelled():
+                        future.set_result(resultOrder)
+        except (OSError, ValueError):
+            # socket was closed by exit()
+            pass
+        finally:
+            # no more replies will come, don't let anyone wait forever
+            with self.pendingLock:
+                self.closed = True
+                orphans = list(self.pendingOrders.values())
+                self.pendingOrders.clear()
+            for future in orphans:
+                if not future.cancelled():
+                    future.set_exception(ConnectionError("connection to the agent was closed"))
+
+    def sendOrder(self, thisOrder: SlurmOrder) -> "Future[SlurmOrder]":
+        """
+        Sends the order and returns a Future for the agent's reply.
+        Raises a ConnectionError if the connection to the agent is lost.
         """
-        when the "with Client() as client" method is used, each client get's their own pipe.
-
-        workflow:
-        - send UNIQE command to default pipe
-        - agent there will fork
-        - original will send back order with name of new pipe
-        - fork will send copy of that same order into new pipe (and will block until someone receives)
-        - client will receive one order with path of new pipe (from original server)
-        - client must also receive copy order from new pipe, else fork will block (useful as confirmation)
+        future: "Future[SlurmOrder]" = Future()
+        with self.pendingLock:
+            if self.closed:
+                raise ConnectionError("connection to the agent was closed")
+            thisOrder.requestID = next(self.requestCounter)
+            self.pendingOrders[thisOrder.requestID] = future
+
+        try:
+            with self.sendLock:
+                self.connection.sendall(self.encodeOrder(thisOrder))
+        except OSError as e:
+            with self.pendingLock:
+                self.pendingOrders.pop(thisOrder.requestID, None)
+            raise ConnectionError(f"could not send order to the agent: {e}") from e
+        return future
+
+    def execute(self, thisOrder: SlurmOrder, timeout: Optional[float] = None) -> SlurmOrder:
         """
+        Sends the order and blocks until its result is there.
+        """
+        resultOrder = self.sendOrder(thisOrder).result(timeout)
+        if resultOrder.thisType == orderType.FAILED:
+            raise RuntimeError(f"agent could not execute order {thisOrder.cmd}: {resultOrder.stderr}")
+        return resultOrder
 
-        makeUniqueOrder = SlurmOrder(thisType=orderType.MAKE_UNQUE)
-        self.sendOrder(makeUniqueOrder)
-        returnOrder = self.receiveOrder()
+    def getCacheStats(self) -> Dict[str, int]:
+        """
+        Returns the hit, miss and coalesced counters of the agent's query cache.
+        """
+        return json.loads(self.execute(SlurmOrder(thisType=orderType.META, cmd="stats")).stdout)
 
-        if returnOrder.thisType == orderType.UNIQUE_CONFIRM:
-            self.universalPipePath = Path(returnOrder.stdout)
-        # race condition has occured
-        else:
-            raise ValueError("race condition in 'makeUniqueOrder'")
-
-        # it may take a while for the pipe to get created by the kernel,
-        # so we can't ask too fast
-        timeout = 10
-        start = time.time()
-        while (time.time() - start) < timeout:
-            if not self.universalPipePath.exists():
-                # when the file isn't there (yet?), just wait and try again
-                time.sleep(0.2)
-                continue
-            break
+    def stopAgent(self) -> None:
+        """
+        Tells the agent to shut down. It's shared by all clients, so use with care!
+        """
+        with self.sendLock:
+            self.connection.sendall(self.encodeOrder(SlurmOrder(thisType=orderType.EXIT)))
 
-        # if it still doesn't exist after the timeout, we'll get an error here
-        confirmationOrder = self.receiveOrder()
+    def exit(self) -> None:
+        """
+        Closes this client's connection, the agent keeps running.
+        """
+        try:
+            self.connection.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.connection.close()
 
-        if confirmationOrder.thisType == orderType.UNIQUE_CONFIRM:
-            logging.info(f"new pipe confirmation received: {confirmationOrder}")
-        else:
-            raise ValueError("returned confirmation is invalid!")
+    def __enter__(self) -> "Client":
         return self
 
-    def exit(self) -> None:
-        logging.shutdown()
-        self.sendOrder(SlurmOrder(thisType=orderType.EXIT))
-
     def __exit__(self, type, value, traceback) -> None:
-        self.sendOrder(SlurmOrder(thisType=orderType.EXIT))
+        self.exit()
 
 
 if __name__ == "__main__":
-    thisServer = Server()
+    parser = argparse.ArgumentParser(description="Agent that runs slurm commands for clients inside a container.")
+    parser.add_argument("--debug", action="store_true", help="stay in the foreground and log everything")
+    parser.add_argument("--stop", action="store_true", help="stop a running agent and exit")
+    parser.add_argument("--stats", action="store_true", help="print the query cache counters of a running agent and exit")
+    parser.add_argument("--workers", type=int, default=8, help="number of orders that are executed at the same time")
+    parser.add_argument("--cache_ttl", type=float, default=10.0, help="seconds for which results of read-only queries are reused")
+    parser.add_argument("--socket", type=Path, default=None, help=f"path of the agent socket (default {Agent.universalSocketPath})")
+    agentArgs = parser.parse_args()
+
+    if agentArgs.stop:
+        with Client(agentArgs.socket) as client:
+            client.stopAgent()
+        sys.exit(0)
 
-    if "--debug" in sys.argv:
-        thisServer.run(debug=True)
-    else:
-        thisServer.run()
+    if agentArgs.stats:
+        with Client(agentArgs.socket) as client:
+            print(client.getCacheStats())
+        sys.exit(0)
 
-    #! Uncomment this to see some basic examples
-    # Agent.SlurmOrderExamples()
+    thisServer = Server(agentArgs.socket, maxWorkers=agentArgs.workers, cacheTTL=agentArgs.cache_ttl)
+    thisServer.run(debug=agentArgs.debug)
@@ -0,0 +1,158 @@
+"""
+Content-addressed cache for simulation/reconstruction outputs, shared by all experiments.
+
+Configs from create_sim_reco_pars.py or createIPtestConfigs.py often have identical
+sim/reco/align params for some data type, but each gets its own baseDataDir. So the
+outputs are keyed by a hash over the params that actually change them (plus the software
+version), and an experiment that needs the same outputs links them instead of
+simulating them again.
+
+The index is an SQLite database, so experiments running in different processes can share it.
+"""
+
+import hashlib
+import json
+import sqlite3
+import subprocess
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import cattrs
+from lumifit.manifest import copyRecords
+from lumifit.types import ConfigPackage, DataMode, SoftwarePaths
+
+# these don't change the outputs (commands are just paths to the same scripts,
+# the software version is hashed separately)
+_IGNORED_FIELDS = {"simulationCommand", "reconstructionCommand"}
+
+
+def softwareVersion(softwarePaths: SoftwarePaths) -> Optional[str]:
+    """
+    The git commit of the LmdFit scripts (with a -dirty suffix for local changes).
+    None if it can't be determined, then nothing should be cached.
+    """
+    try:
+        process = subprocess.run(
+            ["git", "-C", str(softwarePaths.LmdFitScripts), "describe", "--always", "--dirty", "--abbrev=40"],
+            capture_output=True,
+            encoding="utf-8",
+        )
+    except OSError:
+        return None
+    if process.returncode != 0 or not process.stdout.strip():
+        return None
+    return process.stdout.strip()
+
+
+def _fileHash(path: Path) -> str:
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def configPackageHash(configPackage: ConfigPackage, dataMode: DataMode, softwareVersion: str) -> str:
+    """
+    Hashes everything that decides what the sim/reco jobs of this config package write.
+
+    For res/acc data, the random seed is left out: box generator samples with different seeds
+    are equally good for the acceptance and resolution. Data and vertex data must keep it,
+    or different experiments would end up with the very same data sample.
+    """
+    content: Dict[str, Any] = {"software": softwareVersion, "dataMode": dataMode.value}
+
+    recoParams = cattrs.unstructure(configPackage.recoParams)
+    if dataMode == DataMode.VERTEXDATA:
+        # same as in generateAbsoluteROOTDataPath, vertex data is always uncut
+        recoParams["use_xy_cut"] = False
+        recoParams["use_m_cut"] = False
+    content["reco"] = recoParams
+
+    if configPackage.simParams is not None:
+        simParams = cattrs.unstructure(configPackage.simParams)
+        if dataMode == DataMode.RESACC:
+            del simParams["random_seed"]
+        content["sim"] = simParams
+
+    # the matrices are referenced by path, but what matters is what's in them
+    alignParams = cattrs.unstructure(configPackage.alignParams)
+    for name in ("alignment_matrices_path", "misalignment_matrices_path"):
+        matrixPath = getattr(configPackage.alignParams, name)
+        if matrixPath is not None and matrixPath.is_file():
+            alignParams[name] = _fileHash(matrixPath)
+    content["align"] = alignParams
+
+    for params in content.values():
+        if isinstance(params, dict):
+            for field in _IGNORED_FIELDS:
+                params.pop(field, None)
+
+    return hashlib.sha256(json.dumps(content, sort_keys=True).encode()).hexdigest()
+
+
+def linkArtifacts(source: Path, target: Path, glob_pattern: str) -> int:
+    """
+    Symlinks all files matching the glob pattern from source to target, unless the target
+    already has a file of that name. Returns how many were linked.
+    Their records in the source manifest are copied to the target manifest (see lumifit.manifest).
+    """
+    target.mkdir(parents=True, exist_ok=True)
+    linked = []
+    for sourceFile in source.glob(glob_pattern):
+        targetFile = target / sourceFile.name
+        if targetFile.exists() or targetFile.is_symlink():
+            continue
+        targetFile.symlink_to(sourceFile.resolve())
+        linked.append(sourceFile.name)
+    if linked:
+        copyRecords(source, target, linked)
+    return len(linked)
+
+
+class ArtifactCache:
+    """
+    Maps (hash, stage) to the directory that holds the finished outputs.
+    """
+
+    def __init__(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.__lock = threading.Lock()
+        # other processes may write at the same time, so wait a bit for their locks
+        self.__connection = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None, timeout=60)
+        with self.__lock:
+            self.__connection.execute("PRAGMA journal_mode=WAL")
+            self.__connection.execute(
+                "CREATE TABLE IF NOT EXISTS artifacts (key TEXT NOT NULL, stage TEXT NOT NULL, path TEXT NOT NULL, created REAL NOT NULL, PRIMARY KEY (key, stage))"
+            )
+
+    def lookup(self, key: str, stage: str) -> Optional[Path]:
+        with self.__lock:
+            row = self.__connection.execute("SELECT path FROM artifacts WHERE key = ? AND stage = ?", (key, stage)).fetchone()
+        if row is None:
+            return None
+        path = Path(row[0])
+        # someone cleaned up the lustre, forget about it
+        if not path.is_dir():
+            self.forget(key, stage)
+            return None
+        return path
+
+    def register(self, key: str, stage: str, path: Path) -> None:
+        """
+        Registers path as the outputs for this key. The first one wins, later ones are
+        (probably) links to it anyway.
+        """
+        with self.__lock:
+            self.__connection.execute("INSERT OR IGNORE INTO artifacts (key, stage, path, created) VALUES (?, ?, ?, ?)", (key, stage, str(path), time.time()))
+
+    def forget(self, key: str, stage: str) -> None:
+        with self.__lock:
+            self.__connection.execute("DELETE FROM artifacts WHERE key = ? AND stage = ?", (key, stage))
+
+    def close(self) -> None:
+        with self.__lock:
+            self.__connection.close()
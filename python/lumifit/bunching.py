@@ -0,0 +1,98 @@
+"""
+File list bunches with about the same number of events each.
+
+makeMultipleFileListBunches.py puts the same number of track files into every bunch, but the track
+files have very different numbers of events (whatever survived the cuts), and the slowest
+createLmdFitData task decides how long the whole lmd data stage takes. Here the files are
+bin-packed by their entries instead, largest first onto the bunch with the fewest events so far.
+
+The entries come from the manifests of the reco tasks (see lumifit.manifest) if they are there,
+otherwise the files are opened with uproot.
+"""
+
+import heapq
+import math
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from lumifit.manifest import numberOfEntries, readManifest
+from lumifit.paths import generateRelativeBinningDir, generateRelativeBunchesDir
+
+
+def entryCounts(files: List[Path], treeName: str, max_workers: int = 8) -> Dict[Path, int]:
+    """
+    The entries of every file in this tree. Files that can't be read count as empty.
+    """
+    entries: Dict[Path, int] = {}
+    toCount: List[Path] = []
+    manifests = {directory: readManifest(directory) for directory in {trackFile.parent for trackFile in files}}
+    for trackFile in files:
+        records = manifests[trackFile.parent]
+        record = records.get(trackFile.name) if records is not None else None
+        if record is not None and record.entries is not None:
+            entries[trackFile] = record.entries
+        else:
+            toCount.append(trackFile)
+
+    if toCount:
+        print(f"counting the entries of {len(toCount)} files with uproot...")
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(toCount)), thread_name_prefix="entryCounts") as executor:
+            for trackFile, counted in zip(toCount, executor.map(lambda trackFile: numberOfEntries(trackFile, treeName), toCount)):
+                entries[trackFile] = counted if counted is not None else 0
+
+    return {trackFile: entries[trackFile] for trackFile in files}
+
+
+def balancedBunches(entries: Dict[Path, int], number_of_bunches: int) -> List[List[Path]]:
+    """
+    Distributes the files onto number_of_bunches bunches (fewer if there aren't enough files)
+    so that the bunches have about the same number of entries.
+    """
+    number_of_bunches = min(number_of_bunches, len(entries))
+    if number_of_bunches < 1:
+        return []
+
+    bunches: List[List[Path]] = [[] for _ in range(number_of_bunches)]
+    # (entries so far, bunch index), the lightest bunch is always on top
+    heap = [(0, index) for index in range(number_of_bunches)]
+    for trackFile in sorted(entries, key=lambda trackFile: (-entries[trackFile], trackFile)):
+        total, index = heapq.heappop(heap)
+        bunches[index].append(trackFile)
+        heapq.heappush(heap, (total + entries[trackFile], index))
+
+    return [sorted(bunch) for bunch in bunches]
+
+
+def numberOfBunchesForRuntime(total_entries: int, target_seconds_per_bunch: float, events_per_second: float) -> int:
+    return max(1, math.ceil(total_entries / (target_seconds_per_bunch * events_per_second)))
+
+
+def measuredEventsPerSecond(trackDirectory: Path) -> Optional[float]:
+    """
+    How many events createLmdFitData processed per second in an earlier run on these track files,
+    from the manifests of the lmd data tasks and the reco tasks. None if they don't tell.
+    """
+    bunchesDir = trackDirectory / generateRelativeBunchesDir()
+    lmdDataRecords = readManifest(bunchesDir / generateRelativeBinningDir())
+    trackRecords = readManifest(trackDirectory)
+    if not lmdDataRecords or not trackRecords:
+        return None
+
+    secondsPerTask = {record.task: record.timings["lmdData"] for record in lmdDataRecords.values() if record.stage == "lmdData" and "lmdData" in record.timings}
+    events = 0
+    seconds = 0.0
+    for task, taskSeconds in secondsPerTask.items():
+        fileList = bunchesDir / f"filelist_{task}.txt"
+        if not fileList.exists():
+            continue
+        with open(fileList) as f:
+            records = [trackRecords.get(Path(line.strip()).name) for line in f if line.strip()]
+        if any(record is None or record.entries is None for record in records):
+            continue
+        events += sum(record.entries for record in records)  # type: ignore
+        seconds += taskSeconds
+
+    if seconds <= 0 or events < 1:
+        return None
+    return events / seconds
@@ -1,9 +1,12 @@
 import os
+import queue
 import subprocess
 import threading
 from abc import abstractmethod
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
 from time import sleep
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
 import attr
 from attrs import define
@@ -48,17 +51,59 @@ class Job:
     array_indices: List[int] = attr.ib(validator=_validate_job_array_indices)
     exported_user_variables: Dict[str, Any] = attr.ib(factory=dict)
     additional_flags: str = attr.ib(default="")
+    # job IDs this job has to wait for. afterok starts it only if all of them succeeded,
+    # afterany as soon as they are done, even if some array tasks failed
+    dependencies: List[int] = attr.ib(factory=list)
+    dependency_type: str = attr.ib(default="afterok")
 
 
 class JobHandler:
     @abstractmethod
+    def create_submit_commands(self, job: Job) -> Iterable[str]:
+        """
+        Returns the shell commands that submit this job. Only needed by handlers
+        that don't override submit().
+        """
+        raise NotImplementedError(f"{type(self).__name__} does not create submit commands!")
+
     def submit(self, job: Job) -> Tuple[int, int]:
-        pass
+        """
+        Default submission: runs the submit commands in a shell, one after another.
+        Returns the return code of the last command and -1 as job array ID,
+        because the commands don't tell us one.
+        """
+        returnCode = 0
+        for command in self.create_submit_commands(job):
+            returnCode = subprocess.call(command, shell=True)
+            if returnCode != 0:
+                break
+        return returnCode, -1
 
     @abstractmethod
     def get_active_number_of_jobs(self, jobID: Optional[int] = None) -> int:
         pass
 
+    def watch(self, jobID: int, poll_interval_in_seconds: int = 60) -> "Future[int]":
+        """
+        Returns a Future that resolves to the jobID once the job (with all its array tasks)
+        is neither running nor pending anymore.
+
+        This default implementation polls get_active_number_of_jobs(jobID) in a thread of
+        its own. Handlers that can watch many jobs at once should override this.
+        """
+        future: "Future[int]" = Future()
+
+        def poll() -> None:
+            try:
+                while self.get_active_number_of_jobs(jobID) > 0:
+                    sleep(poll_interval_in_seconds)
+                future.set_result(jobID)
+            except Exception as e:
+                future.set_exception(e)
+
+        threading.Thread(target=poll, name=f"JobHandler-watch-{jobID}", daemon=True).start()
+        return future
+
 
 class DebugJobHandler(JobHandler):
     def submit(self, job: Job) -> Tuple[int, int]:
@@ -74,20 +119,129 @@ class DebugJobHandler(JobHandler):
         # job array ID is always -1, because it's not a cluster
         return subprocess.call(job.application_url, env=my_env), -1
 
-    def get_active_number_of_jobs(self) -> int:
+    def get_active_number_of_jobs(self, jobID: Optional[int] = None) -> int:
         return 0
 
 
+class LocalJobHandler(JobHandler):
+    """
+    Runs jobs on this machine instead of a cluster, but with the same array semantics:
+    every array index is a process of its own with SLURM_ARRAY_TASK_ID and SLURM_JOB_ID set,
+    and at most max_parallel_processes of them run at the same time (default: all cores).
+
+    Job IDs are made up, counting up from 1. Dependencies between jobs are honored like slurm
+    does it with --kill-on-invalid-dep: if an afterok dependency had a failed task, the job is
+    dropped without running.
+    """
+
+    def __init__(self, max_parallel_processes: Optional[int] = None) -> None:
+        self.__executor = ThreadPoolExecutor(max_workers=max_parallel_processes or os.cpu_count() or 1, thread_name_prefix="LocalJobHandler")
+        self.__lock = threading.Lock()
+        self.__next_job_id = 1
+        # job ID -> number of array tasks that are pending or running
+        self.__active_tasks: Dict[int, int] = {}
+        # job ID -> array indices whose process failed (or never ran)
+        self.__failed_tasks: Dict[int, List[int]] = {}
+        self.__done: Dict[int, threading.Event] = {}
+
+    def submit(self, job: Job) -> Tuple[int, int]:
+        # like slurm's --array, a job without tasks would never be done
+        if len(job.array_indices) == 0:
+            raise ValueError("Number of jobs is zero!")
+
+        with self.__lock:
+            jobID = self.__next_job_id
+            self.__next_job_id += 1
+            self.__active_tasks[jobID] = len(job.array_indices)
+            self.__failed_tasks[jobID] = []
+            self.__done[jobID] = threading.Event()
+
+        threading.Thread(target=self.__dispatch, args=(jobID, job), name=f"LocalJobHandler-job-{jobID}", daemon=True).start()
+        return 0, jobID
+
+    def __dispatch(self, jobID: int, job: Job) -> None:
+        # unknown job IDs can't be waited for, slurm would treat them as done as well
+        for dependency in job.dependencies:
+            if dependency in self.__done:
+                self.__done[dependency].wait()
+
+        if job.dependency_type == "afterok" and any(self.__failed_tasks.get(dependency) for dependency in job.dependencies):
+            print(f"Dependencies of local job {jobID} ({job.name}) failed, dropping it.")
+            for index in job.array_indices:
+                self.__task_finished(jobID, index, returnCode=1)
+            return
+
+        for index in job.array_indices:
+            self.__executor.submit(self.__run_task, jobID, index, job)
+
+    def __run_task(self, jobID: int, index: int, job: Job) -> None:
+        env = os.environ.copy()
+        env.update({name: str(value) for name, value in job.exported_user_variables.items()})
+        env["SLURM_JOB_ID"] = str(jobID)
+        env["SLURM_ARRAY_JOB_ID"] = str(jobID)
+        env["SLURM_ARRAY_TASK_ID"] = str(index)
+
+        # same placeholders slurm knows for --output
+        logfile = Path(job.logfile_url.replace("%A", str(jobID)).replace("%a", str(index)))
+        try:
+            logfile.parent.mkdir(parents=True, exist_ok=True)
+            # append: the job IDs start at 1 again in every process, so a rerun (or a resubmitted
+            # index) would overwrite the log of the earlier attempt
+            with open(logfile, "a") as log:
+                returnCode = subprocess.call(job.application_url, shell=True, env=env, stdout=log, stderr=subprocess.STDOUT)
+        except OSError as e:
+            print(f"Could not run task {index} of local job {jobID}: {e}")
+            returnCode = 1
+        self.__task_finished(jobID, index, returnCode)
+
+    def __task_finished(self, jobID: int, index: int, returnCode: int) -> None:
+        with self.__lock:
+            if returnCode != 0:
+                self.__failed_tasks[jobID].append(index)
+            self.__active_tasks[jobID] -= 1
+            if self.__active_tasks[jobID] == 0:
+                del self.__active_tasks[jobID]
+                self.__done[jobID].set()
+
+    def get_active_number_of_jobs(self, jobID: Optional[int] = None) -> int:
+        with self.__lock:
+            if jobID is None:
+                return sum(self.__active_tasks.values())
+            return self.__active_tasks.get(jobID, 0)
+
+    def get_failed_array_indices(self, jobID: int) -> List[int]:
+        with self.__lock:
+            return sorted(self.__failed_tasks.get(jobID, []))
+
+    def watch(self, jobID: int, poll_interval_in_seconds: int = 60) -> "Future[int]":
+        """
+        No polling needed, we know when our own processes are done.
+        """
+        future: "Future[int]" = Future()
+        done = self.__done.get(jobID)
+        if done is None or done.is_set():
+            future.set_result(jobID)
+            return future
+
+        def wait() -> None:
+            done.wait()
+            future.set_result(jobID)
+
+        threading.Thread(target=wait, name=f"LocalJobHandler-watch-{jobID}", daemon=True).start()
+        return future
+
+
 class ClusterJobManager:
     """
     Manages submission of jobs on a cluster environment.
 
-    The manager blocks as soon as a job should be submitted (enqueued) and only returns once the submission
-    was successful. No other error handling here, either the job was submitted successfully, or
-    the other threads have to wait anyway.
+    Jobs are appended to a submission queue, which is drained by a single background
+    thread. Callers get a Future for the job (array) ID right away and don't have to
+    wait for the submission (or for free capacity on the cluster) unless they want to.
 
-    Manager should be thread safe. Each instance gets its own agent, so it should
-    also be multi-process safe.
+    The submitter thread is the only one that sleeps, i.e. if the cluster is too full
+    or a submission failed, so status queries of other threads are never blocked by a
+    throttled submission. Job handlers must be thread safe for that.
     """
 
     def __init__(
@@ -95,51 +249,117 @@ class ClusterJobManager:
         job_handler: JobHandler,
         total_job_threshold: int = 1000,
         resubmit_wait_time_in_seconds: int = 1800,
+        time_to_sleep_after_submission: int = 3,
     ) -> None:
         if not isinstance(job_handler, JobHandler):
             raise TypeError(f"job_handler must be of type JobHandler, got {job_handler}!")
         self.__job_handler = job_handler
         self.__total_job_threshold = total_job_threshold
         self.__resubmit_wait_time_in_seconds = resubmit_wait_time_in_seconds
-        self.__lock = threading.Lock()
+        self.__time_to_sleep_after_submission = time_to_sleep_after_submission
+
+        # guards the submitter thread state
+        self.__state_lock = threading.Lock()
+        self.__job_queue: "queue.Queue[Tuple[Job, Future]]" = queue.Queue()
+        self.__submitter: Optional[threading.Thread] = None
 
-    def get_active_number_of_jobs(self, jobID: int) -> int:
+    def get_active_number_of_jobs(self, jobID: Optional[int] = None) -> int:
         """
         Calls the equivalent function in the job handler.
         """
-        with self.__lock:
-            return self.__job_handler.get_active_number_of_jobs(jobID)
+        if jobID is None:
+            return self.__job_handler.get_active_number_of_jobs()
+        return self.__job_handler.get_active_number_of_jobs(jobID)
+
+    def watch(self, jobID: int) -> "Future[int]":
+        """
+        Returns a Future that resolves once the job has left the queue.
+        """
+        return self.__job_handler.watch(jobID)
+
+    def wait_for_job(self, jobID: int) -> None:
+        """
+        Blocks until the job (with all its array tasks) is neither running nor pending anymore.
+        """
+        self.watch(jobID).result()
+
+    def append(self, job: Job) -> "Future[int]":
+        """
+        Appends a job to the submission queue and returns immediately.
+
+        The returned Future resolves to the job (array) ID once the job was submitted,
+        or holds the exception if the submission failed for good.
+        """
+        future: "Future[int]" = Future()
+        self.__job_queue.put((job, future))
+
+        with self.__state_lock:
+            if self.__submitter is None or not self.__submitter.is_alive():
+                self.__submitter = threading.Thread(target=self.__submit_queued_jobs, name="ClusterJobManager-submitter", daemon=True)
+                self.__submitter.start()
+        return future
 
     def enqueue(self, job: Job) -> int:
         """
-        Enqueues a job to slurm.
+        Enqueues a job to slurm and blocks until it is submitted.
 
         The manager submits the jobs as soon as there is capacity on the cluster,
         no need to manually submit jobs!
 
         returns job (array) ID
         """
-        with self.__lock:
-            while True:
-                if self.__job_handler.get_active_number_of_jobs() < self.__total_job_threshold:
-                    triesCounter = 0
-                    while triesCounter < 3:
-                        returncode, jobArrayID = self.__job_handler.submit(job)
-                        if returncode > 0:
-                            triesCounter += 1
-                            print("Submit failed! Waiting 15 seconds and then trying again...")
-                            sleep(15)
-
-                        else:
-                            print(f"Job submitted as id {jobArrayID}, waiting 3 seconds.")
-                            # it seems SLURM takes a few seconds to update the queue, so we wait a bit
-                            sleep(3)
-                            return jobArrayID
-
-                    raise RuntimeError("Job submission failed 3 times in a row, aborting...")
-
-                else:
-                    print("Yep, we have currently have too many jobs waiting in queue!")
-                    # and sleep for some time
-                    print("Waiting for " + str(self.__resubmit_wait_time_in_seconds / 60) + " min and then trying a resubmit...")
-                    sleep(self.__resubmit_wait_time_in_seconds)
+        return self.append(job).result()
+
+    def is_active(self) -> bool:
+        """
+        True as long as there are jobs in the queue that were not submitted yet.
+        """
+        with self.__state_lock:
+            return self.__submitter is not None and self.__submitter.is_alive()
+
+    def __submit_queued_jobs(self) -> None:
+        while True:
+            with self.__state_lock:
+                try:
+                    job, future = self.__job_queue.get_nowait()
+                except queue.Empty:
+                    # the thread is done. append() starts a new one for new jobs,
+                    # which can't race with us because it needs the same lock
+                    self.__submitter = None
+                    return
+
+            if not future.set_running_or_notify_cancel():
+                continue
+
+            try:
+                future.set_result(self.__submit(job))
+            except Exception as e:
+                future.set_exception(e)
+
+    def __submit(self, job: Job) -> int:
+        while self.get_active_number_of_jobs() >= self.__total_job_threshold:
+            print("Yep, we have currently have too many jobs waiting in queue!")
+            # and sleep for some time
+            print("Waiting for " + str(self.__resubmit_wait_time_in_seconds / 60) + " min and then trying a resubmit...")
+            sleep(self.__resubmit_wait_time_in_seconds)
+
+        triesCounter = 0
+        while triesCounter < 3:
+            try:
+                returncode, jobArrayID = self.__job_handler.submit(job)
+            except RuntimeError as e:
+                print(f"Submit raised an error: {e}")
+                returncode, jobArrayID = 1, 0
+
+            if returncode > 0:
+                triesCounter += 1
+                print("Submit failed! Waiting 15 seconds and then trying again...")
+                sleep(15)
+
+            else:
+                print(f"Job submitted as id {jobArrayID}, waiting {self.__time_to_sleep_after_submission} seconds.")
+                # it seems SLURM takes a few seconds to update the queue, so we wait a bit
+                sleep(self.__time_to_sleep_after_submission)
+                return jobArrayID
+
+        raise RuntimeError("Job submission failed 3 times in a row, aborting...")
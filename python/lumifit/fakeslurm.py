@@ -0,0 +1,379 @@
+"""
+A fake slurm for testing and benchmarking the job orchestration without a cluster.
+
+installFakeSlurm() writes sbatch, squeue and sacct shims to a directory. Put it first in
+PATH and SlurmJobHandler (or the agent) will talk to the fake instead of the real thing.
+It understands the sbatch command lines SlurmJobHandler builds, including job arrays and
+dependencies, and the squeue/sacct calls in lumifit.slurm.
+
+Nothing is actually run. Every job (array task) waits queue_delay_in_seconds after its
+submission (or until its dependencies are done, whatever is later), then "runs" for
+run_time_in_seconds and completes. The run time can be set per job by exporting
+FAKE_SLURM_RUN_TIME. The cluster has no capacity limit, all tasks of an array start together.
+
+All state lives in a directory (one json file per job), so the shims can be called
+from any process. Every call is logged to calls.log with its duration.
+"""
+
+import argparse
+import fcntl
+import json
+import os
+import re
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+_STATE_DIR_VARIABLE = "FAKE_SLURM_STATE_DIR"
+
+_SHORT_STATES = {"PENDING": "PD", "RUNNING": "R", "COMPLETED": "CD"}
+
+
+def installFakeSlurm(binDir: Path, stateDir: Path, queue_delay_in_seconds: float = 0.0, run_time_in_seconds: float = 1.0) -> None:
+    """
+    Writes the sbatch, squeue and sacct shims to binDir. They keep their state in stateDir.
+    """
+    binDir.mkdir(parents=True, exist_ok=True)
+    (stateDir / "jobs").mkdir(parents=True, exist_ok=True)
+
+    with open(stateDir / "config.json", "w") as f:
+        json.dump({"queue_delay_in_seconds": queue_delay_in_seconds, "run_time_in_seconds": run_time_in_seconds}, f)
+
+    # the shims must find this module, no matter which python path the caller has
+    pythonPath = Path(__file__).resolve().parent.parent
+    for command in ("sbatch", "squeue", "sacct"):
+        shim = binDir / command
+        shim.write_text(
+            "#!/bin/bash\n"
+            + f'{_STATE_DIR_VARIABLE}="{stateDir}" PYTHONPATH="{pythonPath}${{PYTHONPATH:+:$PYTHONPATH}}" '
+            + f'exec "{sys.executable}" -m lumifit.fakeslurm {command} "$@"\n'
+        )
+        shim.chmod(0o755)
+
+
+def readCallLog(stateDir: Path) -> List[Tuple[str, float]]:
+    """
+    Returns (command, duration in seconds) of every shim call so far.
+    """
+    logFile = stateDir / "calls.log"
+    if not logFile.exists():
+        return []
+    calls = []
+    with open(logFile, "r") as f:
+        for line in f:
+            command, duration = line.split()
+            calls.append((command, float(duration)))
+    return calls
+
+
+def parseArrayString(arrayString: str) -> List[int]:
+    """
+    Parses sbatch --array values like 1-3,5,7-11:2%10
+    """
+    # the throttle doesn't matter to us, there is no capacity limit
+    arrayString = arrayString.split("%")[0]
+    indices: List[int] = []
+    for part in arrayString.split(","):
+        match = re.fullmatch(r"(\d+)(?:-(\d+)(?::(\d+))?)?", part.strip())
+        if match is None:
+            raise ValueError(f"invalid array string {arrayString}")
+        start = int(match.group(1))
+        end = int(match.group(2)) if match.group(2) else start
+        step = int(match.group(3)) if match.group(3) else 1
+        indices.extend(range(start, end + 1, step))
+    return sorted(set(indices))
+
+
+def _compressIndices(indices: List[int]) -> str:
+    ranges: List[List[int]] = []
+    for index in indices:
+        if ranges and index == ranges[-1][1] + 1:
+            ranges[-1][1] = index
+        else:
+            ranges.append([index, index])
+    return ",".join(str(start) if start == end else f"{start}-{end}" for start, end in ranges)
+
+
+def _parseExports(exportString: str) -> Dict[str, str]:
+    exports = {}
+    for item in exportString.split(","):
+        if "=" in item:
+            name, value = item.split("=", 1)
+            exports[name] = value
+    return exports
+
+
+class FakeSlurm:
+    def __init__(self, stateDir: Path) -> None:
+        self.stateDir = stateDir
+        self.jobDir = stateDir / "jobs"
+        with open(stateDir / "config.json", "r") as f:
+            self.config: Dict[str, float] = json.load(f)
+        self.__jobCache: Dict[int, Optional[Dict[str, Any]]] = {}
+
+    # ---------------------------------------------------------------- state
+
+    def __nextJobID(self) -> int:
+        with open(self.stateDir / "next_job_id", "a+") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            f.seek(0)
+            content = f.read().strip()
+            jobID = int(content) if content else 1000
+            f.seek(0)
+            f.truncate()
+            f.write(str(jobID + 1))
+        return jobID
+
+    def __writeJob(self, job: Dict[str, Any]) -> None:
+        temporaryFile = self.jobDir / f".{job['id']}.json"
+        with open(temporaryFile, "w") as f:
+            json.dump(job, f)
+        # rename is atomic, so readers never see half a file
+        temporaryFile.rename(self.jobDir / f"{job['id']}.json")
+
+    def loadJob(self, jobID: int) -> Optional[Dict[str, Any]]:
+        if jobID not in self.__jobCache:
+            try:
+                with open(self.jobDir / f"{jobID}.json", "r") as f:
+                    self.__jobCache[jobID] = json.load(f)
+            except FileNotFoundError:
+                self.__jobCache[jobID] = None
+        return self.__jobCache[jobID]
+
+    def allJobs(self) -> List[Dict[str, Any]]:
+        jobs = []
+        for jobFile in self.jobDir.glob("[0-9]*.json"):
+            job = self.loadJob(int(jobFile.stem))
+            if job is not None:
+                jobs.append(job)
+        return sorted(jobs, key=lambda job: job["id"])
+
+    def startTime(self, job: Dict[str, Any]) -> Optional[float]:
+        """
+        When the job starts (or started), or None if that depends on jobs that aren't done yet.
+        Dependencies are resolved on the fly, so there is no daemon that has to update anything.
+        """
+        start = job["submit_time"] + job["queue_delay"]
+        for dependency in job["dependencies"]:
+            dependencyJob = self.loadJob(dependency)
+            if dependencyJob is None:
+                continue
+            dependencyEnd = self.endTime(dependencyJob)
+            if dependencyEnd is None:
+                return None
+            start = max(start, dependencyEnd)
+        return start
+
+    def endTime(self, job: Dict[str, Any]) -> Optional[float]:
+        start = self.startTime(job)
+        if start is None:
+            return None
+        return start + job["run_time"]
+
+    def state(self, job: Dict[str, Any], now: float) -> str:
+        start = self.startTime(job)
+        if start is None or now < start:
+            return "PENDING"
+        if now < start + job["run_time"]:
+            return "RUNNING"
+        return "COMPLETED"
+
+    # ---------------------------------------------------------------- commands
+
+    def sbatch(self, argv: List[str]) -> int:
+        parser = argparse.ArgumentParser(prog="sbatch", add_help=False)
+        parser.add_argument("--parsable", action="store_true")
+        parser.add_argument("-A", "--account")
+        parser.add_argument("-p", "--partition")
+        parser.add_argument("--constraint")
+        parser.add_argument("-a", "--array")
+        parser.add_argument("-d", "--dependency")
+        parser.add_argument("--kill-on-invalid-dep")
+        parser.add_argument("-J", "--job-name", default="sbatch")
+        parser.add_argument("-N", "--nodes", type=int, default=1)
+        parser.add_argument("-n", "--ntasks", type=int, default=1)
+        parser.add_argument("-c", "--cpus-per-task", type=int, default=1)
+        parser.add_argument("--mem-per-cpu")
+        parser.add_argument("-t", "--time")
+        parser.add_argument("-o", "--output")
+        parser.add_argument("--export", default="ALL")
+        parser.add_argument("script", nargs="?")
+        parser.add_argument("script_args", nargs=argparse.REMAINDER)
+        args, _ = parser.parse_known_args(argv)
+
+        if args.script is None:
+            print("sbatch: error: no batch script given", file=sys.stderr)
+            return 1
+
+        dependencies: List[int] = []
+        dependencyType = ""
+        if args.dependency:
+            # only the simple form type:id:id that SlurmJobHandler uses
+            dependencyType, _, ids = args.dependency.partition(":")
+            try:
+                dependencies = [int(jobID) for jobID in ids.split(":")]
+            except ValueError:
+                print(f"sbatch: error: invalid dependency {args.dependency}", file=sys.stderr)
+                return 1
+            if any(self.loadJob(jobID) is None for jobID in dependencies):
+                print("sbatch: error: Batch job submission failed: Job dependency problem", file=sys.stderr)
+                return 1
+
+        try:
+            arrayIndices = parseArrayString(args.array) if args.array else []
+        except ValueError as e:
+            print(f"sbatch: error: {e}", file=sys.stderr)
+            return 1
+
+        exports = _parseExports(args.export)
+
+        jobID = self.__nextJobID()
+        job = {
+            "id": jobID,
+            "name": args.job_name,
+            "partition": args.partition,
+            "array_indices": arrayIndices,
+            "cpus": args.cpus_per_task * args.nodes,
+            "dependencies": dependencies,
+            "dependency_type": dependencyType,
+            "submit_time": time.time(),
+            "queue_delay": self.config["queue_delay_in_seconds"],
+            "run_time": float(exports.get("FAKE_SLURM_RUN_TIME", self.config["run_time_in_seconds"])),
+            "output": args.output,
+            "command": " ".join([args.script] + args.script_args),
+        }
+        self.__writeJob(job)
+
+        if args.parsable:
+            print(jobID)
+        else:
+            print(f"Submitted batch job {jobID}")
+        return 0
+
+    def __tasks(self, job: Dict[str, Any]) -> List[Optional[int]]:
+        return job["array_indices"] if job["array_indices"] else [None]
+
+    def squeue(self, argv: List[str]) -> int:
+        parser = argparse.ArgumentParser(prog="squeue", add_help=False)
+        parser.add_argument("-u", "--user")
+        parser.add_argument("-h", "--noheader", action="store_true")
+        parser.add_argument("-r", "--array", action="store_true")
+        parser.add_argument("-o", "--format", default="%i %j %t")
+        parser.add_argument("-t", "--state", "--states")
+        parser.add_argument("-j", "--job", "--jobs")
+        args, _ = parser.parse_known_args(argv)
+
+        now = time.time()
+        wantedStates = None
+        if args.state:
+            wantedStates = {state.strip().upper() for state in args.state.split(",")}
+        wantedJobs = None
+        if args.job:
+            wantedJobs = {int(jobID) for jobID in args.job.split(",")}
+
+        fields = re.findall(r"%\.?\d*([a-zA-Z])", args.format)
+        headers = {"i": "JOBID", "A": "JOBID", "F": "ARRAY_JOB_ID", "K": "ARRAY_TASK_ID", "a": "ARRAY_TASK_ID", "T": "STATE", "t": "ST", "C": "CPUS", "j": "NAME", "P": "PARTITION"}
+
+        lines = []
+        if not args.noheader:
+            lines.append(" ".join(headers.get(field, field) for field in fields))
+
+        for job in self.allJobs():
+            if wantedJobs is not None and job["id"] not in wantedJobs:
+                continue
+            state = self.state(job, now)
+            # finished jobs disappear from squeue, but sacct still knows them
+            if state == "COMPLETED":
+                continue
+            if wantedStates is not None and state not in wantedStates and _SHORT_STATES[state] not in wantedStates:
+                continue
+
+            tasks = self.__tasks(job)
+            # without -r, pending array tasks show up as one line, just like in slurm
+            if state == "PENDING" and not args.array and job["array_indices"]:
+                taskString = f"[{_compressIndices(tasks)}]" if len(tasks) > 1 else str(tasks[0])
+                lines.append(self.__formatLine(fields, job, taskString, state))
+                continue
+            for task in tasks:
+                lines.append(self.__formatLine(fields, job, "N/A" if task is None else str(task), state))
+
+        if lines:
+            print("\n".join(lines))
+        return 0
+
+    def __formatLine(self, fields: List[str], job: Dict[str, Any], task: str, state: str) -> str:
+        values = {
+            "i": str(job["id"]) if task == "N/A" else f"{job['id']}_{task}",
+            "A": str(job["id"]),
+            "F": str(job["id"]),
+            "K": task,
+            "a": task,
+            "T": state,
+            "t": _SHORT_STATES[state],
+            "C": str(job["cpus"]),
+            "j": job["name"],
+            "P": str(job["partition"]),
+        }
+        return " ".join(values.get(field, "") for field in fields)
+
+    def sacct(self, argv: List[str]) -> int:
+        parser = argparse.ArgumentParser(prog="sacct", add_help=False)
+        parser.add_argument("-j", "--jobs")
+        parser.add_argument("-n", "--noheader", action="store_true")
+        parser.add_argument("-P", "--parsable2", action="store_true")
+        parser.add_argument("-o", "--format", default="JobID,JobName,State")
+        args, _ = parser.parse_known_args(argv)
+
+        now = time.time()
+        fields = [field.split("%")[0].strip() for field in args.format.split(",")]
+        separator = "|" if args.parsable2 else " "
+
+        wantedJobs = None
+        if args.jobs:
+            wantedJobs = {int(jobID.split("_")[0]) for jobID in args.jobs.split(",")}
+
+        lines = []
+        if not args.noheader:
+            lines.append(separator.join(fields))
+        for job in self.allJobs():
+            if wantedJobs is not None and job["id"] not in wantedJobs:
+                continue
+            state = self.state(job, now)
+            for task in self.__tasks(job):
+                values = {
+                    "jobid": str(job["id"]) if task is None else f"{job['id']}_{task}",
+                    "jobname": job["name"],
+                    "state": state,
+                    "partition": str(job["partition"]),
+                    "alloccpus": str(job["cpus"]),
+                }
+                lines.append(separator.join(values.get(field.lower(), "") for field in fields))
+
+        if lines:
+            print("\n".join(lines))
+        return 0
+
+
+def main(argv: List[str]) -> int:
+    if len(argv) < 1 or argv[0] not in ("sbatch", "squeue", "sacct"):
+        print("usage: python -m lumifit.fakeslurm {sbatch,squeue,sacct} [args]", file=sys.stderr)
+        return 2
+
+    stateDir = os.environ.get(_STATE_DIR_VARIABLE)
+    if stateDir is None:
+        print(f"{_STATE_DIR_VARIABLE} is not set, use installFakeSlurm() to create the shims!", file=sys.stderr)
+        return 2
+
+    start = time.perf_counter()
+    fakeSlurm = FakeSlurm(Path(stateDir))
+    returnCode = getattr(fakeSlurm, argv[0])(argv[1:])
+
+    # short appends with O_APPEND don't interleave, so no lock needed
+    with open(Path(stateDir) / "calls.log", "a") as f:
+        f.write(f"{argv[0]} {time.perf_counter() - start:.6f}\n")
+    return returnCode
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
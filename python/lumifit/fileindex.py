@@ -0,0 +1,198 @@
+"""
+Cached directory listings with file sizes and mtimes.
+
+The state checks of determineLuminosity.py ask the same questions about the same (Lustre) directories
+over and over: how many good track files are there, is this file there, are there lmd data objects...
+Every glob and every stat is a metadata request, and those are the most expensive I/O on Lustre.
+
+The DirectoryIndex reads a directory with one os.scandir and keeps names, sizes and mtimes. The listing
+is reused as long as the directory mtime doesn't change (creating, deleting or renaming a file changes it).
+Writing to a file doesn't change the directory mtime though, so only settled things are trusted:
+
+- a directory that was modified less than settle_time_in_seconds before it was read is read again by every
+  glob (or entries), and stat only uses settled listings: otherwise it stats just that one path instead of
+  reading the whole directory, which is what polling for job outputs does over and over
+- a file that was modified less than settle_time_in_seconds before it was read is stat'ed again every time
+
+Files that are rewritten in place after they settled aren't noticed until the directory changes or the
+index is cleared. Nothing in the lumi fit chain does that, outputs are written once (or copied from the node).
+"""
+
+import fnmatch
+import os
+import threading
+import time
+from pathlib import Path
+from stat import S_ISDIR, S_ISLNK
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+from attrs import define
+
+
+@define(frozen=True)
+class FileEntry:
+    path: Path
+    size: int
+    mtime: float
+    isDir: bool
+    isSymlink: bool = False
+
+
+@define
+class _Listing:
+    directoryMtime: float
+    scanTime: float
+    entries: Dict[str, FileEntry]
+
+
+class DirectoryIndex:
+    def __init__(self, settle_time_in_seconds: float = 60) -> None:
+        self.settle_time_in_seconds = settle_time_in_seconds
+        self.__listings: Dict[Path, _Listing] = {}
+        self.__lock = threading.Lock()
+
+    def clear(self) -> None:
+        with self.__lock:
+            self.__listings.clear()
+
+    def invalidate(self, directory: Path) -> None:
+        with self.__lock:
+            self.__listings.pop(Path(directory), None)
+
+    def __isSettled(self, mtime: float, scanTime: float) -> bool:
+        return scanTime - mtime > self.settle_time_in_seconds
+
+    def __scan(self, directory: Path, directoryMtime: float) -> _Listing:
+        scanTime = time.time()
+        entries: Dict[str, FileEntry] = {}
+        with os.scandir(directory) as iterator:
+            for entry in iterator:
+                try:
+                    # the file type comes with the listing, only files need a stat for their size
+                    if entry.is_dir():
+                        entries[entry.name] = FileEntry(Path(entry.path), 0, 0.0, True, entry.is_symlink())
+                    else:
+                        stat = entry.stat()
+                        entries[entry.name] = FileEntry(Path(entry.path), stat.st_size, stat.st_mtime, False, entry.is_symlink())
+                except FileNotFoundError:
+                    # deleted (or a dangling symlink) while we were looking
+                    continue
+        return _Listing(directoryMtime, scanTime, entries)
+
+    def __settledListing(self, directory: Path) -> Optional[_Listing]:
+        """
+        The cached listing of this directory, if it's still valid and settled. Never reads the directory.
+        """
+        with self.__lock:
+            listing = self.__listings.get(directory)
+        if listing is None:
+            return None
+        try:
+            directoryMtime = directory.stat().st_mtime
+        except (FileNotFoundError, NotADirectoryError):
+            self.invalidate(directory)
+            return None
+        if listing.directoryMtime == directoryMtime and self.__isSettled(directoryMtime, listing.scanTime):
+            return listing
+        return None
+
+    def __listing(self, directory: Path) -> Optional[_Listing]:
+        try:
+            directoryMtime = directory.stat().st_mtime
+        except (FileNotFoundError, NotADirectoryError):
+            self.invalidate(directory)
+            return None
+
+        with self.__lock:
+            listing = self.__listings.get(directory)
+        if listing is not None and listing.directoryMtime == directoryMtime and self.__isSettled(directoryMtime, listing.scanTime):
+            return listing
+
+        try:
+            listing = self.__scan(directory, directoryMtime)
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+        with self.__lock:
+            self.__listings[directory] = listing
+        return listing
+
+    def __fresh(self, listing: _Listing, entry: FileEntry) -> Optional[FileEntry]:
+        """
+        The entry, stat'ed again if the file was still being written when the directory was read.
+        """
+        if entry.isDir or self.__isSettled(entry.mtime, listing.scanTime):
+            return entry
+        try:
+            stat = entry.path.stat()
+        except FileNotFoundError:
+            return None
+        return FileEntry(entry.path, stat.st_size, stat.st_mtime, False, entry.isSymlink)
+
+    def entries(self, directory: Path) -> List[FileEntry]:
+        """
+        All files and subdirectories directly in this directory. Empty if it doesn't exist.
+        """
+        listing = self.__listing(Path(directory))
+        if listing is None:
+            return []
+        fresh = [self.__fresh(listing, entry) for entry in listing.entries.values()]
+        return [entry for entry in fresh if entry is not None]
+
+    def glob(self, directory: Path, glob_pattern: str) -> List[FileEntry]:
+        """
+        Like directory.glob(glob_pattern), for patterns without a directory part.
+        """
+        directory = Path(directory)
+        if "/" in glob_pattern:
+            # not worth indexing, nobody uses that for state checks
+            entries = []
+            for path in directory.glob(glob_pattern):
+                stat = path.stat()
+                entries.append(FileEntry(path, stat.st_size, stat.st_mtime, path.is_dir()))
+            return entries
+
+        listing = self.__listing(directory)
+        if listing is None:
+            return []
+        fresh = [self.__fresh(listing, entry) for name, entry in listing.entries.items() if fnmatch.fnmatchcase(name, glob_pattern)]
+        return [entry for entry in fresh if entry is not None]
+
+    def stat(self, path: Union[str, Path]) -> Optional[FileEntry]:
+        """
+        The entry of this file or directory, None if it doesn't exist.
+        From the listing if the directory is settled, otherwise with a stat of this path only.
+        """
+        path = Path(path)
+        listing = self.__settledListing(path.parent)
+        if listing is not None:
+            if path.name not in listing.entries:
+                return None
+            return self.__fresh(listing, listing.entries[path.name])
+
+        try:
+            # one lstat for plain files, symlinks (the linked artifacts) need a second stat for their target
+            stat = os.lstat(path)
+            isSymlink = S_ISLNK(stat.st_mode)
+            if isSymlink:
+                stat = os.stat(path)
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+        if S_ISDIR(stat.st_mode):
+            return FileEntry(path, 0, 0.0, True, isSymlink)
+        return FileEntry(path, stat.st_size, stat.st_mtime, False, isSymlink)
+
+    def walk(self, directory: Path) -> Iterator[Tuple[Path, List[FileEntry]]]:
+        """
+        Every directory below this one (not this one itself, like glob("**/*")), with its entries.
+        Symlinks to directories are listed, but not followed.
+        """
+        for entry in self.entries(directory):
+            if entry.isDir:
+                subEntries = self.entries(entry.path)
+                yield entry.path, subEntries
+                if not entry.isSymlink:
+                    yield from self.walk(entry.path)
+
+
+# one index for the whole process. the Orchestrator clears it when it starts
+directoryIndex = DirectoryIndex()
@@ -1,11 +1,14 @@
+import fnmatch
 import json
 import os
 import re
 from argparse import ArgumentParser
 from pathlib import Path
-from typing import Any, List, Optional
+from typing import Any, List, Optional, Union
 
 from dotenv import load_dotenv
+from lumifit.fileindex import directoryIndex
+from lumifit.manifest import isRecordValid, readManifest
 
 
 def envPath(env_var: str) -> Path:
@@ -51,15 +54,28 @@ def getGoodFiles(
     directory: Path,
     glob_pattern: str,
     min_filesize_in_bytes: int = 2000,
+    use_manifest: bool = False,
 ) -> list:
-    found_files = directory.glob(glob_pattern)
     good_files: List[Path] = []
     bad_files: List[Path] = []
-    for file in found_files:
-        if isFilePresentAndValid(file, min_filesize_in_bytes):
-            good_files.append(file)
-        else:
-            bad_files.append(file)
+    # with use_manifest, only the files the jobs reported as done count (see lumifit.manifest).
+    # directories without a manifest are still listed
+    records = readManifest(directory) if use_manifest else None
+    if records is not None:
+        for name, record in sorted(records.items()):
+            if not fnmatch.fnmatchcase(name, glob_pattern):
+                continue
+            if isRecordValid(record, min_filesize_in_bytes):
+                good_files.append(record.path)
+            else:
+                bad_files.append(record.path)
+    else:
+        # one (cached) directory listing instead of a stat for every file, see lumifit.fileindex
+        for entry in directoryIndex.glob(directory, glob_pattern):
+            if not entry.isDir and entry.size > min_filesize_in_bytes:
+                good_files.append(entry.path)
+            else:
+                bad_files.append(entry.path)
 
     num_sim_files = len(good_files) + len(bad_files)
 
@@ -72,9 +88,30 @@ def getGoodFiles(
     return [good_files, files_percentage]
 
 
-def isFilePresentAndValid(file_url: Path, minFileSize=3000) -> bool:
-    if file_url.exists():
-        if file_url.stat().st_size > minFileSize:
+def isFilePresentAndValid(file_url: Union[str, Path], minFileSize=3000) -> bool:
+    """
+    One stat of this file. This is what the job scripts use, they check every file only once.
+    """
+    try:
+        size = os.stat(file_url).st_size
+    except (FileNotFoundError, NotADirectoryError):
+        # print(f"{file_url} does not exist!")
+        return False
+    if size > minFileSize:
+        # print(f"{file_url} exists and is larger than 3kb!")
+        return True
+    # print("file is too small.")
+    return False
+
+
+def isIndexedFilePresentAndValid(file_url: Union[str, Path], minFileSize=3000) -> bool:
+    """
+    Same as isFilePresentAndValid, but answered from the directory listing if the directory is
+    settled (see lumifit.fileindex), for the state checks that ask about the same files over and over.
+    """
+    entry = directoryIndex.stat(file_url)
+    if entry is not None:
+        if entry.size > minFileSize:
             # print(f"{file_url} exists and is larger than 3kb!")
             return True
         # print("file is too small.")
@@ -145,10 +182,8 @@ class DirectorySearcher:
         else:
             file_patterns = [glob_patterns]
 
-        for dirpath in path.glob("**/*"):
-            if not dirpath.is_dir():
-                continue
-
+        # one walk with a listing per directory, instead of globbing every directory again
+        for dirpath, entries in directoryIndex.walk(path):
             if dirpath.name == "mc_data" or dirpath.name == "Pairs":
                 continue
 
@@ -162,12 +197,12 @@ class DirectorySearcher:
                     break
             if is_good:
                 found_files = False
-                for filename in dirpath.glob("*"):
-                    if not filename.is_file():
+                for entry in entries:
+                    if entry.isDir:
                         continue
 
                     for pattern in file_patterns:
-                        if pattern in filename.name:
+                        if pattern in entry.path.name:
                             found_files = True
                             break
 
@@ -0,0 +1,215 @@
+"""
+Quick-look angular distributions with numpy, without createLmdFitData.
+
+The histograms follow what PndLmdDataFacade and PndLmdDataReader fill from the data config:
+
+- a: mc_th (all primary MC tracks), mc_acc (the reconstructed ones, MC values) and reco
+  (the reconstructed tracks, reco values) in the general_data dimensions
+- e: acceptance_all and acceptance_reco, the MC values of all primary tracks and of the
+  reconstructed ones in the efficiency binning. The acceptance is their ratio
+- r: resolution, reco minus MC of the reconstructed tracks in the resolution binning
+
+The dimension and track param types always come from general_data, like in the facade.
+Only 2D histograms of THETA, PHI, THETA_X and THETA_Y are supported, and the selections and
+the automatic resolution ranges are ignored, this is for QA and not for the fit.
+
+The histograms are saved as .npz with their bin edges, and histograms with the same edges
+can simply be added, so the bunches can be histogrammed separately and merged afterwards.
+"""
+
+import os
+from pathlib import Path
+from typing import Dict, Iterable, List
+
+import numpy as np
+from attrs import define
+
+# which columns of the track chunks (see lumifit.trackCache) hold the angles of a track type and param type
+ANGLE_COLUMNS = {
+    ("MC", "IP"): "mc",
+    ("MC", "LMD"): "mc_lmd",
+    ("RECO", "IP"): "ip",
+    ("RECO", "LMD"): "lmd",
+}
+
+
+@define(frozen=True)
+class Axis:
+    dimension_type: str
+    track_param_type: str
+    bins: int
+    range_low: float
+    range_high: float
+
+    def edges(self) -> np.ndarray:
+        return np.linspace(self.range_low, self.range_high, self.bins + 1)
+
+
+@define(frozen=True)
+class HistogramSpec:
+    name: str
+    # MC, RECO or DIFF_RECO_MC
+    track_type: str
+    primary: Axis
+    secondary: Axis
+    reconstructed_only: bool = False
+    primaries_only: bool = False
+
+
+@define
+class Histogram:
+    counts: np.ndarray
+    x_edges: np.ndarray
+    y_edges: np.ndarray
+
+    def add(self, other: "Histogram") -> None:
+        if not (np.array_equal(self.x_edges, other.x_edges) and np.array_equal(self.y_edges, other.y_edges)):
+            raise ValueError("Can't add histograms with different binnings!")
+        self.counts = self.counts + other.counts
+
+
+def _axis(dimension: dict, typeDimension: dict) -> Axis:
+    if not dimension.get("is_active", True):
+        raise ValueError("Only 2D histograms are supported, but a dimension in the data config is not active!")
+    return Axis(
+        typeDimension.get("dimension_type", "THETA"),
+        typeDimension.get("track_param_type", "IP"),
+        int(dimension["bins"]),
+        float(dimension["range_low"]),
+        float(dimension["range_high"]),
+    )
+
+
+def specsFromConfig(config: dict, data_types: str) -> List[HistogramSpec]:
+    """
+    The histograms for these data types (a, e, r or combinations like er) from the data config.
+    """
+    generalPrimary = config["general_data"]["primary_dimension"]
+    generalSecondary = config["general_data"]["secondary_dimension"]
+    specs: List[HistogramSpec] = []
+
+    if "a" in data_types:
+        primary = _axis(generalPrimary, generalPrimary)
+        secondary = _axis(generalSecondary, generalSecondary)
+        specs.append(HistogramSpec("mc_th", "MC", primary, secondary, primaries_only=True))
+        specs.append(HistogramSpec("mc_acc", "MC", primary, secondary, reconstructed_only=True, primaries_only=True))
+        specs.append(HistogramSpec("reco", "RECO", primary, secondary, reconstructed_only=True))
+
+    if "e" in data_types:
+        primary = _axis(config["efficiency"]["primary_dimension"], generalPrimary)
+        secondary = _axis(config["efficiency"]["secondary_dimension"], generalSecondary)
+        specs.append(HistogramSpec("acceptance_all", "MC", primary, secondary, primaries_only=True))
+        specs.append(HistogramSpec("acceptance_reco", "MC", primary, secondary, reconstructed_only=True, primaries_only=True))
+
+    if "r" in data_types:
+        primary = _axis(config["resolution"]["primary_dimension"], generalPrimary)
+        secondary = _axis(config["resolution"]["secondary_dimension"], generalSecondary)
+        specs.append(HistogramSpec("resolution", "DIFF_RECO_MC", primary, secondary, reconstructed_only=True))
+
+    return specs
+
+
+def _trackValues(chunk: Dict[str, np.ndarray], axis: Axis, track_type: str) -> np.ndarray:
+    prefix = ANGLE_COLUMNS[(track_type, axis.track_param_type)]
+    theta = chunk[f"{prefix}_theta"].astype(np.float64)
+    phi = chunk[f"{prefix}_phi"].astype(np.float64)
+
+    if axis.dimension_type == "THETA":
+        return theta
+    if axis.dimension_type == "PHI":
+        return phi
+    if axis.dimension_type == "THETA_X":
+        return np.tan(theta) * np.cos(phi)
+    if axis.dimension_type == "THETA_Y":
+        return np.tan(theta) * np.sin(phi)
+    raise ValueError(f"Dimension type {axis.dimension_type} is not supported for quick-look histograms!")
+
+
+def axisValues(chunk: Dict[str, np.ndarray], axis: Axis, track_type: str) -> np.ndarray:
+    if track_type != "DIFF_RECO_MC":
+        return _trackValues(chunk, axis, track_type)
+
+    difference = _trackValues(chunk, axis, "RECO") - _trackValues(chunk, axis, "MC")
+    if axis.dimension_type == "PHI":
+        # back into [-pi, pi)
+        difference = (difference + np.pi) % (2 * np.pi) - np.pi
+    return difference
+
+
+def fill2D(x: np.ndarray, y: np.ndarray, primary: Axis, secondary: Axis) -> np.ndarray:
+    """
+    Like np.histogram2d with uniform bins, but with one bincount. Values outside the ranges
+    (and at the upper edges) are dropped, like the overflow bins of a TH2.
+    """
+    xIndex = np.floor((x - primary.range_low) * (primary.bins / (primary.range_high - primary.range_low)))
+    yIndex = np.floor((y - secondary.range_low) * (secondary.bins / (secondary.range_high - secondary.range_low)))
+    inside = (xIndex >= 0) & (xIndex < primary.bins) & (yIndex >= 0) & (yIndex < secondary.bins)
+    flatIndex = xIndex[inside].astype(np.int64) * secondary.bins + yIndex[inside].astype(np.int64)
+    return np.bincount(flatIndex, minlength=primary.bins * secondary.bins).reshape(primary.bins, secondary.bins)
+
+
+def emptyHistograms(specs: List[HistogramSpec]) -> Dict[str, Histogram]:
+    return {spec.name: Histogram(np.zeros((spec.primary.bins, spec.secondary.bins), dtype=np.int64), spec.primary.edges(), spec.secondary.edges()) for spec in specs}
+
+
+def fillHistograms(chunks: Iterable[Dict[str, np.ndarray]], specs: List[HistogramSpec]) -> Dict[str, Histogram]:
+    """
+    Fills the histograms of these specs from track chunks (see lumifit.trackCache).
+    """
+    histograms = emptyHistograms(specs)
+    for chunk in chunks:
+        reconstructed = chunk["rec_status"] >= 0
+        primary = chunk["secondary"] < 0
+        for spec in specs:
+            selected = np.ones(len(reconstructed), dtype=bool)
+            if spec.reconstructed_only:
+                selected &= reconstructed
+            if spec.primaries_only:
+                selected &= primary
+            if not np.any(selected):
+                continue
+            # only the angles are needed for the values
+            selectedTracks = {column: values[selected] for column, values in chunk.items() if column.endswith(("_theta", "_phi"))}
+            x = axisValues(selectedTracks, spec.primary, spec.track_type)
+            y = axisValues(selectedTracks, spec.secondary, spec.track_type)
+            histograms[spec.name].counts += fill2D(x, y, spec.primary, spec.secondary)
+    return histograms
+
+
+def saveHistograms(histograms: Dict[str, Histogram], path: Path) -> None:
+    """
+    Every histogram is stored as name, name_x_edges and name_y_edges. The file is renamed into
+    place when it's complete.
+    """
+    arrays: Dict[str, np.ndarray] = {}
+    for name, histogram in histograms.items():
+        arrays[name] = histogram.counts
+        arrays[f"{name}_x_edges"] = histogram.x_edges
+        arrays[f"{name}_y_edges"] = histogram.y_edges
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporary = path.parent / f".{path.name}.part"
+    with open(temporary, "wb") as f:
+        np.savez(f, **arrays)
+    os.replace(temporary, path)
+
+
+def loadHistograms(path: Path) -> Dict[str, Histogram]:
+    with np.load(path) as arrays:
+        names = [name for name in arrays.files if not name.endswith("_edges")]
+        return {name: Histogram(arrays[name], arrays[f"{name}_x_edges"], arrays[f"{name}_y_edges"]) for name in names}
+
+
+def mergeHistogramFiles(paths: List[Path], output: Path) -> Dict[str, Histogram]:
+    """
+    Adds up the histograms in these files (they must have the same binnings) and saves the sum.
+    """
+    merged: Dict[str, Histogram] = {}
+    for path in paths:
+        for name, histogram in loadHistograms(path).items():
+            if name in merged:
+                merged[name].add(histogram)
+            else:
+                merged[name] = histogram
+    saveHistograms(merged, output)
+    return merged
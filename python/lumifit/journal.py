@@ -0,0 +1,135 @@
+"""
+Crash-safe journal for determineLuminosity.py.
+
+The stage graph itself only lives in memory, but every state transition of its stages and every
+submitted job is written to an SQLite database in the experiment dir. If the process on the
+submit node dies (reboot, ssh drop...), the next run finds the jobs that were still in flight
+and waits for them instead of submitting them again.
+
+Every write is committed right away, so at most the last write is lost in a crash.
+
+Every Journal object is one run (one invocation of determineLuminosity.py), the jobs are stored
+with its run id, so that retry budgets start over with the next run.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS transitions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    task TEXT NOT NULL,
+    state TEXT NOT NULL,
+    time REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id INTEGER NOT NULL,
+    task TEXT NOT NULL,
+    state TEXT NOT NULL,
+    name TEXT NOT NULL,
+    array_indices TEXT NOT NULL,
+    submitted REAL NOT NULL,
+    finished REAL,
+    run TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_by_task ON jobs (task, finished);
+"""
+
+
+class Journal:
+    """
+    One journal per experiment dir. Tasks are identified by a string (i.e. the
+    stage name), states are stored by name, so this module doesn't need
+    to know about the stages at all.
+
+    Thread safe, all stages of an experiment share one journal.
+    """
+
+    fileName = "determineLuminosity.journal.sqlite"
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.run = uuid.uuid4().hex
+        self.__lock = threading.Lock()
+        self.__connection = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+        with self.__lock:
+            # WAL survives a crash of the writer and lets us commit often without much cost
+            self.__connection.execute("PRAGMA journal_mode=WAL")
+            self.__connection.execute("PRAGMA synchronous=NORMAL")
+            self.__connection.executescript(_SCHEMA)
+            # journals from before there were runs
+            columns = [row[1] for row in self.__connection.execute("PRAGMA table_info(jobs)").fetchall()]
+            if "run" not in columns:
+                self.__connection.execute("ALTER TABLE jobs ADD COLUMN run TEXT")
+
+    @classmethod
+    def forExperiment(cls, experimentDir: Path) -> "Journal":
+        experimentDir.mkdir(parents=True, exist_ok=True)
+        return cls(experimentDir / cls.fileName)
+
+    def close(self) -> None:
+        with self.__lock:
+            self.__connection.close()
+
+    def __execute(self, statement: str, parameters: Tuple = ()) -> List[Tuple]:
+        with self.__lock:
+            return self.__connection.execute(statement, parameters).fetchall()
+
+    def recordTransition(self, task: str, state: str) -> None:
+        self.__execute("INSERT INTO transitions (task, state, time) VALUES (?, ?, ?)", (task, state, time.time()))
+
+    def lastState(self, task: str) -> Optional[str]:
+        rows = self.__execute("SELECT state FROM transitions WHERE task = ? ORDER BY id DESC LIMIT 1", (task,))
+        return rows[0][0] if rows else None
+
+    def recordSubmission(self, task: str, state: str, jobID: int, name: str, array_indices: List[int]) -> None:
+        self.__execute(
+            "INSERT INTO jobs (job_id, task, state, name, array_indices, submitted, run) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (jobID, task, state, name, json.dumps(array_indices), time.time(), self.run),
+        )
+
+    def recordJobFinished(self, jobID: int) -> None:
+        self.__execute("UPDATE jobs SET finished = ? WHERE job_id = ? AND finished IS NULL", (time.time(), jobID))
+
+    def unfinishedJob(self, task: str) -> Optional[Tuple[int, str]]:
+        """
+        Returns job ID and task state of the last job of this task that was submitted,
+        but that we never saw finish. None if there is none.
+        """
+        rows = self.__execute("SELECT job_id, state FROM jobs WHERE task = ? AND finished IS NULL ORDER BY rowid DESC LIMIT 1", (task,))
+        return (rows[0][0], rows[0][1]) if rows else None
+
+    def abandonUnfinishedJobs(self) -> None:
+        """
+        Marks all unfinished jobs as finished. Needed if their IDs mean nothing anymore,
+        i.e. jobs of the LocalJobHandler died with the process that ran them.
+        """
+        self.__execute("UPDATE jobs SET finished = ? WHERE finished IS NULL", (time.time(),))
+
+    def attemptsPerIndex(self, task: str, state: str) -> Dict[int, int]:
+        """
+        How often each array index was submitted for this task and state in this run.
+
+        Only this run, because a new run in the same experiment dir (i.e. after outputs were deleted,
+        or after the cause of the failures was fixed) would otherwise start with no retries left.
+        """
+        attempts: Dict[int, int] = {}
+        for (array_indices,) in self.__execute("SELECT array_indices FROM jobs WHERE task = ? AND state = ? AND run = ?", (task, state, self.run)):
+            for index in json.loads(array_indices):
+                attempts[index] = attempts.get(index, 0) + 1
+        return attempts
+
+    def jobTurnarounds(self) -> Dict[str, List[float]]:
+        """
+        Seconds from submission until we saw the job finish (queue time included), by task.
+        Only jobs of this experiment that finished, for plans of later runs.
+        """
+        turnarounds: Dict[str, List[float]] = {}
+        for task, submitted, finished in self.__execute("SELECT task, submitted, finished FROM jobs WHERE finished IS NOT NULL"):
+            turnarounds.setdefault(task, []).append(finished - submitted)
+        return turnarounds
@@ -0,0 +1,234 @@
+"""
+Completion manifests, written by the jobs themselves.
+
+Every array task appends one line to manifest.jsonl in the directory it wrote its outputs to, once they
+are complete (i.e. after they were copied from the node scratch). A line holds the stage, the array
+index, the host, how long each step took, and name, size, number of entries and adler32 checksum of
+every output file. The line is written with a single write() to a file opened with O_APPEND, so tasks
+that finish at the same time don't mix up their lines.
+
+The orchestrator then reads one file per directory instead of globbing and stat'ing thousands of
+files, and only the part that was appended since the last look. The last line about a file wins
+(a task that was run again just writes a new line).
+
+Outputs that are deleted by hand aren't noticed, so delete the manifest.jsonl along with them.
+
+Can be used from bash scripts as well:
+
+    python3 -m lumifit.manifest --stage lmdData --task 3 --seconds 120 lmd_data_3.root
+"""
+
+import argparse
+import json
+import os
+import socket
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from attrs import define, field
+
+MANIFEST_FILE_NAME = "manifest.jsonl"
+
+
+@define(frozen=True)
+class OutputRecord:
+    path: Path
+    size: int
+    entries: Optional[int]
+    adler32: str
+    stage: str
+    task: Optional[int]
+    finished: float
+    timings: Dict[str, float] = field(factory=dict)
+
+
+@define
+class _Manifest:
+    inode: int
+    offset: int
+    records: Dict[str, OutputRecord]
+
+
+_manifests: Dict[Path, _Manifest] = {}
+_manifestsLock = threading.Lock()
+
+
+class StepTimer:
+    """
+    Call lap("step") after each step, the time since the previous lap is booked on that step.
+    """
+
+    def __init__(self) -> None:
+        self.timings: Dict[str, float] = {}
+        self.__last = time.time()
+
+    def lap(self, step: str) -> None:
+        now = time.time()
+        self.timings[step] = self.timings.get(step, 0.0) + now - self.__last
+        self.__last = now
+
+
+def adler32(path: Path) -> str:
+    checksum = 1
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            checksum = zlib.adler32(chunk, checksum)
+    return f"{checksum:08x}"
+
+
+def numberOfEntries(path: Path, treeName: str) -> Optional[int]:
+    """
+    The entries of that tree, None if uproot isn't there or the file can't be read.
+    """
+    try:
+        import uproot
+
+        with uproot.open(path) as opened:
+            return int(opened[treeName].num_entries)
+    except Exception as e:
+        print(f"WARNING! Can't count the entries of {treeName} in {path}: {e}")
+        return None
+
+
+def describeOutput(path: Path, treeName: Optional[str] = None) -> dict:
+    return {
+        "name": path.name,
+        "size": path.stat().st_size,
+        "entries": numberOfEntries(path, treeName) if treeName is not None else None,
+        "adler32": adler32(path),
+    }
+
+
+def appendRecord(directory: Path, stage: str, outputs: List[dict], task: Optional[int] = None, timings: Optional[Dict[str, float]] = None) -> None:
+    record = {
+        "stage": stage,
+        "task": task,
+        "host": socket.gethostname(),
+        "finished": time.time(),
+        "timings": timings or {},
+        "outputs": outputs,
+    }
+    line = (json.dumps(record) + "\n").encode()
+    fd = os.open(directory / MANIFEST_FILE_NAME, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o664)
+    try:
+        # one write, so lines of tasks that finish at the same time don't interleave
+        os.write(fd, line)
+    finally:
+        os.close(fd)
+
+
+def recordOutputs(
+    outputs: List[Path],
+    stage: str,
+    task: Optional[int] = None,
+    timings: Optional[Dict[str, float]] = None,
+    treeName: Optional[str] = None,
+) -> None:
+    """
+    Appends the outputs of this task to the manifests of their directories. Outputs that
+    don't exist are left out. Never raises, a missing manifest must not fail a job.
+    """
+    byDirectory: Dict[Path, List[dict]] = {}
+    for output in outputs:
+        if not output.is_file():
+            print(f"WARNING! {output} doesn't exist, it's not added to the manifest.")
+            continue
+        try:
+            byDirectory.setdefault(output.parent, []).append(describeOutput(output, treeName))
+        except OSError as e:
+            print(f"WARNING! Can't describe {output}: {e}")
+
+    for directory, described in byDirectory.items():
+        try:
+            appendRecord(directory, stage, described, task, timings)
+        except OSError as e:
+            print(f"WARNING! Can't write the manifest in {directory}: {e}")
+
+
+def readManifest(directory: Path) -> Optional[Dict[str, OutputRecord]]:
+    """
+    The latest record of every output in this directory by file name, None if there is no manifest.
+    """
+    path = Path(directory) / MANIFEST_FILE_NAME
+    try:
+        stat = path.stat()
+    except (FileNotFoundError, NotADirectoryError):
+        with _manifestsLock:
+            _manifests.pop(path, None)
+        return None
+
+    with _manifestsLock:
+        manifest = _manifests.get(path)
+        if manifest is None or manifest.inode != stat.st_ino or stat.st_size < manifest.offset:
+            # new, or replaced by a different one
+            manifest = _Manifest(stat.st_ino, 0, {})
+
+        if stat.st_size > manifest.offset:
+            with open(path, "rb") as f:
+                f.seek(manifest.offset)
+                appended = f.read()
+            # only whole lines, a task may be writing the last one right now
+            end = appended.rfind(b"\n") + 1
+            for line in appended[:end].splitlines():
+                try:
+                    record = json.loads(line)
+                    for output in record["outputs"]:
+                        manifest.records[output["name"]] = OutputRecord(
+                            path=path.parent / output["name"],
+                            size=output["size"],
+                            entries=output.get("entries"),
+                            adler32=output.get("adler32", ""),
+                            stage=record.get("stage", ""),
+                            task=record.get("task"),
+                            finished=record.get("finished", 0.0),
+                            timings=record.get("timings", {}),
+                        )
+                except (ValueError, KeyError, TypeError) as e:
+                    print(f"WARNING! Skipping a broken line in {path}: {e}")
+            manifest.offset += end
+
+        _manifests[path] = manifest
+        return dict(manifest.records)
+
+
+def isRecordValid(record: Optional[OutputRecord], min_filesize_in_bytes: int = 3000) -> bool:
+    """
+    Like isFilePresentAndValid, but for a manifest record. Files without entries aren't valid either.
+    """
+    return record is not None and record.size > min_filesize_in_bytes and record.entries != 0
+
+
+def copyRecords(source: Path, target: Path, names: List[str]) -> None:
+    """
+    For outputs that are linked from source to target: the target manifest gets their records as well.
+    """
+    records = readManifest(source)
+    if not records:
+        return
+    outputs = [{"name": name, "size": records[name].size, "entries": records[name].entries, "adler32": records[name].adler32} for name in names if name in records]
+    if outputs:
+        try:
+            appendRecord(target, "linked", outputs)
+        except OSError as e:
+            print(f"WARNING! Can't write the manifest in {target}: {e}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Adds output files to the manifest.jsonl of their directory.")
+    parser.add_argument("outputs", type=Path, nargs="+", help="the output files of this task")
+    parser.add_argument("--stage", type=str, required=True, help="i.e. lmdData")
+    parser.add_argument("--task", type=int, default=None, help="the array index of this task")
+    parser.add_argument("--seconds", type=float, default=None, help="how long the stage took")
+    parser.add_argument("--tree", type=str, default=None, help="count the entries of this tree")
+    cliArgs = parser.parse_args()
+
+    recordOutputs(
+        cliArgs.outputs,
+        cliArgs.stage,
+        task=cliArgs.task,
+        timings={cliArgs.stage: cliArgs.seconds} if cliArgs.seconds is not None else None,
+        treeName=cliArgs.tree,
+    )
@@ -0,0 +1,139 @@
+"""
+Asyncio based orchestration for determineLuminosity.py.
+
+All experiments and their tasks are coroutines on one event loop. Waiting for a cluster
+job doesn't take a thread: the ClusterJobManager and the job handlers already hand out
+concurrent Futures (for the submission and for the job leaving the queue), and those
+are awaited here. Only local steps (file checks, bunching, merging...) run in a thread
+pool, and that pool has a fixed size. So hundreds of experiments can be supervised by
+one process without one sleeping thread per task.
+"""
+
+import asyncio
+import functools
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Iterable, List, Optional, TypeVar
+
+from lumifit.cluster import ClusterJobManager, Job
+from lumifit.fileindex import directoryIndex
+
+T = TypeVar("T")
+
+
+def _copyResult(source: "Future[T]", destination: "asyncio.Future[T]") -> None:
+    if destination.cancelled():
+        return
+    exception = source.exception()
+    if exception is not None:
+        destination.set_exception(exception)
+    else:
+        destination.set_result(source.result())
+
+
+class Orchestrator:
+    """
+    Runs coroutines on one event loop, with explicit limits:
+
+    - max_local_steps: how many blocking local steps run at the same time (thread pool size)
+    - max_concurrent: how many awaitables of one gather() call progress at the same time
+      (i.e. experiments). None means no limit.
+
+    In sequential mode (for debugging), gather() awaits one awaitable after the other,
+    so together with max_local_steps=1 nothing runs concurrently.
+    """
+
+    def __init__(self, job_manager: ClusterJobManager, max_local_steps: int = 8, sequential: bool = False) -> None:
+        self.__job_manager = job_manager
+        self.__executor = ThreadPoolExecutor(max_workers=max_local_steps, thread_name_prefix="Orchestrator-local")
+        self.sequential = sequential
+
+    async def __await(self, future: "Future[T]") -> T:
+        """
+        Awaits a concurrent Future without blocking a thread.
+
+        Unlike asyncio.wrap_future, cancelling the waiter doesn't cancel the Future,
+        which may be shared (the job watcher hands out one Future per job).
+        """
+        loop = asyncio.get_running_loop()
+        waiter: "asyncio.Future[T]" = loop.create_future()
+
+        def resolve(done: "Future[T]") -> None:
+            try:
+                loop.call_soon_threadsafe(_copyResult, done, waiter)
+            except RuntimeError:
+                # the loop is already closed, nobody is waiting anymore
+                pass
+
+        future.add_done_callback(resolve)
+        return await waiter
+
+    async def runLocal(self, function: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """
+        Runs a blocking function in the thread pool.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.__executor, functools.partial(function, *args, **kwargs))
+
+    async def submit(self, job: Job) -> int:
+        """
+        Appends the job to the submission queue of the job manager and returns its ID
+        once it is submitted.
+        """
+        return await self.__await(self.__job_manager.append(job))
+
+    async def waitForJob(self, jobID: int) -> None:
+        """
+        Returns once the job (with all its array tasks) has left the queue.
+        """
+        await self.__await(self.__job_manager.watch(jobID))
+
+    async def gather(self, awaitables: Iterable[Awaitable[T]], max_concurrent: Optional[int] = None) -> List[T]:
+        """
+        Awaits all awaitables and returns their results in order.
+
+        Like the thread pools before, all of them are run to the end even if one fails,
+        and the first exception is raised afterwards.
+        """
+        awaitables = list(awaitables)
+
+        if self.sequential:
+            results: List[T] = []
+            for index, awaitable in enumerate(awaitables):
+                try:
+                    results.append(await awaitable)
+                except BaseException:
+                    # don't leave never-awaited coroutines behind
+                    for remaining in awaitables[index + 1 :]:
+                        if asyncio.iscoroutine(remaining):
+                            remaining.close()
+                    raise
+            return results
+
+        semaphore = asyncio.Semaphore(max_concurrent) if max_concurrent is not None else None
+
+        async def limited(awaitable: Awaitable[T]) -> T:
+            if semaphore is None:
+                return await awaitable
+            async with semaphore:
+                return await awaitable
+
+        outcomes = await asyncio.gather(*[limited(awaitable) for awaitable in awaitables], return_exceptions=True)
+        for outcome in outcomes:
+            if isinstance(outcome, BaseException):
+                raise outcome
+        return outcomes  # type: ignore
+
+    def run(self, awaitables: Iterable[Awaitable[T]], max_concurrent: Optional[int] = None) -> List[T]:
+        """
+        Runs the event loop until all awaitables are done. Call this once from the main thread.
+        The directory index starts empty for every run.
+        """
+        directoryIndex.clear()
+
+        async def main() -> List[T]:
+            return await self.gather(awaitables, max_concurrent)
+
+        try:
+            return asyncio.run(main())
+        finally:
+            self.__executor.shutdown(wait=True)
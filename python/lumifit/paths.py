@@ -9,11 +9,14 @@ They should ONLY be generated with this module.
 """
 import copy
 from pathlib import Path
+from typing import Optional
 
+from lumifit.recipe import SimulationDataType
 from lumifit.types import (
     AlignmentParameters,
     ConfigPackage,
     DataMode,
+    ExperimentParameters,
     ReconstructionParameters,
 )
 
@@ -94,13 +97,32 @@ def generateRelativeBunchesDir() -> Path:
     return Path("bunches")
 
 
-def generateRelativeBinningDir() -> Path:
+def generateRelativeBinningDir(bins: Optional[int] = None) -> Path:
     """
     Generates a relative path to a bunches subdirectory.
+    Additional binnings (see LmdDataCreator) get their own directory next to it.
     """
+    if bins is not None:
+        return Path(f"binning_{bins}")
     return Path("binning")
 
 
+def generateRelativeTrackCacheDir() -> Path:
+    """
+    Generates a relative path to the columnar track cache (see lumifit.trackCache),
+    it lives in the bunches dir because there is one cache file per file list bunch.
+    """
+    return Path("trackCache")
+
+
+def generateRelativeQuickLookDir() -> Path:
+    """
+    Generates a relative path to the quick-look histograms (see lumifit.histograms)
+    in the bunches dir.
+    """
+    return Path("quickLook")
+
+
 def generateRelativeMergeDir() -> Path:
     """
     Generates a relative path to the merge_data path,
@@ -116,3 +138,18 @@ def generateAbsoluteMergeDataPath(configPackage: ConfigPackage, dataMode=DataMod
         / generateRelativeBinningDir()
         / generateRelativeMergeDir()
     )
+
+
+def generateAbsoluteROOTDataPathForSimType(experiment: ExperimentParameters, simDataType: SimulationDataType) -> Path:
+    """
+    Same as generateAbsoluteROOTDataPath, but picks the config package and data mode
+    that belong to this simulation type (vertex data is always uncut, res/acc uses the resAcc package).
+    """
+    if simDataType == SimulationDataType.VERTEX:
+        return generateAbsoluteROOTDataPath(configPackage=experiment.dataPackage, dataMode=DataMode.VERTEXDATA)
+    elif simDataType == SimulationDataType.ANGULAR:
+        return generateAbsoluteROOTDataPath(configPackage=experiment.dataPackage)
+    elif simDataType == SimulationDataType.EFFICIENCY_RESOLUTION:
+        return generateAbsoluteROOTDataPath(configPackage=experiment.resAccPackage)
+    else:
+        raise NotImplementedError(f"Simulation type {simDataType} is not implemented!")
@@ -0,0 +1,184 @@
+"""
+Dry-run plans for determineLuminosity.py (--plan).
+
+Before a campaign is started, this tells which stages would be skipped, how many array
+tasks would be submitted and how many core-hours they ask for, and how much storage the
+outputs will take. Nothing is submitted and nothing is written.
+
+The requested core-hours come straight from the JobResourceRequests. Sizes and turnaround
+times are estimated from what is already there: the output files of all experiments in
+the plan (per stage name, so a half simulated experiment tells us the size of a sample
+for all others) and the finished jobs in their journals.
+"""
+
+import json
+import statistics
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from attrs import asdict, define
+from lumifit.cluster import JobResourceRequest
+from lumifit.fileindex import directoryIndex
+from lumifit.stages import StageGraph
+
+
+@define
+class StageEstimate:
+    """
+    local: the stage runs on the submit node, not as a job
+    arrayTasks, walltimeHours and coreHours are what would be requested, 0 for local stages.
+    expectedBytes is what the stage would write in addition to existingBytes,
+    None if there is nothing to estimate it from.
+    turnaroundHours is the mean time from submission to finish of earlier jobs of this stage.
+    """
+
+    experimentDir: Path
+    stage: str
+    runs: bool
+    local: bool = True
+    arrayTasks: int = 0
+    walltimeHours: float = 0.0
+    coreHours: float = 0.0
+    outputDirectory: Optional[Path] = None
+    existingBytes: int = 0
+    expectedBytes: Optional[float] = None
+    turnaroundHours: Optional[float] = None
+
+
+def requestedCoreHours(resource_request: JobResourceRequest, arrayTasks: int) -> float:
+    return arrayTasks * resource_request.number_of_nodes * resource_request.processors_per_node * resource_request.walltime_in_minutes / 60
+
+
+def humanReadableBytes(size: Optional[float]) -> str:
+    if size is None:
+        return "?"
+    for unit in ("B", "kB", "MB", "GB", "TB"):
+        if abs(size) < 1000 or unit == "TB":
+            break
+        size /= 1000
+    return f"{size:.1f} {unit}"
+
+
+class Planner:
+    """
+    Add the stage graphs of all experiments first, so their outputs and journals are known,
+    then estimate() them all at once.
+    """
+
+    def __init__(self) -> None:
+        self.__graphs: List[Tuple[Path, StageGraph]] = []
+        # (experiment dir, stage name) -> output dir, total bytes, number of files
+        self.__outputs: Dict[Tuple[Path, str], Tuple[Path, int, int]] = {}
+        self.__turnarounds: Dict[str, List[float]] = {}
+
+    def add(self, experimentDir: Path, graph: StageGraph, turnarounds: Dict[str, List[float]]) -> None:
+        self.__graphs.append((experimentDir, graph))
+        for stage in graph.stages.values():
+            if stage.outputs is None:
+                continue
+            directory, glob_pattern = stage.outputs()
+            files = [entry for entry in directoryIndex.glob(directory, glob_pattern) if not entry.isDir]
+            self.__outputs[(experimentDir, stage.name)] = (directory, sum(entry.size for entry in files), len(files))
+        for task, seconds in turnarounds.items():
+            self.__turnarounds.setdefault(task, []).extend(seconds)
+
+    def __bytesPerFile(self, stageName: str) -> Optional[float]:
+        totalBytes = 0
+        totalFiles = 0
+        for (_, name), (_, size, numberOfFiles) in self.__outputs.items():
+            if name == stageName:
+                totalBytes += size
+                totalFiles += numberOfFiles
+        return totalBytes / totalFiles if totalFiles > 0 else None
+
+    def __bytesPerStage(self, stageName: str) -> Optional[float]:
+        sizes = [size for (_, name), (_, size, numberOfFiles) in self.__outputs.items() if name == stageName and numberOfFiles > 0]
+        return statistics.mean(sizes) if sizes else None
+
+    def estimate(self) -> List[StageEstimate]:
+        estimates: List[StageEstimate] = []
+        for experimentDir, graph in self.__graphs:
+            works = graph.plan()
+            for stage in graph.topologicalOrder():
+                estimate = StageEstimate(experimentDir, stage.name, works[stage.name], local=stage.plannedJob is None)
+                if stage.name in self.__turnarounds:
+                    estimate.turnaroundHours = statistics.mean(self.__turnarounds[stage.name]) / 3600
+
+                if (experimentDir, stage.name) in self.__outputs:
+                    estimate.outputDirectory, estimate.existingBytes, _ = self.__outputs[(experimentDir, stage.name)]
+
+                if estimate.runs and stage.plannedJob is not None:
+                    resource_request, estimate.arrayTasks = stage.plannedJob()
+                    estimate.walltimeHours = resource_request.walltime_in_minutes / 60
+                    estimate.coreHours = requestedCoreHours(resource_request, estimate.arrayTasks)
+                    # every array task writes one output file
+                    bytesPerFile = self.__bytesPerFile(stage.name)
+                    if bytesPerFile is not None:
+                        estimate.expectedBytes = bytesPerFile * estimate.arrayTasks
+                elif estimate.runs and stage.outputs is not None:
+                    bytesPerStage = self.__bytesPerStage(stage.name)
+                    if bytesPerStage is not None:
+                        # local stages rewrite all of their outputs
+                        estimate.expectedBytes = bytesPerStage - estimate.existingBytes
+                elif not estimate.runs:
+                    estimate.expectedBytes = 0
+
+                estimates.append(estimate)
+        return estimates
+
+
+def storageByDirectory(estimates: List[StageEstimate]) -> Dict[Path, Tuple[int, Optional[float]]]:
+    """
+    Existing and expected bytes, summed up for the outermost output directories of the
+    job stages (i.e. the ROOT data dirs, the bunches, binning and merge dirs are below them).
+    Expected is None if the estimate of any stage in there is unknown.
+    """
+    directories = [estimate.outputDirectory for estimate in estimates if estimate.outputDirectory is not None and not estimate.local]
+    storage: Dict[Path, Tuple[int, Optional[float]]] = {}
+    for estimate in estimates:
+        if estimate.outputDirectory is None:
+            continue
+        outermost = min(
+            (directory for directory in directories if directory == estimate.outputDirectory or directory in estimate.outputDirectory.parents),
+            key=lambda directory: len(directory.parts),
+            default=estimate.outputDirectory,
+        )
+        existing, expected = storage.get(outermost, (0, 0.0))
+        if expected is None or estimate.expectedBytes is None:
+            expected = None
+        else:
+            expected += estimate.expectedBytes
+        storage[outermost] = (existing + estimate.existingBytes, expected)
+    return storage
+
+
+def printPlan(estimates: List[StageEstimate]) -> None:
+    currentExperiment: Optional[Path] = None
+    for estimate in estimates:
+        if estimate.experimentDir != currentExperiment:
+            currentExperiment = estimate.experimentDir
+            print(f"\nplan for {currentExperiment}:")
+            print(f"  {'stage':<22} {'action':<6} {'tasks':>6} {'walltime/h':>10} {'core-h':>10} {'new data':>10} {'turnaround/h':>12}")
+        turnaround = f"{estimate.turnaroundHours:.1f}" if estimate.turnaroundHours is not None else "?"
+        print(
+            f"  {estimate.stage:<22} {'run' if estimate.runs else 'skip':<6} {estimate.arrayTasks:>6} {estimate.walltimeHours:>10.1f} "
+            + f"{estimate.coreHours:>10.1f} {humanReadableBytes(estimate.expectedBytes):>10} {turnaround:>12}"
+        )
+
+    print("\nstorage per data directory (existing + expected):")
+    for directory, (existing, expected) in storageByDirectory(estimates).items():
+        print(f"  {directory}: {humanReadableBytes(existing)} + {humanReadableBytes(expected)}")
+
+    print(f"\nrequested in total: {sum(estimate.arrayTasks for estimate in estimates)} array tasks, {sum(estimate.coreHours for estimate in estimates):.1f} core-hours")
+
+
+def exportPlan(estimates: List[StageEstimate], path: Path) -> None:
+    storage = storageByDirectory(estimates)
+    plan = {
+        "stages": [asdict(estimate, value_serializer=lambda _, __, value: str(value) if isinstance(value, Path) else value) for estimate in estimates],
+        "storage": [{"directory": str(directory), "existingBytes": existing, "expectedBytes": expected} for directory, (existing, expected) in storage.items()],
+        "totalArrayTasks": sum(estimate.arrayTasks for estimate in estimates),
+        "totalCoreHours": sum(estimate.coreHours for estimate in estimates),
+    }
+    with open(path, "w") as f:
+        json.dump(plan, f, indent=2)
@@ -0,0 +1,103 @@
+"""
+Quick statistical precision estimates on whatever sim/reco output has arrived so far.
+
+This doesn't replace the lmd data creation or the fit. The fitted acceptance is binned (the efficiency
+binning of the data config, i.e. 600x600), so one global error over all tracks would be far too
+optimistic: here the tracks in the TrksQA files are histogrammed in that binning (see lumifit.histograms)
+and the error is that of the bins, which is enough to tell if more samples would still help.
+
+Needs uproot, which is only imported when an estimate is actually made.
+"""
+
+import math
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from lumifit.histograms import HistogramSpec, fillHistograms, specsFromConfig
+from lumifit.trackCache import TREE_NAME, iterateTrackFiles
+
+# the generated and reconstructed tracks of all files read so far, per binning. finished TrksQA
+# files never change, so every file is only read once, no matter how often the precision is estimated
+_FileKey = Tuple[int, float]
+
+
+class _BinnedCounts:
+    def __init__(self) -> None:
+        self.files: Dict[str, _FileKey] = {}
+        self.generated: Optional[np.ndarray] = None
+        self.reconstructed: Optional[np.ndarray] = None
+
+
+_binnedCounts: Dict[Tuple[HistogramSpec, ...], _BinnedCounts] = {}
+_binnedCountsLock = threading.Lock()
+
+
+def relativeAcceptanceError(numberOfGenerated: int, numberOfReconstructed: int) -> Optional[float]:
+    """
+    Relative binomial error of the acceptance Nrec/Ngen. None if there is nothing to estimate yet.
+    """
+    if numberOfGenerated <= 0 or numberOfReconstructed <= 0:
+        return None
+    acceptance = numberOfReconstructed / numberOfGenerated
+    return math.sqrt((1 - acceptance) / numberOfReconstructed)
+
+
+def binnedRelativeAcceptanceErrors(generated: np.ndarray, reconstructed: np.ndarray) -> np.ndarray:
+    """
+    relativeAcceptanceError of every bin with reconstructed tracks. Bins without any are left out,
+    most of them are outside of the acceptance anyway.
+    """
+    populated = reconstructed > 0
+    acceptance = reconstructed[populated] / generated[populated]
+    return np.sqrt(np.clip(1 - acceptance, 0, None) / reconstructed[populated])
+
+
+def acceptanceCounts(trackFiles: List[Path], dataConfig: dict, treeName: str = TREE_NAME) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Generated and reconstructed (primary) tracks per bin of the efficiency binning of the data config.
+    Files that were read before are not read again, unless they changed.
+    """
+    specs = tuple(specsFromConfig(dataConfig, "e"))
+    keys = {}
+    for trackFile in trackFiles:
+        stat = trackFile.stat()
+        keys[str(trackFile)] = (stat.st_size, stat.st_mtime)
+
+    with _binnedCountsLock:
+        counts = _binnedCounts.setdefault(specs, _BinnedCounts())
+        # a file that was regenerated (or is gone) is in the sums with its old content, start over
+        if any(keys.get(path) != key for path, key in counts.files.items()):
+            counts = _binnedCounts[specs] = _BinnedCounts()
+        newFiles = [path for path in keys if path not in counts.files]
+
+        if newFiles or counts.generated is None:
+            histograms = fillHistograms(iterateTrackFiles(newFiles, treeName), list(specs))
+            if counts.generated is None or counts.reconstructed is None:
+                counts.generated = histograms["acceptance_all"].counts
+                counts.reconstructed = histograms["acceptance_reco"].counts
+            else:
+                counts.generated = counts.generated + histograms["acceptance_all"].counts
+                counts.reconstructed = counts.reconstructed + histograms["acceptance_reco"].counts
+            counts.files.update({path: keys[path] for path in newFiles})
+        return counts.generated, counts.reconstructed
+
+
+def estimateAcceptancePrecision(trackFiles: List[Path], dataConfig: dict, quantile: float = 0.9, treeName: str = TREE_NAME) -> Optional[float]:
+    """
+    Relative statistical error of the binned acceptance from these res/acc TrksQA files: this quantile
+    of the errors of all bins with reconstructed tracks (1.0 is the worst bin).
+    None if there is nothing to estimate yet.
+    """
+    if not trackFiles:
+        return None
+    generated, reconstructed = acceptanceCounts(trackFiles, dataConfig, treeName)
+    errors = binnedRelativeAcceptanceErrors(generated, reconstructed)
+    if len(errors) == 0:
+        return None
+
+    error = float(np.quantile(errors, quantile))
+    print(f"{int(reconstructed.sum())} of {int(generated.sum())} tracks reconstructed in {len(trackFiles)} files, {len(errors)} bins populated,")
+    print(f"{quantile:.0%} of them have a relative acceptance error below {error:.2e}")
+    return error
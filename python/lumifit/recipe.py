@@ -2,22 +2,12 @@
 container class for a data set found by determineLuminosity.py.
 
 only used by determineLuminosity.py internally, should never be written to
-or read from file!
+or read from file! (the order of the steps is in lumifit.stages now)
 """
 
-from enum import Enum, IntEnum
-from typing import List
+from enum import Enum
 
-from attrs import define, field
-
-
-class SimulationState(IntEnum):
-    FAILED = -1
-    INIT = 0
-    START_SIM = 1
-    MAKE_BUNCHES = 2
-    MERGE = 3
-    DONE = 4
+from attrs import define
 
 
 class SimulationDataType(Enum):
@@ -40,14 +30,3 @@ class SimulationDataType(Enum):
 @define
 class SimulationTask:
     simDataType: SimulationDataType = SimulationDataType.NONE
-    simState: SimulationState = SimulationState.INIT
-
-
-@define
-class SimRecipe:
-    """
-    This is a shopping-list-style object that holds at which step the simulation currently is.
-    It is never to be written to disk, it only resides in memory for the determineLuminosity script.
-    """
-
-    SimulationTasks: List[SimulationTask] = field(factory=list)
@@ -3,8 +3,10 @@
 import os
 import re
 import subprocess
+import threading
 import time
-from typing import Callable, Optional, Tuple
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional, Tuple
 
 from lumifit.agent import Client, SlurmOrder, orderType
 from lumifit.cluster import Job, JobHandler, JobResourceRequest
@@ -37,6 +39,13 @@ def _format_walltime(walltime_in_minutes):
     return walltime_string
 
 
+def _create_dependency_string(job: Job) -> str:
+    if not job.dependencies:
+        return ""
+    # without kill-on-invalid-dep, jobs whose dependencies failed would stay pending forever
+    return f" --dependency={job.dependency_type}:" + ":".join(str(jobID) for jobID in job.dependencies) + " --kill-on-invalid-dep=yes"
+
+
 def _create_array_string(job: Job) -> str:
     array_indices = job.array_indices
     if len(array_indices) > 1:
@@ -68,6 +77,149 @@ def _create_array_string(job: Job) -> str:
         raise ValueError("Number of jobs is zero!")
 
 
+# squeue only lists jobs that haven't finished yet, but a few states
+# can still show up for a short while after a job is done
+_FINISHED_STATES = {
+    "BOOT_FAIL",
+    "CANCELLED",
+    "COMPLETED",
+    "DEADLINE",
+    "FAILED",
+    "NODE_FAIL",
+    "OUT_OF_MEMORY",
+    "PREEMPTED",
+    "TIMEOUT",
+}
+
+
+def _parse_squeue_states(squeue_output: str) -> Dict[int, Dict[Optional[int], str]]:
+    """
+    Parses the output of squeue -h -r -o "%F %K %T" into a table of
+    job ID -> array task index (None for non-array jobs) -> state.
+    """
+    states: Dict[int, Dict[Optional[int], str]] = {}
+    for line in squeue_output.splitlines():
+        fields = line.split()
+        if len(fields) != 3 or not fields[0].isdigit():
+            continue
+        jobID = int(fields[0])
+        taskIndex = int(fields[1]) if fields[1].isdigit() else None
+        states.setdefault(jobID, {})[taskIndex] = fields[2]
+    return states
+
+
+class JobStatusWatcher:
+    """
+    Watches the state of many slurm jobs with a single squeue call per interval.
+
+    Jobs are tracked by watch(), which returns a Future that resolves to the job ID
+    once the job and all its array tasks are gone from the queue. The last state table
+    can be inspected with get_job_states().
+
+    The watcher thread only runs as long as there are jobs to watch.
+    """
+
+    squeue_command = 'squeue -u $USER -h -r -o "%F %K %T"'
+
+    def __init__(
+        self,
+        run_command: Callable[[str], Tuple[int, str]],
+        poll_interval_in_seconds: int = 60,
+        settle_time_in_seconds: int = 30,
+    ) -> None:
+        """
+        run_command executes a shell command and returns its return code and stdout.
+
+        A freshly submitted job may not show up in squeue right away (and the agent
+        may answer from a cached squeue result), so a job that was never seen in the
+        queue only counts as finished settle_time_in_seconds after it started being watched.
+        """
+        self.__run_command = run_command
+        self.__poll_interval_in_seconds = poll_interval_in_seconds
+        self.__settle_time_in_seconds = settle_time_in_seconds
+
+        self.__lock = threading.Lock()
+        self.__wakeup = threading.Event()
+        self.__thread: Optional[threading.Thread] = None
+
+        # job ID -> (time watching started, seen in queue at least once, futures)
+        self.__watched: Dict[int, Tuple[float, bool, List["Future[int]"]]] = {}
+        self.__states: Dict[int, Dict[Optional[int], str]] = {}
+
+        self.number_of_polls = 0
+
+    def watch(self, jobID: int) -> "Future[int]":
+        future: "Future[int]" = Future()
+        with self.__lock:
+            if jobID in self.__watched:
+                self.__watched[jobID][2].append(future)
+            else:
+                self.__watched[jobID] = (time.monotonic(), False, [future])
+
+            if self.__thread is None or not self.__thread.is_alive():
+                self.__thread = threading.Thread(target=self.__poll_loop, name="JobStatusWatcher", daemon=True)
+                self.__thread.start()
+        return future
+
+    def get_job_states(self, jobID: int) -> Dict[Optional[int], str]:
+        """
+        Returns the states of all array tasks of this job from the last poll.
+        An empty dict means the job wasn't in the queue (anymore).
+        """
+        with self.__lock:
+            return dict(self.__states.get(jobID, {}))
+
+    def get_active_number_of_jobs(self, jobID: int) -> int:
+        return sum(1 for state in self.get_job_states(jobID).values() if state not in _FINISHED_STATES)
+
+    def poll_now(self) -> None:
+        """
+        Wakes the watcher up so it polls right away instead of at the end of the interval.
+        """
+        self.__wakeup.set()
+
+    def __poll_loop(self) -> None:
+        while True:
+            self.__wakeup.wait(self.__poll_interval_in_seconds)
+            self.__wakeup.clear()
+
+            with self.__lock:
+                if not self.__watched:
+                    self.__thread = None
+                    return
+
+            pollStart = time.monotonic()
+            try:
+                returnCode, output = self.__run_command(self.squeue_command)
+            except Exception as e:
+                print(f"JobStatusWatcher: squeue call failed ({e}), trying again next interval.")
+                continue
+
+            if returnCode != 0:
+                print(f"JobStatusWatcher: squeue returned {returnCode}, trying again next interval.")
+                continue
+
+            self.number_of_polls += 1
+            self.__update(_parse_squeue_states(output), pollStart)
+
+    def __update(self, states: Dict[int, Dict[Optional[int], str]], pollStart: float) -> None:
+        finishedFutures: List[Tuple[int, "Future[int]"]] = []
+        with self.__lock:
+            self.__states = states
+            for jobID, (watchStart, seenInQueue, futures) in list(self.__watched.items()):
+                active = any(state not in _FINISHED_STATES for state in states.get(jobID, {}).values())
+                if active:
+                    self.__watched[jobID] = (watchStart, True, futures)
+                    continue
+                if not seenInQueue and pollStart - watchStart < self.__settle_time_in_seconds:
+                    continue
+                del self.__watched[jobID]
+                finishedFutures.extend((jobID, future) for future in futures)
+
+        for jobID, future in finishedFutures:
+            future.set_result(jobID)
+
+
 class SlurmJobHandler(JobHandler):
     def __init__(
         self,
@@ -76,6 +228,8 @@ class SlurmJobHandler(JobHandler):
         constraints: Optional[str] = None,
         job_preprocessor: Optional[Callable[[Job], Job]] = None,
         client: Optional[Client] = None,
+        poll_interval_in_seconds: int = 60,
+        settle_time_in_seconds: int = 30,
     ) -> None:
         self.__partition = partition
         self.__account = account
@@ -83,10 +237,48 @@ class SlurmJobHandler(JobHandler):
         self.__job_preprocessor = job_preprocessor
         self.__useSlurmAgent__ = True
         if self.__useSlurmAgent__:
-            self.client = Client().getUniqueServer()
+            # the client is thread safe, all threads of this handler share its connection.
+            # an injected client may be shared with others, only our own one is closed
+            self.__owns_client = client is None
+            self.client = client if client is not None else Client()
+        self.__watcher = JobStatusWatcher(
+            lambda command: self.__run_shell_command(command, readOnly=True),
+            poll_interval_in_seconds=poll_interval_in_seconds,
+            settle_time_in_seconds=settle_time_in_seconds,
+        )
 
     def __del__(self):
-        self.client.exit()
+        # __init__ may have failed before there was a client
+        if getattr(self, "_SlurmJobHandler__owns_client", False) and hasattr(self, "client"):
+            self.client.exit()
+
+    def __run_shell_command(self, bashCommand: str, readOnly: bool = False) -> Tuple[int, str]:
+        """
+        Runs a shell command via the agent (or directly) and returns its return code and stdout.
+        Read-only commands are sent as queries, so the agent may answer them from its cache.
+        """
+        if self.__useSlurmAgent__:
+            thisOrder = SlurmOrder()
+            if readOnly:
+                thisOrder.thisType = orderType.QUERY
+            thisOrder.cmd = bashCommand
+            thisOrder.runShell = True
+            thisOrder.env = os.environ.copy()
+            resultOrder = self.client.execute(thisOrder)
+            return resultOrder.returnCode, resultOrder.stdout
+
+        returnValue = subprocess.run(bashCommand, shell=True, stdout=subprocess.PIPE, text=True)
+        return returnValue.returncode, returnValue.stdout
+
+    def watch(self, jobID: int) -> "Future[int]":
+        """
+        All jobs of this handler are watched by one JobStatusWatcher,
+        so there is only one squeue call per interval, no matter how many jobs are waited for.
+        """
+        return self.__watcher.watch(jobID)
+
+    def get_job_states(self, jobID: int) -> Dict[Optional[int], str]:
+        return self.__watcher.get_job_states(jobID)
 
     def get_active_number_of_jobs(self, jobID: Optional[int] = None) -> int:
         """
@@ -99,26 +291,14 @@ class SlurmJobHandler(JobHandler):
         else:
             bashCommand = f"squeue -u $USER -h --state R,PD --job {jobID}  | wc -l"
 
-        # attention! sometimes this reads back the empty string, which shouldn't happen.
-        # I don't know why, maybe because two orders came at the same time.
-        # for now, just wait 30 seconds and try again, up to 3 times. Then fail.
+        # attention! this used to read back the empty string sometimes, when two orders
+        # came through the old named pipe at the same time. that shouldn't happen with the
+        # socket anymore, but squeue itself can still fail. so wait 30 seconds and try again,
+        # up to 3 times. Then fail.
 
         attemptCounter = 0
         while attemptCounter < 3:
-            if self.__useSlurmAgent__:
-                thisOrder = SlurmOrder()
-                thisOrder.cmd = bashCommand
-                thisOrder.runShell = True
-                # default output to zero, doesn't work otherwise
-                thisOrder.stdout = "0"
-                thisOrder.env = os.environ.copy()
-                self.client.sendOrder(thisOrder, 30)  # this may take some time
-                resultOrder = self.client.receiveOrder()
-                resultOut = resultOrder.stdout
-
-            else:
-                returnValue = subprocess.Popen(bashCommand, shell=True, stdout=subprocess.PIPE, text=True)
-                resultOut, _ = returnValue.communicate()
+            _, resultOut = self.__run_shell_command(bashCommand, readOnly=True)
 
             if resultOut == "":
                 time.sleep(30)
@@ -141,13 +321,14 @@ class SlurmJobHandler(JobHandler):
             job = self.__job_preprocessor(job)
 
         bashCommand = (
-            "sbatch"
+            "sbatch --parsable"
             + (f" -A {self.__account}" if self.__account else "")
             + f" -p {self.__partition}"
             + (f" --constraint={self.__constraints}" if self.__constraints else "")
         )
 
         bashCommand += _create_array_string(job)
+        bashCommand += _create_dependency_string(job)
 
         bashCommand += f" --job-name={job.name}" + _stringify(job.resource_request) + f" --output={job.logfile_url}"
         # export variables
@@ -157,24 +338,17 @@ class SlurmJobHandler(JobHandler):
 
         bashCommand = bashCommand[:-1] + " " + job.additional_flags + " " + job.application_url
         if self.__useSlurmAgent__:
-            thisOrder = SlurmOrder()
-            thisOrder.cmd = bashCommand
-            thisOrder.runShell = True
-            thisOrder.env = os.environ.copy()
-            self.client.sendOrder(thisOrder)
-            resultOrder = self.client.receiveOrder()
-            returnCode = resultOrder.returnCode
+            returnCode, returnMessage = self.__run_shell_command(bashCommand)
 
             if returnCode != 0:
                 jobArrayID: int = 0
                 raise RuntimeError("Job submission failed!")
             else:
-                returnMessage = resultOrder.stdout
-                # will be something like
-                # Submitted batch job 14049737
+                # with --parsable, this will be something like
+                # 14049737 or 14049737;clustername
 
                 # regex parse the job ID
-                match = re.search(r"Submitted batch job (\d+)", returnMessage)
+                match = re.match(r"\s*(\d+)", returnMessage) or re.search(r"Submitted batch job (\d+)", returnMessage)
                 if match is not None:
                     jobArrayID = int(match.group(1))
                 else:
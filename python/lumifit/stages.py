@@ -0,0 +1,147 @@
+"""
+Declarative stage graph for determineLuminosity.py.
+
+Every step of a luminosity determination (sim/reco job, bunching, lmd data job, merge,
+IP determination, fit) is a Stage with explicit inputs (the stages it needs) and outputs
+(where it writes to). The StageGraph starts every stage as soon as all of its inputs are
+finished, so independent branches run at the same time: the res/acc bunching doesn't wait
+for the angular reconstruction, and a merge doesn't wait for some unrelated branch.
+
+A stage whose outputs already exist is skipped, but only if none of its inputs ran
+(otherwise its outputs would be stale).
+"""
+
+import asyncio
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from attrs import define, field
+from lumifit.cluster import JobResourceRequest
+from lumifit.orchestrator import Orchestrator
+
+
+@define
+class Stage:
+    """
+    action: does the work, returns True if it (re)wrote the outputs of this stage
+    inputs: names of the stages that must be finished before this one
+    outputs: returns directory and glob pattern of the files this stage writes (for humans
+        and plans). A function, because paths can depend on what earlier stages found (the IP)
+    isComplete: blocking check if the outputs are already there. If None, the stage always
+        runs and its action has to figure out itself what is left to do.
+    plannedJob: blocking, returns the resource request and the number of array tasks of the
+        job this stage would submit now (see lumifit.planner). None for stages that run locally.
+    """
+
+    name: str
+    action: Callable[[], Awaitable[bool]]
+    inputs: List[str] = field(factory=list)
+    outputs: Optional[Callable[[], Tuple[Path, str]]] = None
+    isComplete: Optional[Callable[[], bool]] = None
+    plannedJob: Optional[Callable[[], Tuple[JobResourceRequest, int]]] = None
+
+
+class StageGraph:
+    def __init__(self) -> None:
+        self.stages: Dict[str, Stage] = {}
+
+    def add(self, stage: Stage) -> Stage:
+        if stage.name in self.stages:
+            raise ValueError(f"Stage {stage.name} is already in the graph!")
+        self.stages[stage.name] = stage
+        return stage
+
+    def topologicalOrder(self) -> List[Stage]:
+        """
+        All stages, every one after its inputs. Raises ValueError for unknown inputs or cycles.
+        """
+        order: List[Stage] = []
+        # 1: being visited, 2: done
+        visited: Dict[str, int] = {}
+
+        def visit(name: str, path: List[str]) -> None:
+            if visited.get(name) == 2:
+                return
+            if visited.get(name) == 1:
+                raise ValueError(f"Stage graph has a cycle: {' -> '.join(path + [name])}")
+            if name not in self.stages:
+                raise ValueError(f"Stage {path[-1]} needs unknown stage {name}!")
+            visited[name] = 1
+            for inputName in self.stages[name].inputs:
+                visit(inputName, path + [name])
+            visited[name] = 2
+            order.append(self.stages[name])
+
+        for name in self.stages:
+            visit(name, [])
+        return order
+
+    def plan(self) -> Dict[str, bool]:
+        """
+        Which stages would do work if the graph ran now, without running anything (blocking).
+
+        Same rule as run(), except for stages without isComplete: those submit a job for
+        whatever their plannedJob says is left, no matter what their inputs did.
+        Stages without both always work.
+        """
+        works: Dict[str, bool] = {}
+        for stage in self.topologicalOrder():
+            if stage.isComplete is not None:
+                works[stage.name] = any(works[name] for name in stage.inputs) or not stage.isComplete()
+            elif stage.plannedJob is not None:
+                works[stage.name] = stage.plannedJob()[1] > 0
+            else:
+                works[stage.name] = True
+        return works
+
+    async def __runStage(
+        self,
+        stage: Stage,
+        inputsRan: List[bool],
+        orchestrator: Orchestrator,
+        onTransition: Optional[Callable[[str, str], None]],
+    ) -> bool:
+        def transition(state: str) -> None:
+            print(f"stage {stage.name}: {state}")
+            if onTransition is not None:
+                onTransition(stage.name, state)
+
+        if not any(inputsRan) and stage.isComplete is not None and await orchestrator.runLocal(stage.isComplete):
+            transition("SKIPPED")
+            return False
+
+        transition("RUNNING")
+        ran = await stage.action()
+        transition("DONE")
+        return ran
+
+    async def run(self, orchestrator: Orchestrator, onTransition: Optional[Callable[[str, str], None]] = None) -> Dict[str, bool]:
+        """
+        Runs all stages and returns for each if it ran (True) or was skipped (False).
+
+        A failed stage fails all stages that depend on it, the other branches go on.
+        The first exception (in topological order) is raised once everything is through.
+        """
+        order = self.topologicalOrder()
+
+        if orchestrator.sequential:
+            ran: Dict[str, bool] = {}
+            for stage in order:
+                ran[stage.name] = await self.__runStage(stage, [ran[name] for name in stage.inputs], orchestrator, onTransition)
+            return ran
+
+        tasks: Dict[str, "asyncio.Task[bool]"] = {}
+
+        async def runWhenReady(stage: Stage) -> bool:
+            inputsRan = await asyncio.gather(*[tasks[name] for name in stage.inputs])
+            return await self.__runStage(stage, list(inputsRan), orchestrator, onTransition)
+
+        # topological order, so the tasks of all inputs exist already
+        for stage in order:
+            tasks[stage.name] = asyncio.ensure_future(runWhenReady(stage))
+
+        outcomes = await asyncio.gather(*tasks.values(), return_exceptions=True)
+        for outcome in outcomes:
+            if isinstance(outcome, BaseException):
+                raise outcome
+        return {name: bool(outcome) for name, outcome in zip(tasks, outcomes)}
@@ -0,0 +1,114 @@
+"""
+File list bunches that are written while the sim/reco job is still running.
+
+makeMultipleFileListBunches.py can only run once all array tasks are done. The BunchStreamer
+instead writes a file list as soon as enough finished track files are there, so the lmd data
+of that bunch can be created while the tail of the reco array is still in the queue.
+
+The file lists look exactly like those of makeMultipleFileListBunches.py (filelist_N.txt in the
+bunches dir, one absolute path per line), so createLumiFitData.sh doesn't know the difference.
+"""
+
+import fnmatch
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+from lumifit.general import isIndexedFilePresentAndValid
+from lumifit.manifest import OutputRecord, isRecordValid, readManifest
+from lumifit.paths import generateRelativeBunchesDir
+from lumifit.validation import isRootFileValid
+
+
+class BunchStreamer:
+    """
+    Call poll() every now and then while the sim/reco job runs, and once with final=True
+    after it is done. A track file is only bunched once it's at least min_filesize_in_bytes
+    and hasn't changed since the last poll (the reco jobs copy it from the node scratch at the end).
+    If treeName is given, it must also have entries in that tree (see lumifit.validation).
+    With use_manifest, the track files in the manifest of the reco tasks are bunched right away,
+    they are only added to it once they're complete (see lumifit.manifest).
+
+    File lists that are already in the bunches dir (from an earlier run) are kept, their files
+    aren't bunched again.
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        glob_pattern: str,
+        files_per_bunch: int,
+        maximum_number_of_files: int = -1,
+        min_filesize_in_bytes: int = 2000,
+        treeName: Optional[str] = None,
+        use_manifest: bool = False,
+    ) -> None:
+        self.directory = directory
+        self.bunchesDir = directory / generateRelativeBunchesDir()
+        self.glob_pattern = glob_pattern
+        self.files_per_bunch = files_per_bunch
+        self.maximum_number_of_files = maximum_number_of_files
+        self.min_filesize_in_bytes = min_filesize_in_bytes
+        self.treeName = treeName
+        self.use_manifest = use_manifest
+
+        self.__lastSeen: Dict[Path, Tuple[int, float]] = {}
+        self.__pending: List[Path] = []
+        self.__bunched: Set[Path] = set()
+        self.numberOfBunches = 0
+
+        for fileList in self.bunchesDir.glob("filelist_*.txt"):
+            self.numberOfBunches = max(self.numberOfBunches, int(fileList.stem.split("_")[-1]))
+            with open(fileList) as f:
+                self.__bunched.update(Path(line.strip()) for line in f if line.strip())
+
+    def __isSettled(self, trackFile: Path, final: bool) -> bool:
+        if not isIndexedFilePresentAndValid(trackFile, self.min_filesize_in_bytes):
+            return False
+        if not final:
+            # still running: it must not have changed since the last poll
+            stat = trackFile.stat()
+            lastSeen = self.__lastSeen.get(trackFile)
+            self.__lastSeen[trackFile] = (stat.st_size, stat.st_mtime)
+            if lastSeen != (stat.st_size, stat.st_mtime):
+                return False
+        return self.treeName is None or isRootFileValid(trackFile, self.treeName)
+
+    def __isRecordSettled(self, record: OutputRecord) -> bool:
+        if not isRecordValid(record, self.min_filesize_in_bytes):
+            return False
+        # the entries were counted when the record was written
+        return self.treeName is None or record.entries is not None or isRootFileValid(record.path, self.treeName)
+
+    def __writeBunch(self, files: List[Path]) -> int:
+        self.numberOfBunches += 1
+        self.bunchesDir.mkdir(parents=True, exist_ok=True)
+        with open(self.bunchesDir / f"filelist_{self.numberOfBunches}.txt", "w") as f:
+            for trackFile in files:
+                f.write(f"{trackFile}\n")
+        self.__bunched.update(files)
+        return self.numberOfBunches
+
+    def poll(self, final: bool = False) -> List[int]:
+        """
+        Writes file lists for all full bunches of settled track files (with final=True, also
+        for the remaining ones) and returns their indices.
+        """
+        records = readManifest(self.directory) if self.use_manifest else None
+        if records is not None:
+            candidates = sorted(record.path for name, record in records.items() if fnmatch.fnmatchcase(name, self.glob_pattern))
+        else:
+            candidates = sorted(self.directory.glob(self.glob_pattern))
+
+        for trackFile in candidates:
+            if trackFile in self.__bunched or trackFile in self.__pending:
+                continue
+            if self.maximum_number_of_files > 0 and len(self.__bunched) + len(self.__pending) >= self.maximum_number_of_files:
+                break
+            if self.__isRecordSettled(records[trackFile.name]) if records is not None else self.__isSettled(trackFile, final):
+                self.__pending.append(trackFile)
+
+        newBunches: List[int] = []
+        while len(self.__pending) >= self.files_per_bunch or (final and self.__pending):
+            newBunches.append(self.__writeBunch(self.__pending[: self.files_per_bunch]))
+            self.__pending = self.__pending[self.files_per_bunch :]
+        return newBunches
@@ -0,0 +1,163 @@
+"""
+Columnar cache of the track parameters in the TrksQA files, one file per file list bunch.
+
+Every rerun of the lmd data creation (a new cut, binning or selection in the data config) reads
+thousands of Lumi_TrksQA_*.root files again, although it only needs a handful of numbers per track.
+Here these numbers are extracted once per bunch into bunches/trackCache/tracks_N.npy (N like in
+filelist_N.txt): a float32 array with one row per column and one entry per track, so every column
+is contiguous. np.load can memory-map it, and iterateTrackCache reads it sequentially in chunks.
+Which row is which column is in columns.json next to the cache files.
+
+Only the momenta and angles are cached, that's all the THETA, PHI, THETA_X, THETA_Y and T dimensions
+need (see PndLmdDataReader::getTrackParameterValue). The positions for X, Y and Z are TVector3 members,
+they are not in the cache.
+
+Needs uproot and awkward to read the TrksQA files, they are only imported when that happens.
+"""
+
+import json
+import os
+import re
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+from lumifit.manifest import recordOutputs
+from lumifit.paths import generateRelativeTrackCacheDir
+from lumifit.types import ExperimentType
+from lumifit.validation import trackTreeName
+
+# the LMDTrackQ branches only exist for LUMI, KOALA has its own track classes. the tree name is the
+# one the validation checks, so the validator, the cache, the histograms and the precision estimate agree
+TREE_NAME = trackTreeName(ExperimentType.LUMI)
+
+# column -> branch of the PndLmdTrackQ members in the TClonesArray
+COLUMNS = {
+    "rec_status": "LMDTrackQ.fTrkRecStatus",
+    "secondary": "LMDTrackQ.fSecondary",
+    "ip_mom": "LMDTrackQ.fIPmom",
+    "ip_theta": "LMDTrackQ.fIPtheta",
+    "ip_phi": "LMDTrackQ.fIPphi",
+    "lmd_theta": "LMDTrackQ.fLMDtheta",
+    "lmd_phi": "LMDTrackQ.fLMDphi",
+    "mc_mom": "LMDTrackQ.fMCmom",
+    "mc_theta": "LMDTrackQ.fMCtheta",
+    "mc_phi": "LMDTrackQ.fMCphi",
+    "mc_lmd_mom": "LMDTrackQ.fMCmomLMD",
+    "mc_lmd_theta": "LMDTrackQ.fMCthetaLMD",
+    "mc_lmd_phi": "LMDTrackQ.fMCphiLMD",
+}
+
+COLUMNS_FILE_NAME = "columns.json"
+
+
+def trackCachePath(bunchesPath: Path, bunch: int) -> Path:
+    return bunchesPath / generateRelativeTrackCacheDir() / f"tracks_{bunch}.npy"
+
+
+def fileListPath(bunchesPath: Path, bunch: int) -> Path:
+    return bunchesPath / f"filelist_{bunch}.txt"
+
+
+def bunchNumbers(bunchesPath: Path) -> List[int]:
+    """
+    The N of all filelist_N.txt in the bunches dir, sorted.
+    """
+    numbers = []
+    for fileList in bunchesPath.glob("filelist_*.txt"):
+        match = re.fullmatch(r"filelist_(\d+)\.txt", fileList.name)
+        if match:
+            numbers.append(int(match.group(1)))
+    return sorted(numbers)
+
+
+def isCached(bunchesPath: Path, bunch: int) -> bool:
+    """
+    A bunch is cached if its cache file is there and not older than its file list.
+    """
+    try:
+        return trackCachePath(bunchesPath, bunch).stat().st_mtime >= fileListPath(bunchesPath, bunch).stat().st_mtime
+    except FileNotFoundError:
+        return False
+
+
+def missingBunches(bunchesPath: Path) -> List[int]:
+    return [bunch for bunch in bunchNumbers(bunchesPath) if not isCached(bunchesPath, bunch)]
+
+
+def readFileList(bunchesPath: Path, bunch: int) -> List[str]:
+    with open(fileListPath(bunchesPath, bunch)) as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def iterateTrackFiles(trackFiles: List[str], treeName: str = TREE_NAME, step_size: str = "100 MB") -> Iterator[Dict[str, np.ndarray]]:
+    """
+    Reads the COLUMNS of all tracks in these TrksQA files with uproot, in chunks of about step_size.
+    The chunks look like the ones of iterateTrackCache: one float32 array per column, one entry per track.
+    """
+    import awkward as ak
+    import uproot
+
+    if not trackFiles:
+        return
+    for chunk in uproot.iterate([{trackFile: treeName} for trackFile in trackFiles], list(COLUMNS.values()), step_size=step_size, library="ak"):
+        yield {column: ak.to_numpy(ak.flatten(chunk[branch], axis=None)).astype(np.float32) for column, branch in COLUMNS.items()}
+
+
+def convertBunch(bunchesPath: Path, bunch: int, treeName: str = TREE_NAME, step_size: str = "100 MB") -> int:
+    """
+    Converts the track files of filelist_N.txt into tracks_N.npy, returns the number of tracks.
+
+    The file is written under a temporary name and renamed when it's complete, so a killed
+    job never leaves a cache file behind that looks valid.
+    """
+    trackFiles = readFileList(bunchesPath, bunch)
+    chunks: Dict[str, List[np.ndarray]] = {column: [] for column in COLUMNS}
+    for chunk in iterateTrackFiles(trackFiles, treeName, step_size):
+        for column, values in chunk.items():
+            chunks[column].append(values)
+
+    numberOfTracks = sum(len(values) for values in chunks[next(iter(COLUMNS))])
+    output = trackCachePath(bunchesPath, bunch)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output.parent / COLUMNS_FILE_NAME, "w") as f:
+        json.dump(list(COLUMNS), f)
+
+    temporary = output.parent / f".{output.name}.part"
+    cache = np.lib.format.open_memmap(temporary, mode="w+", dtype=np.float32, shape=(len(COLUMNS), numberOfTracks))
+    for row, column in enumerate(COLUMNS):
+        if numberOfTracks > 0:
+            cache[row] = np.concatenate(chunks[column])
+    cache.flush()
+    del cache
+    os.replace(temporary, output)
+
+    recordOutputs([output], "trackCache", task=bunch)
+    print(f"cached {numberOfTracks} tracks of {len(trackFiles)} files in {output}")
+    return numberOfTracks
+
+
+def openTrackCache(path: Path, mmap: bool = True) -> Dict[str, np.ndarray]:
+    """
+    All columns of one cache file. With mmap, they are read-only views into the memory-mapped
+    file and nothing is read until they are used.
+    """
+    with open(path.parent / COLUMNS_FILE_NAME) as f:
+        columns = json.load(f)
+    cache = np.load(path, mmap_mode="r" if mmap else None)
+    if cache.ndim != 2 or cache.shape[0] != len(columns):
+        raise ValueError(f"{path} has shape {cache.shape}, but {path.parent / COLUMNS_FILE_NAME} lists {len(columns)} columns")
+    return dict(zip(columns, cache))
+
+
+def iterateTrackCache(paths: Iterable[Path], columns: Optional[List[str]] = None, chunk_size: int = 1_000_000) -> Iterator[Dict[str, np.ndarray]]:
+    """
+    Goes through these cache files in chunks of at most chunk_size tracks (a chunk never spans
+    two files). Every chunk has the requested columns (all if columns is None) as float32 arrays.
+    """
+    for path in paths:
+        cache = openTrackCache(path)
+        names = list(cache) if columns is None else columns
+        numberOfTracks = len(next(iter(cache.values()))) if cache else 0
+        for start in range(0, numberOfTracks, chunk_size):
+            yield {name: np.asarray(cache[name][start : start + chunk_size]) for name in names}
@@ -223,6 +223,17 @@ class ExperimentParameters:
 
     lumiFileName: Optional[Path] = None
 
+    def setNewResAccPackage(self, resAccPackage: ConfigPackage) -> None:
+        """
+        Yes, I hate it too, the data class is supposed to be immutable.
+        But better to do it here (and document it) than to do it in the
+        determineLuminosity.py or elsewhere and forget about it.
+
+        Only needed to adopt a speculative res/acc simulation, see wrappers.ipDetermination.
+        """
+        print("Attention! Setting new res/acc config package")
+        object.__setattr__(self, "resAccPackage", resAccPackage)
+
     def isConsistent(self) -> bool:
         if self.dataPackage.recoParams.use_ip_determination != self.resAccPackage.recoParams.use_ip_determination:
             print("Error! use_ip_determination must be the same for data and resAcc mode!")
@@ -0,0 +1,83 @@
+"""
+Deep validation of ROOT files.
+
+isFilePresentAndValid only looks at the file size, so truncated files (a job that was killed while
+copying) or zombies (a TFile that was never closed) pass, and createLmdFitData crashes on them much
+later. Here the files are opened with uproot, and a file is only good if it is as long as its header
+says, and the expected tree is there and has entries.
+
+Verdicts are cached by (path, size, mtime), so checking the same files again costs one (indexed) stat.
+Needs uproot, which is only imported when a file is actually opened.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from lumifit.fileindex import directoryIndex
+from lumifit.types import ExperimentType
+
+# the trees the C++ data readers read (see PndLmdCombinedDataReader and KoaCombinedDataReader)
+TRACK_TREE_NAMES = {
+    ExperimentType.LUMI: "pndsim",
+    ExperimentType.KOALA: "koalasim",
+}
+
+_verdicts: Dict[Tuple[str, int, float, str], bool] = {}
+_verdictsLock = threading.Lock()
+
+
+def trackTreeName(experimentType: ExperimentType) -> str:
+    return TRACK_TREE_NAMES[experimentType]
+
+
+def _openAndCheck(rootFile: Path, treeName: str) -> bool:
+    import uproot
+
+    try:
+        with uproot.open(rootFile) as opened:
+            # the header knows where the file ends, a killed copy ends earlier
+            if opened.file.fEND > rootFile.stat().st_size:
+                print(f"WARNING! {rootFile} is truncated!")
+                return False
+            if treeName not in opened:
+                print(f"WARNING! {rootFile} has no tree {treeName}!")
+                return False
+            tree = opened[treeName]
+            if not isinstance(tree, uproot.TTree) or tree.num_entries < 1:
+                print(f"WARNING! Tree {treeName} in {rootFile} is empty!")
+                return False
+            return True
+    except Exception as e:
+        print(f"WARNING! {rootFile} is broken: {e}")
+        return False
+
+
+def isRootFileValid(rootFile: Path, treeName: str) -> bool:
+    """
+    True if the file can be opened and has a non-empty tree with this name.
+    """
+    entry = directoryIndex.stat(rootFile)
+    if entry is None or entry.isDir:
+        return False
+    key = (str(rootFile), entry.size, entry.mtime, treeName)
+    with _verdictsLock:
+        if key in _verdicts:
+            return _verdicts[key]
+
+    verdict = _openAndCheck(rootFile, treeName)
+    with _verdictsLock:
+        _verdicts[key] = verdict
+    return verdict
+
+
+def validateRootFiles(rootFiles: List[Path], treeName: str, max_workers: int = 8) -> Dict[Path, bool]:
+    """
+    Validates all files in a thread pool (most of the time goes to waiting for the file system).
+    """
+    if not rootFiles:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(rootFiles)), thread_name_prefix="validateRootFiles") as executor:
+        verdicts = executor.map(lambda rootFile: isRootFileValid(rootFile, treeName), rootFiles)
+        return dict(zip(rootFiles, verdicts))
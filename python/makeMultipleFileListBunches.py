@@ -6,63 +6,13 @@ It then separates them into bunches of 10 files each (other sizes can be specifi
 It then creates a text file for each bunch (so 10 files if there were 100 ROOT files)
 and writes the absolute paths to the files into the text files.
 
-TODO: add type hints and make this a module
+The bunching itself is in dataProcessors/FileListBuncher.py, this is just the command line.
 """
 
 import argparse
 from pathlib import Path
-from typing import List
-
-from lumifit.general import getGoodFiles
-from lumifit.paths import generateRelativeBunchesDir
-
-
-def createFileListFile(output_url: Path, list_of_files: List[Path]) -> None:
-    if output_url.exists() and not args.force:
-        print("file already exists, skipping: " + str(output_url))
-        return
-
-    with open(output_url, "w") as f:
-        for file_url in list_of_files:
-            f.write(str(file_url))
-            f.write("\n")
-
-
-def makeFileListBunches(directory: Path) -> None:
-    good_files, _ = getGoodFiles(directory, filename_prefix + "*", 2000)
-
-    print("creating file lists...")
-
-    if args.maximum_number_of_files > 0 and args.maximum_number_of_files < len(good_files):
-        good_files = good_files[: args.maximum_number_of_files]
-
-    max_bundles = len(good_files) / args.files_per_bunch
-    if len(good_files) % args.files_per_bunch > 0:
-        max_bundles += 1
-    max_bundles = int(max_bundles)
-
-    # right now, this only generates "bunches"
-    output_bunch_dir = directory / generateRelativeBunchesDir()
-
-    output_bunch_dir.mkdir(parents=True, exist_ok=True)
-
-    file_list_index = 1
-    while len(good_files) > 0:
-        # get next chunk of good files
-        chunk_size = args.files_per_bunch
-        if len(good_files) < args.files_per_bunch:
-            chunk_size = len(good_files)
-
-        chunk_of_good_files: List[Path] = []
-        for i in range(1, chunk_size + 1):
-            chunk_of_good_files.append(good_files.pop())
-
-        createFileListFile(
-            output_bunch_dir / Path("filelist_" + str(file_list_index) + ".txt"),
-            chunk_of_good_files,
-        )
-        file_list_index += 1
 
+from dataProcessors.FileListBuncher import FileListBuncher
 
 parser = argparse.ArgumentParser(
     description="Script for going through whole directory trees and generating filelist bunches for faster lmd data creation.",
@@ -74,7 +24,7 @@ parser.add_argument(
     metavar="dirname_to_scan",
     type=str,
     nargs=1,
-    help="Name of directory to scan recursively for qa files and create bunches",
+    help="Name of directory to scan for qa files and create bunches",
 )
 parser.add_argument(
     "--files_per_bunch",
@@ -97,7 +47,40 @@ parser.add_argument(
     default=".*",
     help="Only directories with according to this pattern will be used.",
 )
+parser.add_argument("--recursive", action="store_true", help="also bunch all directories below dirname_to_scan that match directory_pattern")
 parser.add_argument("--force", action="store_true", help="force recreation")
+parser.add_argument(
+    "--validate_tree",
+    type=str,
+    default=None,
+    help="Only bunch ROOT files that uproot can open and that have entries in this tree (i.e. pndsim)",
+)
+
+parser.add_argument(
+    "--balance_tree",
+    type=str,
+    default=None,
+    help="Put about the same number of entries in this tree (i.e. pndsim) into every bunch, instead of the same number of files.\n"
+    + "The number of bunches stays the same, unless --target_minutes_per_bunch is given",
+)
+parser.add_argument(
+    "--target_minutes_per_bunch",
+    type=float,
+    default=None,
+    help="With --balance_tree: make as many bunches as needed so that createLmdFitData runs about this long on each.\n"
+    + "How fast it is comes from the manifests of an earlier run, or --events_per_second",
+)
+parser.add_argument(
+    "--events_per_second",
+    type=float,
+    default=None,
+    help="How many events createLmdFitData processes per second, if there are no manifests of an earlier run",
+)
+parser.add_argument(
+    "--use_manifest",
+    action="store_true",
+    help="Only bunch ROOT files that are in the manifest.jsonl of the reco tasks, instead of listing the directory",
+)
 
 parser.add_argument(
     "--filenamePrefix",
@@ -108,8 +91,18 @@ parser.add_argument(
 
 args = parser.parse_args()
 
-pattern = args.directory_pattern
-filename_prefix = args.filenamePrefix
-
-pathToRootFiles = Path(args.dirname[0])
-makeFileListBunches(pathToRootFiles)
+buncher = FileListBuncher(
+    Path(args.dirname[0]),
+    filename_prefix=args.filenamePrefix,
+    files_per_bunch=args.files_per_bunch,
+    maximum_number_of_files=args.maximum_number_of_files,
+    directory_pattern=args.directory_pattern,
+    recursive=args.recursive,
+    force=args.force,
+    validate_tree=args.validate_tree,
+    balance_tree=args.balance_tree,
+    target_minutes_per_bunch=args.target_minutes_per_bunch,
+    events_per_second=args.events_per_second,
+    use_manifest=args.use_manifest,
+)
+buncher.run()
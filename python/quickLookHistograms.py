@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+
+"""
+Fills the angular distributions of the data config with numpy, straight from the file list
+bunches of makeMultipleFileListBunches.py (or their track cache), for QA without a
+createLmdFitData job array.
+
+The histogramming is in dataProcessors/QuickLookHistogrammer.py, this is just the command line.
+"""
+
+import argparse
+from pathlib import Path
+
+from dataProcessors.QuickLookHistogrammer import QuickLookHistogrammer
+from lumifit.trackCache import TREE_NAME
+
+parser = argparse.ArgumentParser(
+    description="Quick-look THETA/PHI histograms of all file list bunches, saved as mergeable .npz in bunches/quickLook.",
+    formatter_class=argparse.RawTextHelpFormatter,
+)
+
+parser.add_argument(
+    "bunches_path",
+    type=Path,
+    help="the bunches directory with the filelist_N.txt",
+)
+parser.add_argument(
+    "--config",
+    type=Path,
+    required=True,
+    help="the data config (dataconfig.json) with the binning",
+)
+parser.add_argument(
+    "--type",
+    type=str,
+    default="a",
+    help="a: angular data, e: acceptance, r: resolution, or combinations like er",
+)
+parser.add_argument("--tree", type=str, default=TREE_NAME, help="tree with the LMDTrackQ branch")
+parser.add_argument("--processes", type=int, default=4, help="bunches that are histogrammed at the same time")
+
+args = parser.parse_args()
+
+histogrammer = QuickLookHistogrammer(args.bunches_path, args.config, args.type, args.tree, args.processes)
+histogrammer.run()
@@ -18,10 +18,13 @@ from lumifit.general import (
     matrixMacroFileName,
     toCbool,
 )
+from lumifit.manifest import StepTimer, recordOutputs
 from lumifit.paths import generateAbsoluteROOTDataPath
 from lumifit.types import DataMode, ExperimentParameters
+from lumifit.validation import trackTreeName
 
 # * ------------------- Experiment Parameters -------------------
+timer = StepTimer()
 experimentDir = envPath("ExperimentDir")
 thisMode = DataMode(os.environ["DataMode"])
 force_level = int(os.environ["force_level"])
@@ -139,6 +142,8 @@ if not isFilePresentAndValid(Path(f"{workingDirOnComputeNode}/Lumi_digi_{start_e
         os.system(f"cp {MCDataDir}/Lumi_digi_{start_evt}.root {workingDirOnComputeNode}/Lumi_digi_{start_evt}.root")
 
 
+timer.lap("copyInputs")
+
 os.chdir(PNDmacropath)
 # * ------------------- Reco Step -------------------
 if not isFilePresentAndValid(Path(pathToTrkQAFiles / f"Lumi_reco_{start_evt}.root")) or force_level == 1:
@@ -147,6 +152,8 @@ if not isFilePresentAndValid(Path(pathToTrkQAFiles / f"Lumi_reco_{start_evt}.roo
         f"""root -l -b -q 'runLumiPixel2Reco.C({recoParams.num_events_per_sample}, {start_evt}, "{workingDirOnComputeNode}", "{matrixMacroFileName(alignParams.alignment_matrices_path)}", "{matrixMacroFileName(alignParams.misalignment_matrices_path)}", {toCbool(alignParams.use_point_transform_misalignment)}, {verbositylvl})'"""
     )
 
+timer.lap("reco")
+
 # * ------------------- Hit Merge Step -------------------
 if not isFilePresentAndValid(Path(workingDirOnComputeNode / f"Lumi_recoMerged_{start_evt}.root")) or force_level == 1:
     os.chdir(PNDmacropath)
@@ -155,6 +162,8 @@ if not isFilePresentAndValid(Path(workingDirOnComputeNode / f"Lumi_recoMerged_{s
     # copy Lumi_recoMerged_ for module aligner
     os.system(f"cp {workingDirOnComputeNode}/Lumi_recoMerged_{start_evt}.root {pathToTrkQAFiles}/Lumi_recoMerged_{start_evt}.root")
 
+timer.lap("hitMerge")
+
 # * ------------------- Pair Finder Step -------------------
 
 # TODO: store this in configuration, we don't always need hit pairs
@@ -165,6 +174,8 @@ if True:
     os.system(f"""cp {workingDirOnComputeNode}/Lumi_Pairs_{start_evt}.root {pathToTrkQAFiles}/Lumi_Pairs_{start_evt}.root""")
 
 
+timer.lap("pairFinder")
+
 # * ------------------- Pixel Finder Step -------------------
 if not isFilePresentAndValid(Path(f"{workingDirOnComputeNode}/Lumi_TCand_{start_evt}.root")) or force_level == 1:
     os.chdir(PNDmacropath)
@@ -173,6 +184,8 @@ if not isFilePresentAndValid(Path(f"{workingDirOnComputeNode}/Lumi_TCand_{start_
     )
 
 
+timer.lap("finder")
+
 # * ------------------- Pixel Fitter Step -------------------
 if not isFilePresentAndValid(Path(f"{workingDirOnComputeNode}/Lumi_TrackNotFiltered_{start_evt}.root")) or force_level == 1:
     if not isFilePresentAndValid(Path(f"{workingDirOnComputeNode}/Lumi_Track_{start_evt}.root")) or force_level == 1:
@@ -185,6 +198,8 @@ if not isFilePresentAndValid(Path(f"{workingDirOnComputeNode}/Lumi_TrackNotFilte
         # copy track file for module alignment
         os.system(f"""cp {workingDirOnComputeNode}/Lumi_Track_{start_evt}.root {pathToTrkQAFiles}/Lumi_Track_{start_evt}.root""")
 
+timer.lap("fitter")
+
 # * ------------------- Pixel Filter Step -------------------
 # track filter (on number of hits and chi2 and optionally on track kinematics)
 # so yes, this is the kinematics and xy filter step. It's a little convoluted:
@@ -219,6 +234,8 @@ if preFilter:
         if False:
             os.system(f"""cp {workingDirOnComputeNode}/Lumi_Track_{start_evt}.root {pathToTrkQAFiles}/Lumi_TrackFiltered_{start_evt}.root""")
 
+timer.lap("filter")
+
 # * ------------------- Pixel BackProp Step -------------------
 if not isFilePresentAndValid(Path(f"{workingDirOnComputeNode}/Lumi_Geane_{start_evt}.root")) or force_level == 1:
     os.chdir(PNDmacropath)
@@ -226,6 +243,8 @@ if not isFilePresentAndValid(Path(f"{workingDirOnComputeNode}/Lumi_Geane_{start_
         f"""root -l -b -q 'runLumiPixel5BackProp.C({recoParams.num_events_per_sample}, {start_evt}, "{workingDirOnComputeNode}", {verbositylvl}, "{backPropAlgorithm}", {toCbool(mergedHits)}, {recoParams.lab_momentum}, {recoParams.recoIPX}, {recoParams.recoIPY}, {recoParams.recoIPZ}, {toCbool(preFilter)})'"""
     )
 
+timer.lap("backProp")
+
 # * ------------------- Pixel CleanSig Step -------------------
 # filter back-propagated tracks (momentum cut)
 if CleanSig:
@@ -233,6 +252,8 @@ if CleanSig:
         f"""root -l -b -q 'runLumiPixel5bCleanSig.C({recoParams.num_events_per_sample}, {start_evt}, "{workingDirOnComputeNode}", {verbositylvl}, {recoParams.lab_momentum}, {recoParams.recoIPX}, {recoParams.recoIPY})'"""
     )
 
+timer.lap("cleanSig")
+
 # * ------------------- Pixel Track QA Step -------------------
 # Quality assurance task(s)
 # combine MC and reco information
@@ -246,6 +267,18 @@ if not isFilePresentAndValid(Path(f"{workingDirOnComputeNode}/Lumi_TrksQA_{start
     if not debug:
         os.system(f"""cp {workingDirOnComputeNode}/Lumi_TrksQA_{start_evt}.root {pathToTrkQAFiles}/Lumi_TrksQA_{start_evt}.root""")
 
+timer.lap("trksQA")
+
+# * ------------------- Manifest Step -------------------
+# tell the orchestrator that this task is done, see lumifit.manifest
+recordOutputs(
+    [pathToTrkQAFiles / f"Lumi_TrksQA_{start_evt}.root"],
+    "reco",
+    task=filename_index,
+    timings=timer.timings,
+    treeName=trackTreeName(experiment.experimentType),
+)
+
 # * ------------------- Cleanup Step -------------------
 # remove everything in the local path
 if not debug:
@@ -18,6 +18,7 @@ from lumifit.general import (
     matrixMacroFileName,
     toCbool,
 )
+from lumifit.manifest import StepTimer, recordOutputs
 from lumifit.paths import generateAbsoluteROOTDataPath
 from lumifit.types import (
     DataMode,
@@ -26,6 +27,7 @@ from lumifit.types import (
 )
 
 # * ------------------- Experiment Parameters -------------------
+timer = StepTimer()
 experimentDir = envPath("ExperimentDir")
 thisMode = DataMode(os.environ["DataMode"])
 force_level = int(os.environ["force_level"])
@@ -137,6 +139,8 @@ else:
         os.system(f"cp {MCDataDir}/Lumi_MC_{start_evt}.root {workingDirOnComputeNode}/Lumi_MC_{start_evt}.root")
         os.system(f"cp {MCDataDir}/Lumi_Params_{start_evt}.root {workingDirOnComputeNode}/Lumi_Params_{start_evt}.root")
 
+timer.lap("mc")
+
 # * ------------------- Digi Step -------------------
 if not isFilePresentAndValid(workingDirOnComputeNode / f"Lumi_digi_{start_evt}.root") or force_level == 2:
     os.chdir(PNDmacropath)
@@ -149,6 +153,7 @@ if not isFilePresentAndValid(workingDirOnComputeNode / f"Lumi_digi_{start_evt}.r
             f"""root -l -b -q 'runLumiPixel1Digi.C({simParams.num_events_per_sample}, {start_evt}, "{workingDirOnComputeNode}", "{matrixMacroFileName(alignParams.misalignment_matrices_path)}", {toCbool(alignParams.use_point_transform_misalignment)}, {verbositylvl})'"""
         )
 
+timer.lap("digi")
 
 # always copy mc data and params from node to permanent storage (params are needed for all subsequent steps. Also: Params are UPDATED every step, so only the final Params file holds all needed data)
 if not debug:
@@ -158,5 +163,15 @@ if not debug:
     # MC path is better for this since digi data is "almost real data"
     os.system(f"cp {workingDirOnComputeNode}/Lumi_digi_{start_evt}.root {MCDataDir}/Lumi_digi_{start_evt}.root")
 
+timer.lap("copyOutputs")
+
+# runLmdReco.py writes its own manifest for the track files, see lumifit.manifest
+recordOutputs(
+    [MCDataDir / f"Lumi_{kind}_{start_evt}.root" for kind in ("MC", "Params", "digi")],
+    "sim",
+    task=filename_index,
+    timings=timer.timings,
+)
+
 os.chdir(LMDscriptpath)
 os.system("./runLmdReco.py")
@@ -7,6 +7,21 @@ from lumifit.paths import generateAbsoluteROOTDataPath
 from lumifit.types import DataMode, ExperimentParameters
 
 
+def recoResourceRequest(use_devel_queue: bool = False) -> JobResourceRequest:
+    """
+    What every array task of the reconstruction job asks for. Also used for plans, so no side effects here.
+    """
+    if use_devel_queue:
+        return make_test_job_resource_request()
+
+    resource_request = JobResourceRequest(2 * 60)
+    resource_request.number_of_nodes = 1
+    resource_request.processors_per_node = 1
+    resource_request.memory_in_mb = 4500
+    resource_request.node_scratch_filesize_in_mb = 0
+    return resource_request
+
+
 def create_reconstruction_job(
     experiment: ExperimentParameters,
     thisMode: DataMode,
@@ -37,14 +52,7 @@ def create_reconstruction_job(
     ROOTDataDir = generateAbsoluteROOTDataPath(configPackage=configPackage)
     ROOTDataDir.mkdir(parents=True, exist_ok=True)
 
-    resource_request = JobResourceRequest(2 * 60)
-    resource_request.number_of_nodes = 1
-    resource_request.processors_per_node = 1
-    resource_request.memory_in_mb = 4500
-    resource_request.node_scratch_filesize_in_mb = 0
-
-    if use_devel_queue:
-        resource_request = make_test_job_resource_request()
+    resource_request = recoResourceRequest(use_devel_queue)
 
     job = Job(
         resource_request,
@@ -13,6 +13,21 @@ from lumifit.types import (
 )
 
 
+def simRecoResourceRequest(use_devel_queue: bool = False) -> JobResourceRequest:
+    """
+    What every array task of the sim/reco job asks for. Also used for plans, so no side effects here.
+    """
+    if use_devel_queue:
+        return make_test_job_resource_request()
+
+    resource_request = JobResourceRequest(walltime_in_minutes=12 * 60)
+    resource_request.number_of_nodes = 1
+    resource_request.processors_per_node = 1
+    resource_request.memory_in_mb = 5000
+    resource_request.node_scratch_filesize_in_mb = 0
+    return resource_request
+
+
 def create_simulation_and_reconstruction_job(
     experiment: ExperimentParameters,
     thisMode: DataMode,
@@ -71,14 +86,7 @@ def create_simulation_and_reconstruction_job(
         )
         subprocess.call(bashcommand.split())
 
-    resource_request = JobResourceRequest(walltime_in_minutes=12 * 60)
-    resource_request.number_of_nodes = 1
-    resource_request.processors_per_node = 1
-    resource_request.memory_in_mb = 5000
-    resource_request.node_scratch_filesize_in_mb = 0
-
-    if use_devel_queue:
-        resource_request = make_test_job_resource_request()
+    resource_request = simRecoResourceRequest(use_devel_queue)
 
     job = Job(
         resource_request,
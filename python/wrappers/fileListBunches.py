@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Module to run makeMultipleFileListBunches.py as a cluster job.
+
+Only needed when jobs are chained with slurm dependencies, because then the
+bunches must be made on a compute node after the simulation is done.
+"""
+
+import math
+
+from lumifit.cluster import Job, JobResourceRequest
+from lumifit.paths import generateAbsoluteROOTDataPathForSimType, generateRelativeBunchesDir
+from lumifit.recipe import SimulationDataType
+from lumifit.types import ConfigPackage, ExperimentParameters
+from lumifit.validation import trackTreeName
+
+
+def getConfigPackageForSimType(experiment: ExperimentParameters, simDataType: SimulationDataType) -> ConfigPackage:
+    if simDataType == SimulationDataType.EFFICIENCY_RESOLUTION:
+        return experiment.resAccPackage
+    return experiment.dataPackage
+
+
+def expectedNumberOfFileLists(experiment: ExperimentParameters, simDataType: SimulationDataType, files_per_bunch: int = 10) -> int:
+    """
+    The bunching job doesn't exist yet when the lmdData job is submitted, so we must
+    predict how many file lists it will write. The simulation writes num_samples files at most.
+    """
+    num_samples = getConfigPackageForSimType(experiment, simDataType).recoParams.num_samples
+    return max(1, math.ceil(num_samples / files_per_bunch))
+
+
+def createFileListBunchesJob(
+    experiment: ExperimentParameters, simDataType: SimulationDataType, files_per_bunch: int = 10, validate: bool = False, use_manifest: bool = False, balance: bool = False
+) -> Job:
+    """
+    With validate, only track files that uproot can open (with entries in the track tree) are bunched.
+    With use_manifest, only track files in the manifest of the reco tasks are bunched (see lumifit.manifest).
+    With balance, the bunches get about the same number of events instead of files (see lumifit.bunching).
+    """
+    LMDscriptpath = experiment.softwarePaths.LmdFitScripts
+    configPackage = getConfigPackageForSimType(experiment, simDataType)
+    pathToRootFiles = generateAbsoluteROOTDataPathForSimType(experiment, simDataType)
+
+    # the log file is written before the job runs, so the directory must already exist
+    bunchesPath = pathToRootFiles / generateRelativeBunchesDir()
+    bunchesPath.mkdir(parents=True, exist_ok=True)
+
+    resource_request = JobResourceRequest(walltime_in_minutes=30)
+    resource_request.number_of_nodes = 1
+    resource_request.processors_per_node = 1
+    resource_request.memory_in_mb = 1000
+
+    # --force, because stale file lists from an earlier run would point to the wrong files
+    bunchCommand = (
+        f"{LMDscriptpath}/makeMultipleFileListBunches.py --filenamePrefix {experiment.trackFilePattern}"
+        + f" --files_per_bunch {files_per_bunch} --maximum_number_of_files {configPackage.recoParams.num_samples} --force"
+    )
+    if validate:
+        bunchCommand += f" --validate_tree {trackTreeName(experiment.experimentType)}"
+    if use_manifest:
+        bunchCommand += " --use_manifest"
+    if balance:
+        bunchCommand += f" --balance_tree {trackTreeName(experiment.experimentType)}"
+    bunchCommand += f" {pathToRootFiles}"
+
+    job = Job(
+        resource_request,
+        application_url=f"{LMDscriptpath}/singularityJob.sh '{bunchCommand}'",
+        name="makeFileListBunches",
+        logfile_url=str(bunchesPath / "makeFileListBunches.log"),
+        array_indices=[1],
+    )
+    return job
+
+
+if __name__ == "__main__":
+    print("cannot be run as main module")
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+Module to determine the IP from the merged vertex data and to update the experiment
+config with it.
+
+Can either be run as script with the experiment config as argument (that's what the
+cluster job does when jobs are chained), or imported as module.
+"""
+
+import copy
+import json
+import math
+import subprocess
+from typing import List
+
+from attrs import evolve
+from lumifit.cluster import Job, JobResourceRequest
+from lumifit.config import write_params_to_file
+from lumifit.paths import generateAbsoluteMergeDataPath
+from lumifit.types import DataMode, ExperimentParameters
+
+
+def thetaWidening(ipX: float, ipY: float) -> float:
+    """
+    How much the res/acc theta range is widened (on both ends) for an IP at ipX, ipY.
+    """
+    max_xy_shift = math.sqrt(ipX**2 + ipY**2)
+    return float("{0:.2f}".format(round(float(max_xy_shift), 2)))
+
+
+def determineIP(experiment: ExperimentParameters) -> None:
+    """
+    Runs the determineBeamOffset binary on the merged vertex data,
+    unless the reco IP file already exists.
+    """
+    assert experiment.recoIPpath is not None, "ERROR! path to recoIP.json is not set in config!"
+
+    if experiment.recoIPpath.exists():
+        print("IP determination file already exists, skipping IP determination!")
+        return
+
+    vertexDataMergePath = generateAbsoluteMergeDataPath(
+        experiment.dataPackage,
+        dataMode=DataMode.VERTEXDATA,
+    )
+
+    bashCommand: List[str] = []
+    bashCommand.append(str(experiment.softwarePaths.LmdFitBuildDir / "bin/determineBeamOffset"))
+    bashCommand.append("-p")
+    bashCommand.append(str(vertexDataMergePath))
+    bashCommand.append("-c")
+    bashCommand.append(str(experiment.vertexConfigPath))
+    bashCommand.append("-o")
+    bashCommand.append(str(experiment.recoIPpath))
+
+    print(f"beam offset determination command:\n{bashCommand}")
+    _ = subprocess.call(bashCommand)
+
+
+def applyRecoIP(experiment: ExperimentParameters) -> None:
+    """
+    Reads the reconstructed IP and writes it to the experiment config.
+
+    ! This is the ONLY place where a new IP may be set.
+    (adoptSpeculativeResAcc may swap the res/acc params afterwards, but only for ones
+    that are within tolerance of this IP)
+    """
+    assert experiment.resAccPackage.simParams is not None, "ERROR! simParams are not set in config!"
+    assert experiment.recoIPpath is not None, "ERROR! path to recoIP.json is not set in config!"
+
+    with open(str(experiment.recoIPpath), "r") as f:
+        ip_rec_data = json.load(f)
+
+    # check if ip_x and ip_y are in the reco_ip.json file
+    # if not, the IP was not determined correctly
+    if "ip_x" not in ip_rec_data or "ip_y" not in ip_rec_data:
+        raise RuntimeError(f"ERROR! Reco IP file {experiment.recoIPpath} does not contain ip_x or ip_y!")
+
+    newRecoIPX = float("{0:.3f}".format(round(float(ip_rec_data["ip_x"]), 3)))  # in cm
+    newRecoIPY = float("{0:.3f}".format(round(float(ip_rec_data["ip_y"]), 3)))
+
+    newRecoIPZ = 0  # we can't detect anything else anyway, so why bother
+    # newRecoIPZ = experiment.dataPackage.simParams.ip_offset_z
+
+    # I don't like this. Actually I hate this.
+    # The experiment config is frozen for a reason.
+    # But unfortunately there doesn't seem to be a better way
+
+    # so, three param sets must be updated with the new IP:
+    # - the dataPackage recoParams
+    # - the resAccPackage simParams (both IP and theta min/max)
+    # - the resAccPackage recoParams
+    #
+    # at least we know it can happen ONLY here
+
+    max_xy_shift = thetaWidening(newRecoIPX, newRecoIPY)
+
+    resAccThetaMin = experiment.resAccPackage.simParams.theta_min_in_mrad - max_xy_shift
+    resAccThetaMax = experiment.resAccPackage.simParams.theta_max_in_mrad + max_xy_shift
+
+    experiment.dataPackage.recoParams.setNewIPPosition(newRecoIPX, newRecoIPY, newRecoIPZ)
+    experiment.resAccPackage.simParams.setNewIPPosition(newRecoIPX, newRecoIPY, newRecoIPZ)
+    experiment.resAccPackage.simParams.setNewThetaAngles(resAccThetaMin, resAccThetaMax)
+    experiment.resAccPackage.recoParams.setNewIPPosition(newRecoIPX, newRecoIPY, newRecoIPZ)
+
+    print("============================================================")
+    print("                       Attention!                           ")
+    print("     Experiment Config has been changed in memory!          ")
+    print("This MUST only happen if you are using the IP determination!")
+    print("                                                            ")
+    print("New IP position:                                            ")
+    print(f"  x: {experiment.dataPackage.recoParams.recoIPX} cm    ")
+    print(f"  y: {experiment.dataPackage.recoParams.recoIPY} cm    ")
+    print(f"  z: {experiment.dataPackage.recoParams.recoIPZ} cm    ")
+    print("                                                            ")
+    print("New theta angles:                                           ")
+    print(f"  theta min: {experiment.resAccPackage.simParams.theta_min_in_mrad} mrad")
+    print(f"  theta max: {experiment.resAccPackage.simParams.theta_max_in_mrad} mrad")
+    print("                                                            ")
+    print("============================================================")
+    print("Finished IP determination for this recipe!                  ")
+
+    # overwrite existing config file, otherwise the scripts on the compute nodes don't have access to the
+    # new IP position
+    print(f"Overwriting experiment config file at {experiment.experimentDir}/experiment.config with new IP position...")
+    write_params_to_file(experiment, experiment.experimentDir, "experiment.config", overwrite=True)
+
+
+def createSpeculativeResAccExperiment(experiment: ExperimentParameters, tolerance: float) -> ExperimentParameters:
+    """
+    A copy of the experiment for a res/acc simulation that starts right away instead of
+    waiting for the IP determination. It uses the IP from the config, and its theta range is
+    widened by the tolerance on top of the usual widening. So if the reconstructed IP is at most
+    tolerance (in cm) away, the theta range still covers what applyRecoIP would have used.
+
+    Its outputs (and its experiment config, which the compute nodes read) go to separate dirs,
+    so a speculation that didn't work out never mixes with the real res/acc data.
+    """
+    assert experiment.resAccPackage.simParams is not None, "ERROR! simParams are not set in config!"
+    assert experiment.resAccPackage.MCDataDir is not None, "ERROR! MCDataDir is not set in config!"
+
+    speculative = copy.deepcopy(experiment)
+    simParams = speculative.resAccPackage.simParams
+    assert simParams is not None
+
+    widening = thetaWidening(simParams.ip_offset_x, simParams.ip_offset_y) + tolerance
+    simParams.setNewThetaAngles(simParams.theta_min_in_mrad - widening, simParams.theta_max_in_mrad + widening)
+
+    resAccPackage = evolve(
+        speculative.resAccPackage,
+        baseDataDir=experiment.resAccPackage.baseDataDir / "speculative",
+        MCDataDir=experiment.resAccPackage.MCDataDir / "speculative",
+    )
+    return evolve(speculative, resAccPackage=resAccPackage, experimentDir=experiment.experimentDir / "speculativeResAcc")
+
+
+def speculativeResAccIsReusable(experiment: ExperimentParameters, speculative: ExperimentParameters, tolerance: float) -> bool:
+    """
+    True if the reconstructed IP (applyRecoIP must have run already) is within tolerance
+    of the IP the speculative res/acc simulation used.
+    """
+    simParams = speculative.resAccPackage.simParams
+    assert simParams is not None
+
+    recoParams = experiment.dataPackage.recoParams
+    shift = math.hypot(recoParams.recoIPX - simParams.ip_offset_x, recoParams.recoIPY - simParams.ip_offset_y)
+    print(f"reconstructed IP is {shift:.3f} cm away from the IP of the speculative res/acc simulation (tolerance: {tolerance} cm)")
+    return shift <= tolerance
+
+
+def adoptSpeculativeResAcc(experiment: ExperimentParameters, speculative: ExperimentParameters) -> None:
+    """
+    Makes the speculative res/acc data the real one. The config on disk is overwritten again,
+    because the compute nodes must use the params the speculative data was made with.
+    """
+    experiment.setNewResAccPackage(copy.deepcopy(speculative.resAccPackage))
+
+    print("============================================================")
+    print("     Reusing the speculative res/acc simulation!            ")
+    print(f"  res/acc data dir: {experiment.resAccPackage.baseDataDir}")
+    print("============================================================")
+
+    write_params_to_file(experiment, experiment.experimentDir, "experiment.config", overwrite=True)
+
+
+def createIPDeterminationJob(experiment: ExperimentParameters) -> Job:
+    """
+    Runs this module as script on a compute node. All jobs that run after it read
+    the updated IP from the experiment config.
+    """
+    LMDscriptpath = experiment.softwarePaths.LmdFitScripts
+
+    resource_request = JobResourceRequest(walltime_in_minutes=30)
+    resource_request.number_of_nodes = 1
+    resource_request.processors_per_node = 1
+    resource_request.memory_in_mb = 2000
+
+    job = Job(
+        resource_request,
+        application_url=f"{LMDscriptpath}/singularityJob.sh '{LMDscriptpath}/wrappers/ipDetermination.py -e {experiment.experimentDir}/experiment.config'",
+        name="determineIP",
+        logfile_url=str(experiment.experimentDir / "determineIP.log"),
+        array_indices=[1],
+    )
+    return job
+
+
+if __name__ == "__main__":
+    """
+    Script part of this module. Just supply the experiment config file as argument.
+    """
+    import argparse
+    from pathlib import Path
+
+    from lumifit.config import load_params_from_file
+
+    parser = argparse.ArgumentParser(
+        description="Determines the IP from the merged vertex data and writes it to the experiment config.",
+        formatter_class=argparse.RawTextHelpFormatter,
+    )
+
+    parser.add_argument(
+        "-e",
+        "--experiment_config",
+        dest="ExperimentConfigFile",
+        type=Path,
+        help="The Experiment.config file that holds all info.",
+        required=True,
+    )
+
+    args = parser.parse_args()
+
+    experiment: ExperimentParameters = load_params_from_file(args.ExperimentConfigFile, ExperimentParameters)
+
+    determineIP(experiment)
+    applyRecoIP(experiment)
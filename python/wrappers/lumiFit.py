@@ -12,6 +12,14 @@ from lumifit.paths import generateAbsoluteMergeDataPath
 from lumifit.types import ExperimentParameters
 
 
+def lumiFitResourceRequest(number_of_threads: int = 16) -> JobResourceRequest:
+    resource_request = JobResourceRequest(walltime_in_minutes=12 * 60)
+    resource_request.number_of_nodes = 1
+    resource_request.processors_per_node = number_of_threads
+    resource_request.memory_in_mb = 2000
+    return resource_request
+
+
 def createLumiFitJob(experiment: ExperimentParameters) -> Job:
     # allocate two times this many cores on a compute node, or we'll get a segfault.
     # 16 seems to work when we allocate 32 cores, so just leave it like that. the fit
@@ -25,10 +33,7 @@ def createLumiFitJob(experiment: ExperimentParameters) -> Job:
     config_url = experiment.fitConfigPath
     lumiFileName = experiment.lumiFileName
 
-    resource_request = JobResourceRequest(walltime_in_minutes=12 * 60)
-    resource_request.number_of_nodes = 1
-    resource_request.processors_per_node = number_of_threads
-    resource_request.memory_in_mb = 2000
+    resource_request = lumiFitResourceRequest(number_of_threads)
 
     # use either the reconstructed IP or the IP from the experiment config
     # (data package reco settings)
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Module to run mergeMultipleLmdData.py as a cluster job.
+
+Needed when jobs are chained with slurm dependencies, or to keep large merges
+(see the tree merge in dataProcessors/LmdDataMerger.py) off the submit node.
+"""
+
+from typing import List, Optional
+
+from dataProcessors.LmdDataMerger import DEFAULT_FAN_IN
+from lumifit.cluster import Job, JobResourceRequest
+from lumifit.paths import (
+    generateAbsoluteROOTDataPathForSimType,
+    generateRelativeBinningDir,
+    generateRelativeBunchesDir,
+)
+from lumifit.recipe import SimulationDataType
+from lumifit.types import ExperimentParameters
+
+
+def createMergeDataJob(
+    experiment: ExperimentParameters,
+    simDataType: SimulationDataType,
+    fan_in: int = DEFAULT_FAN_IN,
+    processes: int = 4,
+    extra_binnings: Optional[List[int]] = None,
+) -> Job:
+    """
+    One job that merges all data types of simDataType, the fitted binning and then the extra binnings.
+    """
+    LMDscriptpath = experiment.softwarePaths.LmdFitScripts
+    pathToRootFiles = generateAbsoluteROOTDataPathForSimType(experiment, simDataType)
+    binningPath = pathToRootFiles / generateRelativeBunchesDir() / generateRelativeBinningDir()
+    binningPath.mkdir(parents=True, exist_ok=True)
+
+    resource_request = JobResourceRequest(walltime_in_minutes=60)
+    resource_request.number_of_nodes = 1
+    # the data types and the groups of the tree merge run at the same time
+    resource_request.processors_per_node = processes * len(simDataType.value)
+    resource_request.memory_in_mb = 2000
+
+    # we have to give the value because the script expects a/er/v !
+    mergeCommand = f"{LMDscriptpath}/mergeMultipleLmdData.py {simDataType.value} {pathToRootFiles} --fan_in {fan_in} --processes {processes}"
+    for bins in extra_binnings or []:
+        mergeCommand += f"; {LMDscriptpath}/mergeMultipleLmdData.py {simDataType.value} {pathToRootFiles} --fan_in {fan_in} --processes {processes} --bins {bins}"
+
+    job = Job(
+        resource_request,
+        application_url=f"{LMDscriptpath}/singularityJob.sh '{mergeCommand}'",
+        name="mergeLmdData",
+        logfile_url=str(binningPath / "mergeLmdData.log"),
+        array_indices=[1],
+    )
+    return job
+
+
+if __name__ == "__main__":
+    print("cannot be run as main module")
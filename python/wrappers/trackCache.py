@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Module to run createTrackCache.py as a cluster job, one array task per file list bunch.
+"""
+
+from lumifit.cluster import Job, JobResourceRequest
+from lumifit.paths import generateAbsoluteROOTDataPathForSimType, generateRelativeBunchesDir, generateRelativeTrackCacheDir
+from lumifit.recipe import SimulationDataType
+from lumifit.trackCache import bunchNumbers, missingBunches
+from lumifit.types import ExperimentParameters
+from lumifit.validation import trackTreeName
+
+
+def trackCacheResourceRequest() -> JobResourceRequest:
+    resource_request = JobResourceRequest(walltime_in_minutes=60)
+    resource_request.number_of_nodes = 1
+    resource_request.processors_per_node = 1
+    # all tracks of a bunch are in memory before they're written
+    resource_request.memory_in_mb = 3000
+    return resource_request
+
+
+def createTrackCacheJob(experiment: ExperimentParameters, simDataType: SimulationDataType) -> Job:
+    """
+    Only bunches that aren't cached yet get an array task, unless none are left.
+    """
+    LMDscriptpath = experiment.softwarePaths.LmdFitScripts
+    bunchesPath = generateAbsoluteROOTDataPathForSimType(experiment, simDataType) / generateRelativeBunchesDir()
+
+    bunches = missingBunches(bunchesPath) or bunchNumbers(bunchesPath)
+    if len(bunches) < 1:
+        raise RuntimeError(f"No filelists found in {bunchesPath}!")
+
+    # the log files are written before the job runs, so the directory must already exist
+    cachePath = bunchesPath / generateRelativeTrackCacheDir()
+    cachePath.mkdir(parents=True, exist_ok=True)
+
+    # the single quotes keep SLURM_ARRAY_TASK_ID for the shell in the container
+    cacheCommand = f"{LMDscriptpath}/createTrackCache.py --bunch ${{SLURM_ARRAY_TASK_ID}} --tree {trackTreeName(experiment.experimentType)} {bunchesPath}"
+
+    job = Job(
+        trackCacheResourceRequest(),
+        application_url=f"{LMDscriptpath}/singularityJob.sh '{cacheCommand}'",
+        name="createTrackCache",
+        logfile_url=str(cachePath / "createTrackCache-%a.log"),
+        array_indices=bunches,
+    )
+    return job
+
+
+if __name__ == "__main__":
+    print("cannot be run as main module")
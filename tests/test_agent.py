@@ -0,0 +1,118 @@
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+from lumifit.agent import Agent, Client, Server, SlurmOrder, orderType
+
+
+@pytest.fixture
+def agent_socket(tmp_path: Path):
+    socketPath = tmp_path / "lmdfit.sock"
+    server = Server(socketPath, maxWorkers=4)
+    serverThread = threading.Thread(target=server.serve, daemon=True)
+    serverThread.start()
+
+    start = time.time()
+    while not socketPath.exists() and time.time() - start < 5:
+        time.sleep(0.05)
+
+    yield socketPath
+
+    with Client(socketPath) as client:
+        client.stopAgent()
+    serverThread.join(timeout=5)
+
+
+@pytest.mark.timeout(20)
+def test_replies_reach_their_callers(agent_socket: Path):
+    with Client(agent_socket) as client:
+
+        def run(i: int) -> str:
+            # later orders finish first, so replies come back out of order
+            order = SlurmOrder(cmd=f"sleep 0.{8 - i}; echo {i}", runShell=True)
+            return client.execute(order).stdout.strip()
+
+        start = time.time()
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(run, range(8)))
+        elapsed = time.time() - start
+
+    assert results == [str(i) for i in range(8)]
+    # four workers, so this can't have run serially
+    assert elapsed < 3
+
+
+@pytest.mark.timeout(20)
+def test_clients_share_one_agent(agent_socket: Path):
+    with Client(agent_socket) as first, Client(agent_socket) as second:
+        assert first.execute(SlurmOrder(cmd="echo first")).stdout == "first\n"
+        assert second.execute(SlurmOrder(cmd="echo second")).stdout == "second\n"
+
+
+@pytest.mark.timeout(20)
+def test_queries_are_cached_and_coalesced(agent_socket: Path, tmp_path: Path):
+    counterFile = tmp_path / "counter"
+    # every execution appends a line, so we can count how often the command really ran
+    command = f"sleep 0.5; echo x >> {counterFile}; echo 42"
+
+    with Client(agent_socket) as client:
+
+        def query(_: int) -> str:
+            return client.execute(SlurmOrder(thisType=orderType.QUERY, cmd=command, runShell=True)).stdout
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(executor.map(query, range(4)))
+        # this one comes from the cache
+        results.append(query(0))
+
+        stats = client.getCacheStats()
+
+    assert results == 5 * ["42\n"]
+    assert counterFile.read_text().count("x") == 1
+    assert stats["misses"] == 1
+    assert stats["hits"] + stats["coalesced"] == 4
+
+
+@pytest.mark.timeout(20)
+def test_unknown_meta_command_fails(agent_socket: Path):
+    with Client(agent_socket) as client:
+        with pytest.raises(RuntimeError, match="not implemented"):
+            client.execute(SlurmOrder(thisType=orderType.META, cmd="nonsense"))
+        # the agent is still fine
+        assert client.execute(SlurmOrder(cmd="echo ok")).stdout == "ok\n"
+
+
+@pytest.mark.timeout(20)
+def test_orders_fail_when_the_agent_goes_away(tmp_path: Path):
+    socketPath = tmp_path / "lmdfit.sock"
+    listeningSocket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listeningSocket.bind(str(socketPath))
+    listeningSocket.listen()
+
+    def fakeAgent() -> None:
+        # answers the connection test, then drops the connection after the next order
+        connection, _ = listeningSocket.accept()
+        with connection, connection.makefile("rb") as reader:
+            for line in reader:
+                order = Agent.decodeOrder(line)
+                if order.thisType == orderType.META:
+                    order.stdout = "ok"
+                    connection.sendall(Agent.encodeOrder(order))
+                else:
+                    break
+
+    agentThread = threading.Thread(target=fakeAgent, daemon=True)
+    agentThread.start()
+
+    with Client(socketPath) as client:
+        pending = client.sendOrder(SlurmOrder(cmd="sleep 100"))
+        with pytest.raises(ConnectionError):
+            pending.result(timeout=10)
+        with pytest.raises(ConnectionError):
+            client.execute(SlurmOrder(cmd="echo too late"), timeout=10)
+
+    agentThread.join(timeout=5)
+    listeningSocket.close()
@@ -0,0 +1,56 @@
+import copy
+from pathlib import Path
+
+from lumifit.artifacts import ArtifactCache, configPackageHash, linkArtifacts
+from lumifit.types import (
+    AlignmentParameters,
+    ConfigPackage,
+    DataMode,
+    ReconstructionParameters,
+    SimulationParameters,
+)
+
+
+def make_package(baseDataDir: Path, random_seed: int) -> ConfigPackage:
+    return ConfigPackage(
+        recoParams=ReconstructionParameters(reconstructionCommand=f"{baseDataDir}/runLmdReco.py"),
+        alignParams=AlignmentParameters(),
+        baseDataDir=baseDataDir,
+        MCDataDir=baseDataDir / "mc_data",
+        simParams=SimulationParameters(simulationCommand="runLmdSimReco.py", random_seed=random_seed),
+    )
+
+
+def test_config_package_hash(tmp_path: Path):
+    first = make_package(tmp_path / "first", 42)
+    second = make_package(tmp_path / "second", 1234)
+
+    # different dirs and seeds, but the same box simulation
+    assert configPackageHash(first, DataMode.RESACC, "v1") == configPackageHash(second, DataMode.RESACC, "v1")
+    # data samples must stay independent
+    assert configPackageHash(first, DataMode.DATA, "v1") != configPackageHash(second, DataMode.DATA, "v1")
+    assert configPackageHash(first, DataMode.RESACC, "v1") != configPackageHash(first, DataMode.RESACC, "v2")
+
+    shifted = copy.deepcopy(second)
+    shifted.simParams.setNewIPPosition(0.1, 0.0, 0.0)
+    assert configPackageHash(first, DataMode.RESACC, "v1") != configPackageHash(shifted, DataMode.RESACC, "v1")
+
+
+def test_cache_and_links(tmp_path: Path):
+    source = tmp_path / "source"
+    source.mkdir()
+    for index in range(3):
+        (source / f"Lumi_TrksQA_{index}.root").write_text("data")
+    (source / "other.log").write_text("log")
+
+    cache = ArtifactCache(tmp_path / "cache.sqlite")
+    assert cache.lookup("abc", "trackFiles") is None
+    cache.register("abc", "trackFiles", source)
+    cache.register("abc", "trackFiles", tmp_path / "somewhere_else")
+    assert cache.lookup("abc", "trackFiles") == source
+
+    target = tmp_path / "target"
+    assert linkArtifacts(source, target, "Lumi_TrksQA_*.root") == 3
+    assert sorted(path.name for path in target.iterdir()) == [f"Lumi_TrksQA_{index}.root" for index in range(3)]
+    assert linkArtifacts(source, target, "Lumi_TrksQA_*.root") == 0
+    cache.close()
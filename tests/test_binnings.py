@@ -0,0 +1,36 @@
+import json
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+from dataProcessors.LmdDataCreator import LmdDataCreator, writeBinningConfigs
+from lumifit.recipe import SimulationDataType
+from lumifit.types import ExperimentType
+
+
+def test_one_config_per_binning(tmp_path: Path):
+    config = {
+        "general_data": {"primary_dimension": {"bins": 300, "range": [0, 1]}, "secondary_dimension": {"bins": 300}},
+        "efficiency": {"primary_dimension": {"bins": 300}, "secondary_dimension": {"bins": 300}},
+        "resolution": {"primary_dimension": {"bins": 50}},
+    }
+    inputConfigPath = tmp_path / "dataconfig.json"
+    inputConfigPath.write_text(json.dumps(config))
+
+    configPaths = writeBinningConfigs(inputConfigPath, tmp_path / "bunches", [300, 100])
+    # the fitted binning keeps its usual place
+    assert configPaths == [tmp_path / "bunches/binning/dataconfig.json", tmp_path / "bunches/binning_100/dataconfig.json"]
+
+    written = json.loads(configPaths[1].read_text())
+    assert written["general_data"]["primary_dimension"] == {"bins": 100, "range": [0, 1]}
+    assert written["efficiency"]["secondary_dimension"]["bins"] == 100
+    # the resolution has its own binning
+    assert written["resolution"]["primary_dimension"]["bins"] == 50
+    assert json.loads(inputConfigPath.read_text()) == config
+
+
+def test_koala_takes_one_binning():
+    # createKoaFitData.sh passes the configs as a single -c
+    koala = SimpleNamespace(experimentType=ExperimentType.KOALA)
+    with pytest.raises(ValueError):
+        LmdDataCreator(koala, SimulationDataType.ANGULAR, 1.0, [300, 100])
@@ -1,8 +1,9 @@
+import tempfile
 import unittest
 from pathlib import Path
-from unittest.mock import MagicMock, patch
+from unittest.mock import MagicMock, call, patch
 
-from python.util.FileListBuncher import FileListBuncher
+from dataProcessors.FileListBuncher import FileListBuncher
 
 """
 Todo: auto generated, make real tests!
@@ -38,7 +39,7 @@ class TestFileListBuncher(unittest.TestCase):
         calls = [call('abc\n'), call('def\n')]
         mock_file.write.assert_has_calls(calls)
 
-    @patch("lumifit.general.getGoodFiles")
+    @patch("dataProcessors.FileListBuncher.getGoodFiles")
     @patch.object(FileListBuncher, "create_file_list_file")
     def test_make_file_list_bunches(self, mock_create_file, mock_getGoodFiles):
         # Mock functions
@@ -51,6 +52,33 @@ class TestFileListBuncher(unittest.TestCase):
         # Assertions
         self.assertEqual(mock_create_file.call_count, 2)
 
+    def test_bunches_on_disk(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            directory = Path(tmp)
+            for index in range(5):
+                (directory / f"Lumi_TrksQA_{index}.root").write_bytes(b"x" * 3000)
+            (directory / "Lumi_TrksQA_5.root").write_bytes(b"x" * 10)
+
+            buncher = FileListBuncher(directory, files_per_bunch=2, recursive=False)
+            buncher.run()
+
+            fileLists = sorted((directory / "bunches").glob("filelist_*.txt"))
+            self.assertEqual([fileList.name for fileList in fileLists], ["filelist_1.txt", "filelist_2.txt", "filelist_3.txt"])
+            bunched = [line.strip() for fileList in fileLists for line in fileList.read_text().splitlines()]
+            self.assertEqual(sorted(bunched), [str(directory / f"Lumi_TrksQA_{index}.root") for index in range(5)])
+
+    def test_forced_bunches_replace_old_ones(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            directory = Path(tmp)
+            for index in range(5):
+                (directory / f"Lumi_TrksQA_{index}.root").write_bytes(b"x" * 3000)
+
+            FileListBuncher(directory, files_per_bunch=1, recursive=False).run()
+            FileListBuncher(directory, files_per_bunch=2, recursive=False, force=True).run()
+
+            fileLists = sorted((directory / "bunches").glob("filelist_*.txt"))
+            self.assertEqual([fileList.name for fileList in fileLists], ["filelist_1.txt", "filelist_2.txt", "filelist_3.txt"])
+
     @patch.object(FileListBuncher, "collect_list_of_directories")
     @patch.object(FileListBuncher, "make_file_list_bunches")
     def test_run(self, mock_make_list, mock_collect_dir):
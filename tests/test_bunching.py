@@ -0,0 +1,36 @@
+from pathlib import Path
+
+from lumifit.bunching import balancedBunches, entryCounts, measuredEventsPerSecond, numberOfBunchesForRuntime
+from lumifit.manifest import appendRecord
+
+
+def test_bunches_are_balanced_by_events(tmp_path: Path):
+    # what survived the cuts differs a lot between the track files
+    sizes = [900, 100, 500, 500, 400, 300, 200, 100]
+    appendRecord(
+        tmp_path,
+        "reco",
+        [{"name": f"Lumi_TrksQA_{index}.root", "size": 5000, "entries": entries, "adler32": ""} for index, entries in enumerate(sizes)],
+    )
+    trackFiles = [tmp_path / f"Lumi_TrksQA_{index}.root" for index in range(len(sizes))]
+
+    # all entries come from the manifest, nothing is opened
+    entries = entryCounts(trackFiles, "pndsim")
+    assert list(entries.values()) == sizes
+
+    bunches = balancedBunches(entries, 3)
+    assert sorted(trackFile for bunch in bunches for trackFile in bunch) == sorted(trackFiles)
+    assert sorted(sum(entries[trackFile] for trackFile in bunch) for bunch in bunches) == [1000, 1000, 1000]
+    assert len(balancedBunches(entries, 20)) == len(sizes)
+    assert balancedBunches({}, 3) == []
+
+    # 3000 events at 10 events/s in 2 minutes per bunch
+    assert numberOfBunchesForRuntime(3000, 120, 10) == 3
+
+    # an earlier run took 100 s for the 1000 events of bunch 1
+    bunchesDir = tmp_path / "bunches"
+    (bunchesDir / "binning").mkdir(parents=True)
+    with open(bunchesDir / "filelist_1.txt", "w") as f:
+        f.write("\n".join(str(trackFile) for trackFile in bunches[0]) + "\n")
+    appendRecord(bunchesDir / "binning", "lmdData", [{"name": "lmd_data_1.root", "size": 5000}], task=1, timings={"lmdData": 100.0})
+    assert measuredEventsPerSecond(tmp_path) == 10
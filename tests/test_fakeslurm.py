@@ -0,0 +1,47 @@
+import os
+import threading
+import time
+from pathlib import Path
+
+import pytest
+from lumifit.agent import Client, Server
+from lumifit.cluster import Job, JobResourceRequest
+from lumifit.fakeslurm import installFakeSlurm, parseArrayString
+from lumifit.slurm import SlurmJobHandler
+
+
+def test_parse_array_string():
+    assert parseArrayString("1-3,5,7-11:2%10") == [1, 2, 3, 5, 7, 9, 11]
+
+
+@pytest.mark.timeout(60)
+def test_slurm_job_handler_against_fake_slurm(tmp_path: Path, monkeypatch):
+    stateDir = tmp_path / "state"
+    installFakeSlurm(tmp_path / "bin", stateDir, queue_delay_in_seconds=0.2, run_time_in_seconds=0.5)
+    monkeypatch.setenv("PATH", f"{tmp_path / 'bin'}:{os.environ['PATH']}")
+    monkeypatch.setenv("USER", "tester")
+
+    socketPath = tmp_path / "lmdfit.sock"
+    server = Server(socketPath, cacheTTL=0)
+    serverThread = threading.Thread(target=server.serve, daemon=True)
+    serverThread.start()
+    while not socketPath.exists():
+        time.sleep(0.05)
+
+    with Client(socketPath) as client:
+        handler = SlurmJobHandler("fake", client=client, poll_interval_in_seconds=0, settle_time_in_seconds=1)
+
+        first = Job(JobResourceRequest(10), "/bin/true", "first", str(tmp_path / "first-%a.log"), [1, 2, 3, 5])
+        returnCode, firstID = handler.submit(first)
+        assert returnCode == 0
+
+        second = Job(JobResourceRequest(10), "/bin/true", "second", str(tmp_path / "second.log"), [1], dependencies=[firstID])
+        _, secondID = handler.submit(second)
+
+        assert handler.get_active_number_of_jobs(firstID) > 0
+        # the second job can only finish after the first one
+        assert handler.watch(secondID).result(timeout=30) == secondID
+        assert handler.get_active_number_of_jobs(firstID) == 0
+
+        client.stopAgent()
+    serverThread.join(timeout=5)
@@ -0,0 +1,68 @@
+import os
+import time
+from pathlib import Path
+
+from lumifit import fileindex
+from lumifit.fileindex import DirectoryIndex
+
+
+def test_listings_are_reused_until_the_directory_changes(tmp_path: Path, monkeypatch):
+    scans = []
+    scandir = os.scandir
+
+    def countingScandir(path):
+        scans.append(Path(path))
+        return scandir(path)
+
+    monkeypatch.setattr(fileindex.os, "scandir", countingScandir)
+
+    longAgo = time.time() - 1000
+    for index in range(3):
+        (tmp_path / f"Lumi_TrksQA_{index}.root").write_bytes(b"x" * 5000)
+        os.utime(tmp_path / f"Lumi_TrksQA_{index}.root", (longAgo, longAgo))
+    (tmp_path / "bunches").mkdir()
+    os.utime(tmp_path / "bunches", (longAgo, longAgo))
+    os.utime(tmp_path, (longAgo, longAgo))
+
+    index = DirectoryIndex(settle_time_in_seconds=10)
+    assert len(index.glob(tmp_path, "Lumi_TrksQA_*.root")) == 3
+    assert index.stat(tmp_path / "Lumi_TrksQA_1.root").size == 5000
+    assert index.stat(tmp_path / "Lumi_TrksQA_7.root") is None
+    assert [directory for directory, _ in index.walk(tmp_path)] == [tmp_path / "bunches"]
+    assert scans == [tmp_path, tmp_path / "bunches"]
+
+    # a new file changes the directory mtime, a file that is still being written is stat'ed again
+    growing = tmp_path / "Lumi_TrksQA_3.root"
+    growing.write_bytes(b"x" * 10)
+    assert index.stat(growing).size == 10
+    with open(growing, "ab") as f:
+        f.write(b"x" * 5000)
+    assert index.stat(growing).size == 5010
+    assert len(index.glob(tmp_path, "Lumi_TrksQA_*.root")) == 4
+
+
+def test_stat_in_unsettled_directory_doesnt_scan(tmp_path: Path, monkeypatch):
+    scans = []
+    scandir = os.scandir
+
+    def countingScandir(path):
+        scans.append(Path(path))
+        return scandir(path)
+
+    monkeypatch.setattr(fileindex.os, "scandir", countingScandir)
+
+    # jobs are still writing here
+    for index in range(50):
+        (tmp_path / f"Lumi_TrksQA_{index}.root").write_bytes(b"x" * 5000)
+
+    index = DirectoryIndex(settle_time_in_seconds=10)
+    for _ in range(3):
+        for fileIndex in range(60):
+            entry = index.stat(tmp_path / f"Lumi_TrksQA_{fileIndex}.root")
+            assert (entry is not None and entry.size == 5000) == (fileIndex < 50)
+    assert index.stat(tmp_path) is not None and index.stat(tmp_path).isDir
+    assert scans == []
+
+    # only glob reads the directory
+    assert len(index.glob(tmp_path, "Lumi_TrksQA_*.root")) == 50
+    assert scans == [tmp_path]
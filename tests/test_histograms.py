@@ -0,0 +1,76 @@
+import json
+from pathlib import Path
+
+import numpy as np
+import pytest
+from dataProcessors.QuickLookHistogrammer import QuickLookHistogrammer
+from lumifit.histograms import Axis, fill2D, loadHistograms, specsFromConfig
+from lumifit.trackCache import COLUMNS, TREE_NAME, convertBunch
+
+CONFIG = {
+    "general_data": {
+        "primary_dimension": {"dimension_type": "THETA", "track_param_type": "IP", "bins": 4, "range_low": 0.0, "range_high": 0.012},
+        "secondary_dimension": {"dimension_type": "PHI", "track_param_type": "IP", "bins": 2, "range_low": -np.pi, "range_high": np.pi},
+    },
+    "efficiency": {
+        "primary_dimension": {"bins": 2, "range_low": 0.0, "range_high": 0.012},
+        "secondary_dimension": {"bins": 1, "range_low": -np.pi, "range_high": np.pi},
+    },
+    "resolution": {
+        "primary_dimension": {"bins": 10, "range_low": -0.005, "range_high": 0.005},
+        "secondary_dimension": {"bins": 10, "range_low": -6, "range_high": 6},
+    },
+}
+
+
+def test_fill_like_histogram2d():
+    rng = np.random.default_rng(1)
+    x = rng.uniform(-0.002, 0.014, 10000)
+    y = rng.uniform(-4, 4, 10000)
+    primary = Axis("THETA", "IP", 30, 0.0, 0.012)
+    secondary = Axis("PHI", "IP", 20, -np.pi, np.pi)
+
+    expected, _, _ = np.histogram2d(x, y, bins=[primary.edges(), secondary.edges()])
+    np.testing.assert_array_equal(fill2D(x, y, primary, secondary), expected)
+
+
+def test_histogram_bunches(tmp_path: Path):
+    uproot = pytest.importorskip("uproot")
+    ak = pytest.importorskip("awkward")
+
+    # every event has one track at theta 0.002 or 0.008, phi 1. the second one is not reconstructed
+    # and the third one is a secondary. reco is off by 0.0005 in theta
+    tracks = {column: [0.0, 0.0, 0.0] for column in COLUMNS}
+    tracks["rec_status"] = [0, -1, 0]
+    tracks["secondary"] = [-1, -1, 5]
+    for prefix, offset in (("mc", 0.0), ("ip", 0.0005)):
+        tracks[f"{prefix}_theta"] = [0.002 + offset, 0.008 + offset, 0.008 + offset]
+        tracks[f"{prefix}_phi"] = [1.0, 1.0, 1.0]
+
+    bunchesPath = tmp_path / "bunches"
+    bunchesPath.mkdir()
+    for bunch in (1, 2):
+        trackFile = tmp_path / f"Lumi_TrksQA_{bunch}.root"
+        with uproot.recreate(trackFile) as rootFile:
+            rootFile.mktree(TREE_NAME, {branch: "var * float64" for branch in COLUMNS.values()})
+            rootFile[TREE_NAME].extend({branch: ak.Array([[value] for value in tracks[column]]) for column, branch in COLUMNS.items()})
+        (bunchesPath / f"filelist_{bunch}.txt").write_text(f"{trackFile}\n")
+    # one bunch comes from the cache, the other one from the TrksQA file
+    convertBunch(bunchesPath, 1)
+
+    configPath = tmp_path / "dataconfig.json"
+    configPath.write_text(json.dumps(CONFIG))
+    assert [spec.name for spec in specsFromConfig(CONFIG, "er")] == ["acceptance_all", "acceptance_reco", "resolution"]
+
+    QuickLookHistogrammer(bunchesPath, configPath, "aer", processes=2).run()
+    histograms = loadHistograms(bunchesPath / "quickLook/histograms.npz")
+
+    # phi 1 is in the upper phi bin
+    np.testing.assert_array_equal(histograms["mc_th"].counts[:, 1], [2, 0, 2, 0])
+    np.testing.assert_array_equal(histograms["mc_acc"].counts[:, 1], [2, 0, 0, 0])
+    np.testing.assert_array_equal(histograms["reco"].counts[:, 1], [2, 0, 2, 0])
+    np.testing.assert_array_equal(histograms["acceptance_all"].counts[:, 0], [2, 2])
+    np.testing.assert_array_equal(histograms["acceptance_reco"].counts[:, 0], [2, 0])
+    assert histograms["resolution"].counts.sum() == 4
+    assert histograms["resolution"].counts[5, 5] == 4
+    np.testing.assert_allclose(histograms["reco"].x_edges, np.linspace(0, 0.012, 5))
@@ -0,0 +1,66 @@
+import sqlite3
+from pathlib import Path
+
+from lumifit.journal import Journal
+
+
+def test_journal_survives_restart(tmp_path: Path):
+    journal = Journal.forExperiment(tmp_path)
+    journal.recordTransition("er", "START_SIM")
+    journal.recordSubmission("er", "START_SIM", 100, "simreco", [1, 2, 3])
+    journal.recordJobFinished(100)
+    # only index 2 failed and was resubmitted
+    journal.recordSubmission("er", "START_SIM", 101, "simreco", [2])
+    journal.recordSubmission("a", "MAKE_BUNCHES", 102, "createFitData", [1])
+    journal.recordJobFinished(102)
+    journal.close()
+
+    # the process died, the next run opens the same journal
+    journal = Journal.forExperiment(tmp_path)
+    assert journal.lastState("er") == "START_SIM"
+    assert journal.unfinishedJob("er") == (101, "START_SIM")
+    assert journal.unfinishedJob("a") is None
+    # the attempts of the run that died don't count anymore
+    assert journal.attemptsPerIndex("er", "START_SIM") == {}
+
+    journal.abandonUnfinishedJobs()
+    assert journal.unfinishedJob("er") is None
+    journal.close()
+
+
+def test_retry_budget_per_run(tmp_path: Path):
+    journal = Journal.forExperiment(tmp_path)
+    journal.recordSubmission("er", "SUBMITTED", 100, "simreco", [1, 2, 3])
+    journal.recordJobFinished(100)
+    journal.recordSubmission("er", "SUBMITTED", 101, "simreco", [2])
+    journal.recordJobFinished(101)
+    assert journal.attemptsPerIndex("er", "SUBMITTED") == {1: 1, 2: 2, 3: 1}
+    journal.close()
+
+    # a second invocation in the same dir, i.e. after the outputs were deleted
+    journal = Journal.forExperiment(tmp_path)
+    assert journal.attemptsPerIndex("er", "SUBMITTED") == {}
+    journal.recordSubmission("er", "SUBMITTED", 200, "simreco", [2])
+    assert journal.attemptsPerIndex("er", "SUBMITTED") == {2: 1}
+    # the history is still there for the plans
+    assert len(journal.jobTurnarounds()["er"]) == 2
+    journal.close()
+
+
+def test_journal_without_runs(tmp_path: Path):
+    # a journal written before the jobs had a run id
+    connection = sqlite3.connect(str(tmp_path / Journal.fileName))
+    connection.execute(
+        "CREATE TABLE jobs (job_id INTEGER NOT NULL, task TEXT NOT NULL, state TEXT NOT NULL, name TEXT NOT NULL, "
+        + "array_indices TEXT NOT NULL, submitted REAL NOT NULL, finished REAL)"
+    )
+    connection.execute("INSERT INTO jobs VALUES (100, 'er', 'SUBMITTED', 'simreco', '[1, 2]', 0, NULL)")
+    connection.commit()
+    connection.close()
+
+    journal = Journal.forExperiment(tmp_path)
+    assert journal.unfinishedJob("er") == (100, "SUBMITTED")
+    assert journal.attemptsPerIndex("er", "SUBMITTED") == {}
+    journal.recordSubmission("er", "SUBMITTED", 101, "simreco", [1])
+    assert journal.attemptsPerIndex("er", "SUBMITTED") == {1: 1}
+    journal.close()
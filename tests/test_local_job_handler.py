@@ -0,0 +1,69 @@
+from pathlib import Path
+
+import pytest
+from lumifit.cluster import ClusterJobManager, Job, JobResourceRequest, LocalJobHandler
+
+
+@pytest.mark.timeout(20)
+def test_array_tasks_run_with_slurm_variables(tmp_path: Path):
+    job_manager = ClusterJobManager(LocalJobHandler(max_parallel_processes=4), time_to_sleep_after_submission=0)
+
+    job = Job(
+        JobResourceRequest(1),
+        application_url=f"echo $SLURM_JOB_ID $SLURM_ARRAY_TASK_ID $greeting > {tmp_path}/out_$SLURM_ARRAY_TASK_ID.txt",
+        name="array",
+        logfile_url=str(tmp_path / "array-%A-%a.log"),
+        array_indices=[1, 2, 5],
+        exported_user_variables={"greeting": "hello"},
+    )
+    jobID = job_manager.enqueue(job)
+    job_manager.wait_for_job(jobID)
+
+    assert job_manager.get_active_number_of_jobs(jobID) == 0
+    for index in [1, 2, 5]:
+        assert (tmp_path / f"out_{index}.txt").read_text() == f"{jobID} {index} hello\n"
+        assert (tmp_path / f"array-{jobID}-{index}.log").exists()
+
+
+@pytest.mark.timeout(20)
+def test_dependencies(tmp_path: Path):
+    job_handler = LocalJobHandler(max_parallel_processes=2)
+    job_manager = ClusterJobManager(job_handler, time_to_sleep_after_submission=0)
+
+    def make_job(command: str, dependencies=[], dependency_type="afterok") -> Job:
+        return Job(JobResourceRequest(1), command, "test", str(tmp_path / "test.log"), [1], dependencies=list(dependencies), dependency_type=dependency_type)
+
+    first = job_manager.enqueue(make_job(f"sleep 0.5; touch {tmp_path}/first"))
+    second = job_manager.enqueue(make_job(f"test -f {tmp_path}/first && touch {tmp_path}/second", [first]))
+    failing = job_manager.enqueue(make_job("exit 1"))
+    dropped = job_manager.enqueue(make_job(f"touch {tmp_path}/dropped", [failing]))
+    anyway = job_manager.enqueue(make_job(f"touch {tmp_path}/anyway", [failing], "afterany"))
+
+    for jobID in [second, dropped, anyway]:
+        job_manager.wait_for_job(jobID)
+
+    assert (tmp_path / "second").exists()
+    assert not (tmp_path / "dropped").exists()
+    assert (tmp_path / "anyway").exists()
+    assert job_handler.get_failed_array_indices(failing) == [1]
+
+
+@pytest.mark.timeout(20)
+def test_resubmitted_tasks_keep_earlier_logs(tmp_path: Path):
+    def run_once(attempt: int) -> None:
+        # a fresh handler, like a second invocation, so it hands out job ID 1 again
+        job_manager = ClusterJobManager(LocalJobHandler(max_parallel_processes=1), time_to_sleep_after_submission=0)
+        job = Job(JobResourceRequest(1), f"echo attempt {attempt}", "retry", str(tmp_path / "retry-%A-%a.log"), [1])
+        job_manager.wait_for_job(job_manager.enqueue(job))
+
+    run_once(1)
+    run_once(2)
+    assert (tmp_path / "retry-1-1.log").read_text() == "attempt 1\nattempt 2\n"
+
+
+def test_job_without_tasks_is_rejected(tmp_path: Path):
+    job = Job(JobResourceRequest(1), "true", "empty", str(tmp_path / "empty.log"), [1])
+    # e.g. after all failed indices were taken out
+    job.array_indices = []
+    with pytest.raises(ValueError):
+        LocalJobHandler(max_parallel_processes=1).submit(job)
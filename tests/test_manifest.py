@@ -0,0 +1,51 @@
+from pathlib import Path
+
+import numpy as np
+import uproot
+from lumifit.artifacts import linkArtifacts
+from lumifit.general import getGoodFiles
+from lumifit.manifest import MANIFEST_FILE_NAME, readManifest, recordOutputs
+
+
+def writeTrackFile(path: Path, entries: int) -> None:
+    with uproot.recreate(path) as f:
+        f.mktree("pndsim", {"x": np.float64})
+        if entries:
+            f["pndsim"].extend({"x": np.arange(entries, dtype=np.float64)})
+
+
+def test_manifest_is_read_incrementally_and_used_for_good_files(tmp_path: Path):
+    data = tmp_path / "data"
+    data.mkdir()
+    # no manifest: getGoodFiles lists the directory as before
+    assert readManifest(data) is None
+
+    for index, entries in enumerate([100, 100, 0]):
+        writeTrackFile(data / f"Lumi_TrksQA_{index}.root", entries)
+    # a file that no task reported as done (still being copied, or from a killed task)
+    (data / "Lumi_TrksQA_3.root").write_bytes(b"x" * 5000)
+
+    recordOutputs([data / "Lumi_TrksQA_0.root"], "reco", task=0, timings={"reco": 12.0}, treeName="pndsim")
+    records = readManifest(data)
+    assert records is not None and records["Lumi_TrksQA_0.root"].entries == 100
+
+    recordOutputs([data / "Lumi_TrksQA_1.root", data / "Lumi_TrksQA_2.root", data / "missing.root"], "reco", task=1, treeName="pndsim")
+    # a task that is writing its line right now
+    with open(data / MANIFEST_FILE_NAME, "a") as f:
+        f.write('{"stage": "reco", "outputs": [{"na')
+
+    records = readManifest(data)
+    assert sorted(records) == ["Lumi_TrksQA_0.root", "Lumi_TrksQA_1.root", "Lumi_TrksQA_2.root"]
+    assert records["Lumi_TrksQA_2.root"].entries == 0
+    assert len(records["Lumi_TrksQA_1.root"].adler32) == 8
+
+    # the empty file is bad, the unreported one doesn't count at all
+    good, percentage = getGoodFiles(data, "Lumi_TrksQA_*", min_filesize_in_bytes=100, use_manifest=True)
+    assert good == [data / "Lumi_TrksQA_0.root", data / "Lumi_TrksQA_1.root"]
+    assert percentage == 2 / 3
+    assert len(getGoodFiles(data, "Lumi_TrksQA_*", min_filesize_in_bytes=100)[0]) == 4
+
+    # linked outputs take their records along
+    linked = tmp_path / "linked"
+    assert linkArtifacts(data, linked, "Lumi_TrksQA_*") == 4
+    assert sorted(readManifest(linked)) == ["Lumi_TrksQA_0.root", "Lumi_TrksQA_1.root", "Lumi_TrksQA_2.root"]
@@ -0,0 +1,49 @@
+import re
+import sys
+from pathlib import Path
+
+from dataProcessors.LmdDataMerger import LmdDataMerger
+
+# stands in for bin/mergeLmdData: the "lmd data" in every file is a (padded) number, merging adds them up
+FAKE_MERGE_BINARY = """#!PYTHON
+import getopt, re, sys
+from pathlib import Path
+
+options = dict(getopt.getopt(sys.argv[1:], "p:t:n:s:f:")[0])
+path = Path(options["-p"])
+names = {"a": "lmd_data", "e": "lmd_acc_data", "r": "lmd_res_data"}
+total = sum(int(found.read_text()) for found in path.iterdir() if found.is_file() and re.search(options["-f"], found.name))
+(path / "merge_data").mkdir(exist_ok=True)
+(path / "merge_data" / (names[options["-t"]] + "_1of1.root")).write_text(str(total))
+with open(CALLS, "a") as calls:
+    calls.write(str(path) + "\\n")
+"""
+
+
+def test_tree_merge(tmp_path: Path):
+    callsFile = tmp_path / "calls.txt"
+    binary = tmp_path / "build/bin/mergeLmdData"
+    binary.parent.mkdir(parents=True)
+    binary.write_text(FAKE_MERGE_BINARY.replace("PYTHON", sys.executable).replace("CALLS", repr(str(callsFile))))
+    binary.chmod(0o755)
+
+    binningPath = tmp_path / "data/bunches/binning"
+    binningPath.mkdir(parents=True)
+    for index in range(1, 11):
+        (binningPath / f"lmd_acc_data_{index}.root").write_text(str(index).ljust(5000))
+        (binningPath / f"lmd_res_data_{index}.root").write_text(str(100 * index).ljust(5000))
+
+    LmdDataMerger(tmp_path / "data", "er", tmp_path / "build", fan_in=3, processes=2).run()
+
+    assert (binningPath / "merge_data/lmd_acc_data_1of1.root").read_text() == "55"
+    assert (binningPath / "merge_data/lmd_res_data_1of1.root").read_text() == "5500"
+    # 10 files -> 4 groups -> 2 groups -> final, for both types
+    calls = callsFile.read_text().split()
+    assert len(calls) == 2 * (4 + 2 + 1)
+    assert not any(re.search("merge_tree", path.name) for path in binningPath.iterdir())
+
+    # few files are merged at once, like before
+    callsFile.unlink()
+    LmdDataMerger(tmp_path / "data", "e", tmp_path / "build", fan_in=16).run()
+    assert callsFile.read_text().split() == [str(binningPath)]
+    assert (binningPath / "merge_data/lmd_acc_data_1of1.root").read_text() == "55"
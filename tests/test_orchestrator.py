@@ -0,0 +1,46 @@
+import asyncio
+from pathlib import Path
+
+import pytest
+from lumifit.cluster import ClusterJobManager, Job, JobResourceRequest, LocalJobHandler
+from lumifit.orchestrator import Orchestrator
+
+
+@pytest.mark.timeout(30)
+def test_many_tasks_wait_for_jobs_on_one_loop(tmp_path: Path):
+    job_manager = ClusterJobManager(LocalJobHandler(max_parallel_processes=8), time_to_sleep_after_submission=0)
+    orchestrator = Orchestrator(job_manager, max_local_steps=2)
+
+    running = 0
+    maxRunning = 0
+
+    async def task(index: int) -> int:
+        nonlocal running, maxRunning
+        running += 1
+        maxRunning = max(maxRunning, running)
+        job = Job(JobResourceRequest(1), f"sleep 0.1; touch {tmp_path}/{index}", "test", str(tmp_path / "test.log"), [1])
+        jobID = await orchestrator.submit(job)
+        await orchestrator.waitForJob(jobID)
+        exists = await orchestrator.runLocal((tmp_path / str(index)).exists)
+        running -= 1
+        return index if exists else -1
+
+    results = orchestrator.run((task(index) for index in range(40)), max_concurrent=10)
+
+    assert results == list(range(40))
+    assert maxRunning == 10
+
+
+def test_gather_raises_after_all_are_done():
+    orchestrator = Orchestrator(ClusterJobManager(LocalJobHandler(1)))
+    finished = []
+
+    async def task(index: int) -> None:
+        await asyncio.sleep(0.01 * index)
+        if index == 0:
+            raise ValueError("task 0 failed")
+        finished.append(index)
+
+    with pytest.raises(ValueError):
+        orchestrator.run(task(index) for index in range(3))
+    assert finished == [1, 2]
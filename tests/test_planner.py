@@ -0,0 +1,75 @@
+import json
+from pathlib import Path
+
+from lumifit.cluster import JobResourceRequest
+from lumifit.planner import Planner, exportPlan, storageByDirectory
+from lumifit.stages import Stage, StageGraph
+
+
+async def neverRuns() -> bool:
+    raise AssertionError("a plan must not run any stage")
+
+
+def makeGraph(dataDir: Path, numberOfSamples: int) -> StageGraph:
+    """
+    sim job (one file per sample) -> local merge
+    """
+    mergeDir = dataDir / "merge"
+
+    def missingSamples() -> int:
+        return sum(not (dataDir / f"track_{index}.root").exists() for index in range(numberOfSamples))
+
+    graph = StageGraph()
+    graph.add(
+        Stage(
+            "simreco",
+            neverRuns,
+            outputs=lambda: (dataDir, "track_*.root"),
+            plannedJob=lambda: (JobResourceRequest(walltime_in_minutes=90, processors_per_node=2), missingSamples()),
+        )
+    )
+    graph.add(Stage("merge", neverRuns, inputs=["simreco"], outputs=lambda: (mergeDir, "merged_*"), isComplete=lambda: (mergeDir / "merged_0").exists()))
+    return graph
+
+
+def test_plan_estimates_tasks_core_hours_and_storage(tmp_path: Path):
+    # done: all samples and the merged file are there
+    done = tmp_path / "done"
+    (done / "merge").mkdir(parents=True)
+    for index in range(2):
+        (done / f"track_{index}.root").write_bytes(b"x" * 1000)
+    (done / "merge" / "merged_0").write_bytes(b"x" * 300)
+
+    # half: one of four samples is there, nothing merged
+    half = tmp_path / "half"
+    half.mkdir()
+    (half / "track_0.root").write_bytes(b"x" * 1000)
+
+    planner = Planner()
+    planner.add(tmp_path / "experimentDone", makeGraph(done, 2), {"simreco": [3600.0, 7200.0]})
+    planner.add(tmp_path / "experimentHalf", makeGraph(half, 4), {})
+    estimates = {(estimate.experimentDir.name, estimate.stage): estimate for estimate in planner.estimate()}
+
+    assert not estimates[("experimentDone", "simreco")].runs
+    assert not estimates[("experimentDone", "merge")].runs
+    assert estimates[("experimentDone", "simreco")].coreHours == 0
+
+    simreco = estimates[("experimentHalf", "simreco")]
+    assert simreco.runs and simreco.arrayTasks == 3
+    assert simreco.coreHours == 3 * 2 * 1.5
+    assert simreco.expectedBytes == 3000
+    assert simreco.turnaroundHours == 1.5
+
+    # a local stage that never ran here writes what it wrote in the other experiment
+    merge = estimates[("experimentHalf", "merge")]
+    assert merge.runs and merge.local and merge.expectedBytes == 300
+
+    storage = storageByDirectory(list(estimates.values()))
+    assert storage[done] == (2300, 0)
+    assert storage[half] == (1000, 3300)
+
+    exportPlan(list(estimates.values()), tmp_path / "plan.json")
+    with open(tmp_path / "plan.json") as f:
+        plan = json.load(f)
+    assert plan["totalArrayTasks"] == 3
+    assert plan["totalCoreHours"] == 9
@@ -0,0 +1,65 @@
+import math
+from pathlib import Path
+
+import numpy as np
+import pytest
+from lumifit.precision import estimateAcceptancePrecision, relativeAcceptanceError
+from lumifit.trackCache import COLUMNS, TREE_NAME
+
+# 10x10 bins in theta and phi
+DATA_CONFIG = {
+    "general_data": {
+        "primary_dimension": {"dimension_type": "THETA", "track_param_type": "IP", "bins": 10, "range_low": 0.0, "range_high": 0.01},
+        "secondary_dimension": {"dimension_type": "PHI", "track_param_type": "IP", "bins": 10, "range_low": -np.pi, "range_high": np.pi},
+    },
+    "efficiency": {
+        "primary_dimension": {"bins": 10, "range_low": 0.0, "range_high": 0.01},
+        "secondary_dimension": {"bins": 10, "range_low": -np.pi, "range_high": np.pi},
+    },
+}
+
+
+def writeTrackFile(trackFile: Path, theta: np.ndarray, phi: np.ndarray, status: np.ndarray) -> None:
+    uproot = pytest.importorskip("uproot")
+    ak = pytest.importorskip("awkward")
+
+    tracks = {column: np.zeros(len(theta)) for column in COLUMNS}
+    tracks.update({"mc_theta": theta, "mc_phi": phi, "rec_status": status, "secondary": -np.ones(len(theta))})
+    with uproot.recreate(trackFile) as rootFile:
+        rootFile.mktree(TREE_NAME, {branch: "var * float64" for branch in COLUMNS.values()})
+        # one track per event
+        rootFile[TREE_NAME].extend({branch: ak.unflatten(tracks[column], np.ones(len(theta), dtype=np.int64)) for column, branch in COLUMNS.items()})
+
+
+def test_relative_acceptance_error():
+    assert relativeAcceptanceError(0, 0) is None
+    assert relativeAcceptanceError(100, 0) is None
+    assert relativeAcceptanceError(100, 100) == 0
+    assert relativeAcceptanceError(10000, 2500) == pytest.approx(math.sqrt(0.75 / 2500))
+
+
+def test_binned_precision_does_not_stop_early(tmp_path: Path):
+    # 2000 tracks over the 100 bins, every second one reconstructed
+    rng = np.random.default_rng(1)
+    trackFiles = []
+    for index in range(2):
+        trackFile = tmp_path / f"Lumi_TrksQA_{index}.root"
+        writeTrackFile(trackFile, rng.uniform(0, 0.01, 1000), rng.uniform(-np.pi, np.pi, 1000), np.tile([0.0, -1.0], 500))
+        trackFiles.append(trackFile)
+
+    # all tracks together would already be precise enough for a target of 0.05
+    assert relativeAcceptanceError(2000, 1000) < 0.05
+    # but there are only about 10 reconstructed tracks per bin
+    error = estimateAcceptancePrecision(trackFiles, DATA_CONFIG)
+    assert error is not None and error > 0.2
+    assert estimateAcceptancePrecision(trackFiles, DATA_CONFIG, quantile=1.0) >= error
+
+    # with 40 times more tracks, it is about 6 times better
+    manyFiles = []
+    for index in range(2, 4):
+        trackFile = tmp_path / f"Lumi_TrksQA_{index}.root"
+        writeTrackFile(trackFile, rng.uniform(0, 0.01, 40000), rng.uniform(-np.pi, np.pi, 40000), np.tile([0.0, -1.0], 20000))
+        manyFiles.append(trackFile)
+    assert estimateAcceptancePrecision(manyFiles, DATA_CONFIG) < 0.05
+
+    assert estimateAcceptancePrecision([], DATA_CONFIG) is None
@@ -0,0 +1,74 @@
+import gc
+from typing import List, Tuple
+
+import pytest
+from lumifit.cluster import Job, JobResourceRequest
+from lumifit.slurm import (
+    JobStatusWatcher,
+    SlurmJobHandler,
+    _create_array_string,
+    _create_dependency_string,
+    _parse_squeue_states,
+)
+
+
+def test_parse_squeue_states():
+    output = "1234 1 RUNNING\n1234 2 PENDING\n5678 N/A RUNNING\n\ngarbage\n"
+    states = _parse_squeue_states(output)
+    assert states == {1234: {1: "RUNNING", 2: "PENDING"}, 5678: {None: "RUNNING"}}
+
+
+class SqueueMock:
+    def __init__(self, outputs: List[str]) -> None:
+        self.outputs = outputs
+        self.calls = 0
+
+    def __call__(self, command: str) -> Tuple[int, str]:
+        output = self.outputs[min(self.calls, len(self.outputs) - 1)]
+        self.calls += 1
+        return 0, output
+
+
+@pytest.mark.timeout(20)
+def test_watcher_resolves_finished_jobs():
+    squeue = SqueueMock(["1 1 RUNNING\n1 2 PENDING\n2 N/A RUNNING\n", "1 2 RUNNING\n", ""])
+    watcher = JobStatusWatcher(squeue, poll_interval_in_seconds=0.05, settle_time_in_seconds=0)
+
+    first = watcher.watch(1)
+    second = watcher.watch(2)
+
+    assert second.result(timeout=10) == 2
+    assert first.result(timeout=10) == 1
+    # both jobs were answered by the same polls
+    assert squeue.calls <= 3
+
+
+def test_dependency_string():
+    job = Job(JobResourceRequest(10), "true", "test", "test.log", [1])
+    assert _create_dependency_string(job) == ""
+
+    job.dependencies = [12, 34]
+    job.dependency_type = "afterany"
+    assert _create_dependency_string(job) == " --dependency=afterany:12:34 --kill-on-invalid-dep=yes"
+
+
+def test_array_string_for_resubmitted_indices():
+    # only the failed indices of an array are resubmitted, they must stay compact
+    job = Job(JobResourceRequest(10), "true", "test", "test.log", [9, 1, 2, 3, 5, 7, 8])
+    assert _create_array_string(job) == " --array=1-3,5,7-9"
+
+
+def test_injected_client_is_not_closed():
+    class ClientMock:
+        def __init__(self) -> None:
+            self.closed = False
+
+        def exit(self) -> None:
+            self.closed = True
+
+    client = ClientMock()
+    handler = SlurmJobHandler("partition", client=client)  # type: ignore[arg-type]
+    del handler
+    gc.collect()
+    # other handlers may still use it
+    assert not client.closed
@@ -0,0 +1,65 @@
+import asyncio
+from typing import List
+
+import pytest
+from lumifit.cluster import ClusterJobManager, LocalJobHandler
+from lumifit.orchestrator import Orchestrator
+from lumifit.stages import Stage, StageGraph
+
+
+def test_independent_branches_do_not_wait_for_each_other():
+    events: List[str] = []
+
+    def stage(name: str, duration: float, inputs: List[str] = []) -> Stage:
+        async def action() -> bool:
+            events.append(f"start {name}")
+            await asyncio.sleep(duration)
+            events.append(f"end {name}")
+            return True
+
+        return Stage(name, action, inputs=list(inputs))
+
+    graph = StageGraph()
+    graph.add(stage("fit", 0, ["a-merge", "er-merge"]))
+    graph.add(stage("a-sim", 0.3))
+    graph.add(stage("a-merge", 0, ["a-sim"]))
+    graph.add(stage("er-sim", 0.05))
+    graph.add(stage("er-merge", 0, ["er-sim"]))
+
+    orchestrator = Orchestrator(ClusterJobManager(LocalJobHandler(1)))
+    ran = orchestrator.run([graph.run(orchestrator)])[0]
+
+    assert all(ran.values())
+    # the res/acc branch is through before the angular sim is done
+    assert events.index("end er-merge") < events.index("end a-sim")
+    assert events[-1] == "end fit"
+
+
+def test_complete_stages_are_skipped_unless_an_input_ran():
+    def stage(name: str, inputs: List[str], complete: bool) -> Stage:
+        async def action() -> bool:
+            return True
+
+        return Stage(name, action, inputs=inputs, isComplete=lambda: complete)
+
+    graph = StageGraph()
+    graph.add(stage("sim", [], True))
+    graph.add(stage("bunches", ["sim"], False))
+    graph.add(stage("merge", ["bunches"], True))
+    graph.add(stage("ip", [], True))
+
+    orchestrator = Orchestrator(ClusterJobManager(LocalJobHandler(1)), sequential=True)
+    ran = orchestrator.run([graph.run(orchestrator)])[0]
+
+    assert ran == {"sim": False, "bunches": True, "merge": True, "ip": False}
+
+
+def test_cycles_are_rejected():
+    async def action() -> bool:
+        return True
+
+    graph = StageGraph()
+    graph.add(Stage("a", action, inputs=["b"]))
+    graph.add(Stage("b", action, inputs=["a"]))
+    with pytest.raises(ValueError):
+        graph.topologicalOrder()
@@ -0,0 +1,41 @@
+from pathlib import Path
+
+from lumifit.streaming import BunchStreamer
+
+
+def readFileList(fileList: Path) -> list:
+    with open(fileList) as f:
+        return [Path(line.strip()) for line in f]
+
+
+def test_bunches_are_written_as_track_files_settle(tmp_path: Path):
+    def writeTrackFile(index: int) -> Path:
+        trackFile = tmp_path / f"Lumi_TrksQA_{index}.root"
+        trackFile.write_bytes(b"x" * 3000)
+        return trackFile
+
+    streamer = BunchStreamer(tmp_path, "Lumi_TrksQA_*", files_per_bunch=2, maximum_number_of_files=5)
+    for index in range(3):
+        writeTrackFile(index)
+    # a file that is still being copied
+    (tmp_path / "Lumi_TrksQA_3.root").write_bytes(b"x" * 10)
+
+    # nothing is settled on the first look
+    assert streamer.poll() == []
+    assert streamer.poll() == [1]
+    assert readFileList(tmp_path / "bunches" / "filelist_1.txt") == [tmp_path / "Lumi_TrksQA_0.root", tmp_path / "Lumi_TrksQA_1.root"]
+
+    writeTrackFile(3)
+    writeTrackFile(4)
+    writeTrackFile(5)
+    assert streamer.poll() == []
+
+    # the job is done: the rest is bunched right away, but only up to maximum_number_of_files
+    assert streamer.poll(final=True) == [2, 3]
+    assert readFileList(tmp_path / "bunches" / "filelist_3.txt") == [tmp_path / "Lumi_TrksQA_4.root"]
+
+    # a restarted run doesn't bunch anything twice
+    restarted = BunchStreamer(tmp_path, "Lumi_TrksQA_*", files_per_bunch=2)
+    assert restarted.numberOfBunches == 3
+    assert restarted.poll(final=True) == [4]
+    assert readFileList(tmp_path / "bunches" / "filelist_4.txt") == [tmp_path / "Lumi_TrksQA_5.root"]
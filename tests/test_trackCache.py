@@ -0,0 +1,37 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+from lumifit.trackCache import COLUMNS, TREE_NAME, convertBunch, iterateTrackCache, missingBunches, openTrackCache, trackCachePath
+
+
+def test_convert_and_iterate(tmp_path: Path):
+    uproot = pytest.importorskip("uproot")
+    ak = pytest.importorskip("awkward")
+
+    # 3 events with 1, 0 and 2 tracks per file
+    trackFiles = []
+    for index in range(2):
+        trackFile = tmp_path / f"Lumi_TrksQA_{index}.root"
+        with uproot.recreate(trackFile) as rootFile:
+            rootFile.mktree(TREE_NAME, {branch: "var * float64" for branch in COLUMNS.values()})
+            rootFile[TREE_NAME].extend({branch: ak.Array([[0.001 * column + index], [], [column, -10.0]]) for column, branch in enumerate(COLUMNS.values())})
+        trackFiles.append(trackFile)
+
+    bunchesPath = tmp_path / "bunches"
+    bunchesPath.mkdir()
+    (bunchesPath / "filelist_1.txt").write_text("\n".join(str(trackFile) for trackFile in trackFiles) + "\n")
+    (bunchesPath / "filelist_2.txt").write_text(f"{trackFiles[1]}\n")
+    assert missingBunches(bunchesPath) == [1, 2]
+
+    assert convertBunch(bunchesPath, 1) == 6
+    assert missingBunches(bunchesPath) == [2]
+
+    cache = openTrackCache(trackCachePath(bunchesPath, 1))
+    assert list(cache) == list(COLUMNS)
+    assert cache["ip_theta"].dtype == np.float32
+    np.testing.assert_allclose(cache["ip_theta"], np.float32([0.003, 3, -10, 1.003, 3, -10]))
+
+    chunks = list(iterateTrackCache([trackCachePath(bunchesPath, 1)], ["rec_status", "mc_phi"], chunk_size=4))
+    assert [len(chunk["mc_phi"]) for chunk in chunks] == [4, 2]
+    assert list(chunks[0]) == ["rec_status", "mc_phi"]
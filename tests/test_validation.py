@@ -0,0 +1,35 @@
+from pathlib import Path
+
+import pytest
+from lumifit import validation
+from lumifit.validation import validateRootFiles
+
+
+def test_truncated_and_empty_files_are_invalid(tmp_path: Path, monkeypatch):
+    uproot = pytest.importorskip("uproot")
+    np = pytest.importorskip("numpy")
+
+    good = tmp_path / "Lumi_TrksQA_0.root"
+    with uproot.recreate(good) as rootFile:
+        rootFile.mktree("pndsim", {"x": "float64"})
+        rootFile["pndsim"].extend({"x": np.arange(100, dtype=np.float64)})
+
+    empty = tmp_path / "Lumi_TrksQA_1.root"
+    with uproot.recreate(empty) as rootFile:
+        rootFile.mktree("pndsim", {"x": "float64"})
+
+    wrongTree = tmp_path / "Lumi_TrksQA_2.root"
+    with uproot.recreate(wrongTree) as rootFile:
+        rootFile["cbmsim"] = {"x": np.arange(10, dtype=np.float64)}
+
+    truncated = tmp_path / "Lumi_TrksQA_3.root"
+    truncated.write_bytes(good.read_bytes()[: good.stat().st_size // 2])
+
+    files = [good, empty, wrongTree, truncated, tmp_path / "Lumi_TrksQA_4.root"]
+    assert validateRootFiles(files, "pndsim") == {good: True, empty: False, wrongTree: False, truncated: False, files[-1]: False}
+
+    # verdicts are cached, unchanged files aren't opened again
+    opened = []
+    monkeypatch.setattr(validation, "_openAndCheck", lambda rootFile, treeName: opened.append(rootFile))
+    assert validateRootFiles(files[:4], "pndsim") == {good: True, empty: False, wrongTree: False, truncated: False}
+    assert opened == []
@@ -645,13 +645,17 @@ void PndLmdDataFacade::createDataBundles(const std::string &data_types) {
   }
 }
 
-void PndLmdDataFacade::fillCreatedData(PndLmdDataReader &data_reader) {
+void PndLmdDataFacade::registerCreatedData(PndLmdDataReader &data_reader) {
   // register created data objects with the data reader
   data_reader.registerAcceptances(lmd_acceptances);
   data_reader.registerData(lmd_angular_data);
   data_reader.registerData(lmd_vertex_data);
   data_reader.registerData(lmd_hist_data);
   data_reader.registerMapData(lmd_map_data);
+}
+
+void PndLmdDataFacade::fillCreatedData(PndLmdDataReader &data_reader) {
+  registerCreatedData(data_reader);
 
   // and read data
   data_reader.read();
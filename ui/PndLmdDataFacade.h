@@ -105,6 +105,7 @@ public:
   void createAndFillDataBundles(const std::string &data_types,
                                 PndLmdDataReader &data_reader);
   void createDataBundles(const std::string &data_types);
+  void registerCreatedData(PndLmdDataReader &data_reader);
   void fillCreatedData(PndLmdDataReader &data_reader);
   void saveDataToFiles();
   void cleanup();